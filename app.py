@@ -1,10 +1,27 @@
 import streamlit as st
 import pandas as pd
 import streamlit.components.v1 as components
-from backend.graph_visualizer import create_pyvis_graph
+from backend.graph_visualizer import (
+    GRAPH_HUB_DEGREE, GRAPH_NODE_BUDGET, MAX_GRAPH_DEPTH, graph_cache, graph_html
+)
 import requests
 import json
-from backend.graphrag_reasoner import explain_transaction_ids
+from backend.graphrag_reasoner import (
+    StreamMetrics, explain_transaction_stream, explain_transactions, explanation_cache, stream_metrics
+)
+from backend.anomaly_scoring import (
+    FLAG_COLUMNS, TRANSACTION_COLUMNS, anomaly_statistics, flag_columns,
+    top_anomalous_transactions, top_anomalous_users
+)
+from backend.arrow_cache import load_transactions
+from backend.parallel_scoring import score_transactions_parallel
+from backend.user_index import UserIndex
+from backend.user_profiles import fetch_user_anomaly_summary
+from backend.clickhouse_arrow import query_df
+from backend.clickhouse_scoring import (
+    fetch_anomaly_statistics, fetch_top_anomalous_transactions, fetch_top_anomalous_users
+)
+from backend.scoring_service import anomalies_table_exists, fetch_recent_anomalies, fetch_service_metrics
 import matplotlib.pyplot as plt
 import altair as alt
 import plotly.express as px
@@ -19,12 +36,37 @@ page = st.sidebar.selectbox(
     ["Transaction Analysis", "Anomaly Detection", "User Analytics", "System Statistics"]
 )
 
-# Load transaction IDs from CSV
-@st.cache_data
-def load_transaction_data():
+TRANSACTIONS_CSV = "data/transactions_50k.csv"
+
+# Columns each page reads: transaction details and user histories show every
+# column, the statistics page only aggregates these
+DETAIL_COLUMNS = tuple(TRANSACTION_COLUMNS)
+OVERVIEW_COLUMNS = ("user_id", "amount", "location", "channel", "txn_type")
+
+# Transactions from the memory-mapped Arrow copy of the CSV (converted on
+# first use or when the CSV changes), as Arrow-backed frames over the mapped
+# file; pages ask only for the columns they use. One frame per column set
+# shared by all sessions: treat as read-only.
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _load_transaction_columns(columns, csv_mtime):
+    return load_transactions(TRANSACTIONS_CSV, list(columns))
+
+def load_transaction_data(columns):
     try:
-        df = pd.read_csv("data/transactions_50k.csv")
-        return df
+        return _load_transaction_columns(columns, os.path.getmtime(TRANSACTIONS_CSV))
+    except Exception as e:
+        st.error(f"❌ Could not load transactions: {e}")
+        return None
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _build_user_index(csv_mtime):
+    return UserIndex(_load_transaction_columns(DETAIL_COLUMNS, csv_mtime))
+
+def load_user_index():
+    # Frame sorted by (user_id, timestamp) plus user_id -> row range; built
+    # once per version of the CSV, like the frame it indexes
+    try:
+        return _build_user_index(os.path.getmtime(TRANSACTIONS_CSV))
     except Exception as e:
         st.error(f"❌ Could not load transactions: {e}")
         return None
@@ -41,301 +83,162 @@ client = get_client(
     secure=os.getenv("CLICKHOUSE_SECURE", "false").lower() == "true"
 )
 
-def get_anomalous_transactions():
-    # Fetch a sample of recent transactions (e.g., last 10,000)
+# Both engines score the transactions of the selected time window: "pandas"
+# in-process, "clickhouse" server-side, pulling back only the top-N rows and
+# aggregates
+SCORING_BACKENDS = ["pandas", "clickhouse"]
+SCORING_BACKEND = os.getenv("ANOMALY_SCORING_BACKEND", "pandas")
+
+# (column label, breakdown label) of the built-in flags; detectors registered
+# in backend/detectors.py are labelled from their flag name
+FLAG_LABELS = {
+    "is_large_transaction": ("Large Transaction", "Large Transactions"),
+    "is_amount_outlier": ("Amount Outlier", "Amount Outliers"),
+    "is_frequency_anomaly": ("Frequency Anomaly", "Frequency Anomalies"),
+    "is_geographic_anomaly": ("Geographic Anomaly", "Geographic Anomalies"),
+    "is_time_anomaly": ("Time Anomaly", "Time Anomalies"),
+    "is_channel_anomaly": ("Channel Anomaly", "Channel Anomalies"),
+}
+
+def flag_labels(flag):
+    name = flag.removeprefix("is_").replace("_", " ").title()
+    return FLAG_LABELS.get(flag, (name, name))
+
+def reported_flags(backend):
+    # Flags in the statistics and anomaly rows of a backend, in order: SQL
+    # computes the built-in six, pandas every registered detector
+    return FLAG_COLUMNS if backend == "clickhouse" else flag_columns()
+
+# Windows end at the newest transaction in the table (now, on a live feed),
+# so replayed or paused data still has something to show
+TIME_WINDOWS = {
+    "Last 1 hour": pd.Timedelta(hours=1),
+    "Last 24 hours": pd.Timedelta(hours=24),
+    "Last 7 days": pd.Timedelta(days=7),
+    "Custom": None,
+}
+DEFAULT_TIME_WINDOW = "Last 7 days"
+
+# Timestamp predicates on the partition key, so ClickHouse prunes whole
+# months and the cost follows the window, not the table. FINAL drops rows
+# re-ingested but not yet merged away by the ReplacingMergeTree; duplicates
+# share (timestamp, transaction_id) and so a partition, and only the
+# window's partitions are deduplicated.
+WINDOW_QUERY = """
+SELECT transaction_id, user_id, timestamp, amount, location, transaction_type AS txn_type, channel
+FROM transactions FINAL
+WHERE timestamp >= {start:DateTime} AND timestamp <= {end:DateTime}
+"""
+
+SCORED_WINDOW_TTL = int(os.getenv("SCORED_WINDOW_TTL", "600"))
+
+def fetch_transactions(query, parameters=None):
+    # Arrow result path: typed columns straight into the scoring code
+    df = query_df(client, query, TRANSACTION_COLUMNS, parameters)
+    return df if len(df) else None
+
+@st.cache_resource
+def scored_window_cache_stats():
+    return {"hits": 0, "misses": 0}
+
+def table_fingerprint():
+    # (max(timestamp), count()): answered from part metadata on the
+    # partitioned table, and changes as soon as new data lands. No FINAL:
+    # it only has to change, and unmerged duplicates change it too.
+    return tuple(client.query("SELECT max(timestamp), count() FROM transactions").first_row)
+
+@st.cache_resource(ttl=SCORED_WINDOW_TTL, max_entries=4, show_spinner=False)
+def _score_window(start, end, fingerprint):
+    # Only runs on a cache miss: new window, new fingerprint or expired TTL
+    scored_window_cache_stats()["misses"] += 1
+    df = fetch_transactions(WINDOW_QUERY, {"start": start, "end": end})
+    if df is None:
+        return None
+    # Sharded by user over SCORING_WORKERS processes for large windows
+    return score_transactions_parallel(df)
+
+def get_scored_window(start, end):
+    # One scored copy of the window shared by every view on the page (treat
+    # it as read-only), rescored when the table's fingerprint changes
+    stats = scored_window_cache_stats()
+    misses = stats["misses"]
+    scored = _score_window(start, end, table_fingerprint())
+    if stats["misses"] == misses:
+        stats["hits"] += 1
+    return scored
+
+def select_time_window():
+    # Sidebar window picker -> (start, end) datetimes, or None for an empty table
+    latest = table_fingerprint()[0]
+    if latest is None:
+        return None
+    latest = pd.Timestamp(latest)
+    choice = st.sidebar.radio("Time window:", list(TIME_WINDOWS), index=list(TIME_WINDOWS).index(DEFAULT_TIME_WINDOW))
+    if TIME_WINDOWS[choice] is not None:
+        return latest - TIME_WINDOWS[choice], latest
+    dates = st.sidebar.date_input(
+        "Date range:", value=((latest - pd.Timedelta(days=7)).date(), latest.date()), max_value=latest.date()
+    )
+    if len(dates) != 2:
+        st.sidebar.info("Pick an end date to finish the range.")
+        st.stop()
+    return pd.Timestamp(dates[0]), pd.Timestamp(dates[1]) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+
+def get_anomalous_transactions(window, backend=SCORING_BACKEND):
+    # Top anomalies among the transactions of the (start, end) window
     try:
-        query = """
-        SELECT transaction_id, user_id, timestamp, amount, location, transaction_type, channel
-        FROM transactions
-        ORDER BY timestamp DESC
-        LIMIT 10000
-        """
-        result = client.query(query)
-        rows = result.result_rows
-        if not rows:
+        if backend == "clickhouse":
+            return fetch_top_anomalous_transactions(client, 100, start=window[0], end=window[1]).values.tolist()
+        scored = get_scored_window(*window)
+        if scored is None:
             return []
-        df = pd.DataFrame(rows, columns=[
-            "transaction_id", "user_id", "timestamp", "amount", "location", "txn_type", "channel"
-        ])
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        # Large transaction flag
-        df['is_large_transaction'] = df['amount'] > 50000
-        # Outlier flag (z-score per user)
-        df['is_amount_outlier'] = False
-        for uid, group in df.groupby('user_id'):
-            mean = group['amount'].mean()
-            std = group['amount'].std()
-            idx = group.index
-            df.loc[idx, 'is_amount_outlier'] = (group['amount'] > mean + 3 * std) | (group['amount'] < mean - 3 * std)
-        # Frequency anomaly: more than 10 txns in 1 hour window
-        df = df.sort_values(['user_id', 'timestamp'])
-        df['txn_count_1h'] = 0
-        for uid, group in df.groupby('user_id'):
-            counts = []
-            times = group['timestamp']
-            for t in times:
-                count = times[(times >= t - pd.Timedelta(hours=1)) & (times <= t)].count()
-                counts.append(count)
-            df.loc[group.index, 'txn_count_1h'] = counts
-        df['is_frequency_anomaly'] = df['txn_count_1h'] > 10
-        # Geographic anomaly: new location per user
-        df['is_geographic_anomaly'] = False
-        for uid, group in df.groupby('user_id'):
-            known_locations = set()
-            geo_flags = []
-            for loc in group['location']:
-                geo_flags.append(loc not in known_locations)
-                known_locations.add(loc)
-            df.loc[group.index, 'is_geographic_anomaly'] = geo_flags
-        # Time anomaly: 2-5 AM
-        df['is_time_anomaly'] = df['timestamp'].dt.hour.between(2, 5)
-        # Channel anomaly: new channel per user
-        df['is_channel_anomaly'] = False
-        for uid, group in df.groupby('user_id'):
-            known_channels = set()
-            chan_flags = []
-            for chan in group['channel']:
-                chan_flags.append(chan not in known_channels)
-                known_channels.add(chan)
-            df.loc[group.index, 'is_channel_anomaly'] = chan_flags
-        # Composite anomaly score
-        df['anomaly_score'] = (
-            df['is_large_transaction'] * 3 +
-            df['is_amount_outlier'] * 2 +
-            df['is_frequency_anomaly'] * 2 +
-            df['is_geographic_anomaly'] * 1 +
-            df['is_time_anomaly'] * 1 +
-            df['is_channel_anomaly'] * 1
-        )
         # Only return anomalous transactions
-        anomalies = df[df['anomaly_score'] > 0].sort_values('anomaly_score', ascending=False).head(100)
-        return anomalies[[
-            "transaction_id", "user_id", "timestamp", "amount", "location", "txn_type", "channel",
-            "is_large_transaction", "is_amount_outlier", "is_frequency_anomaly", "is_geographic_anomaly",
-            "is_time_anomaly", "is_channel_anomaly", "anomaly_score"
-        ]].values.tolist()
+        return top_anomalous_transactions(scored, 100).values.tolist()
     except Exception as e:
         st.error(f"Error fetching anomalous transactions: {e}")
         return []
 
-def get_user_anomaly_summary(user_id):
-    # Fetch all transactions for the user
+def get_streamed_anomalies(limit=100):
+    # (rows, latest latency report) from the scoring service's `anomalies`
+    # table, or None when the service has never run against this database
     try:
-        query = f"""
-        SELECT transaction_id, user_id, timestamp, amount, location, transaction_type, channel
-        FROM transactions
-        WHERE user_id = {user_id}
-        ORDER BY timestamp
-        """
-        result = client.query(query)
-        rows = result.result_rows
-        if not rows:
+        if not anomalies_table_exists(client):
             return None
-        df = pd.DataFrame(rows, columns=[
-            "transaction_id", "user_id", "timestamp", "amount", "location", "txn_type", "channel"
-        ])
-        # Convert timestamp
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        # Large transaction flag
-        df['is_large_transaction'] = df['amount'] > 50000
-        # Outlier flag (z-score)
-        mean = df['amount'].mean()
-        std = df['amount'].std()
-        df['is_amount_outlier'] = (df['amount'] > mean + 3 * std) | (df['amount'] < mean - 3 * std)
-        # Frequency anomaly: more than 10 txns in 1 hour window
-        df = df.sort_values('timestamp')
-        txn_counts = []
-        for i, row in df.iterrows():
-            t = row['timestamp']
-            count = df[(df['timestamp'] >= t - pd.Timedelta(hours=1)) & (df['timestamp'] <= t)].shape[0]
-            txn_counts.append(count)
-        df['txn_count_1h'] = txn_counts
-        df['is_frequency_anomaly'] = df['txn_count_1h'] > 10
-        # Geographic anomaly: new location
-        known_locations = set()
-        geo_flags = []
-        for loc in df['location']:
-            geo_flags.append(loc not in known_locations)
-            known_locations.add(loc)
-        df['is_geographic_anomaly'] = geo_flags
-        # Time anomaly: 2-5 AM
-        df['is_time_anomaly'] = df['timestamp'].dt.hour.between(2, 5)
-        # Channel anomaly: new channel
-        known_channels = set()
-        chan_flags = []
-        for chan in df['channel']:
-            chan_flags.append(chan not in known_channels)
-            known_channels.add(chan)
-        df['is_channel_anomaly'] = chan_flags
-        # Composite anomaly score
-        df['anomaly_score'] = (
-            df['is_large_transaction'] * 3 +
-            df['is_amount_outlier'] * 2 +
-            df['is_frequency_anomaly'] * 2 +
-            df['is_geographic_anomaly'] * 1 +
-            df['is_time_anomaly'] * 1 +
-            df['is_channel_anomaly'] * 1
-        )
-        # Aggregate
-        summary = [
-            user_id,
-            len(df),
-            int(df['is_large_transaction'].sum()),
-            int(df['is_amount_outlier'].sum()),
-            int(df['is_frequency_anomaly'].sum()),
-            int(df['is_geographic_anomaly'].sum()),
-            int(df['is_time_anomaly'].sum()),
-            int(df['is_channel_anomaly'].sum()),
-            float(df['anomaly_score'].mean())
-        ]
-        return summary
+        return fetch_recent_anomalies(client, limit).values.tolist(), fetch_service_metrics(client)
+    except Exception as e:
+        st.error(f"Error fetching streamed anomalies: {e}")
+        return None
+
+def get_user_anomaly_summary(user_id):
+    try:
+        # Pre-aggregated profile plus the two flags that need the user's rows
+        return fetch_user_anomaly_summary(client, user_id)
     except Exception as e:
         st.error(f"Error fetching user anomaly summary: {e}")
         return None
 
-def get_anomaly_statistics():
-    # Use the same sample as get_anomalous_transactions
+def get_anomaly_statistics(window, backend=SCORING_BACKEND):
+    # Use the same window as get_anomalous_transactions
     try:
-        query = """
-        SELECT transaction_id, user_id, timestamp, amount, location, transaction_type, channel
-        FROM transactions
-        ORDER BY timestamp DESC
-        LIMIT 10000
-        """
-        result = client.query(query)
-        rows = result.result_rows
-        if not rows:
+        if backend == "clickhouse":
+            return fetch_anomaly_statistics(client, start=window[0], end=window[1])
+        scored = get_scored_window(*window)
+        if scored is None:
             return None
-        df = pd.DataFrame(rows, columns=[
-            "transaction_id", "user_id", "timestamp", "amount", "location", "txn_type", "channel"
-        ])
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        # Reuse flag logic from get_anomalous_transactions
-        df['is_large_transaction'] = df['amount'] > 50000
-        df['is_amount_outlier'] = False
-        for uid, group in df.groupby('user_id'):
-            mean = group['amount'].mean()
-            std = group['amount'].std()
-            idx = group.index
-            df.loc[idx, 'is_amount_outlier'] = (group['amount'] > mean + 3 * std) | (group['amount'] < mean - 3 * std)
-        df = df.sort_values(['user_id', 'timestamp'])
-        df['txn_count_1h'] = 0
-        for uid, group in df.groupby('user_id'):
-            counts = []
-            times = group['timestamp']
-            for t in times:
-                count = times[(times >= t - pd.Timedelta(hours=1)) & (times <= t)].count()
-                counts.append(count)
-            df.loc[group.index, 'txn_count_1h'] = counts
-        df['is_frequency_anomaly'] = df['txn_count_1h'] > 10
-        df['is_geographic_anomaly'] = False
-        for uid, group in df.groupby('user_id'):
-            known_locations = set()
-            geo_flags = []
-            for loc in group['location']:
-                geo_flags.append(loc not in known_locations)
-                known_locations.add(loc)
-            df.loc[group.index, 'is_geographic_anomaly'] = geo_flags
-        df['is_time_anomaly'] = df['timestamp'].dt.hour.between(2, 5)
-        df['is_channel_anomaly'] = False
-        for uid, group in df.groupby('user_id'):
-            known_channels = set()
-            chan_flags = []
-            for chan in group['channel']:
-                chan_flags.append(chan not in known_channels)
-                known_channels.add(chan)
-            df.loc[group.index, 'is_channel_anomaly'] = chan_flags
-        df['anomaly_score'] = (
-            df['is_large_transaction'] * 3 +
-            df['is_amount_outlier'] * 2 +
-            df['is_frequency_anomaly'] * 2 +
-            df['is_geographic_anomaly'] * 1 +
-            df['is_time_anomaly'] * 1 +
-            df['is_channel_anomaly'] * 1
-        )
-        stats = [
-            len(df),
-            int(df['is_large_transaction'].sum()),
-            int(df['is_amount_outlier'].sum()),
-            int(df['is_frequency_anomaly'].sum()),
-            int(df['is_geographic_anomaly'].sum()),
-            int(df['is_time_anomaly'].sum()),
-            int(df['is_channel_anomaly'].sum()),
-            float(df['anomaly_score'].mean())
-        ]
-        return stats
+        return anomaly_statistics(scored)
     except Exception as e:
         st.error(f"Error fetching anomaly statistics: {e}")
         return None
 
-def get_top_anomalous_users(limit=10):
-    # Use the same sample as get_anomalous_transactions
+def get_top_anomalous_users(window, limit=10, backend=SCORING_BACKEND):
+    # Use the same window as get_anomalous_transactions, all six flags
     try:
-        query = """
-        SELECT transaction_id, user_id, timestamp, amount, location, transaction_type, channel
-        FROM transactions
-        ORDER BY timestamp DESC
-        LIMIT 10000
-        """
-        result = client.query(query)
-        rows = result.result_rows
-        if not rows:
+        if backend == "clickhouse":
+            return fetch_top_anomalous_users(client, limit, start=window[0], end=window[1]).values.tolist()
+        scored = get_scored_window(*window)
+        if scored is None:
             return []
-        df = pd.DataFrame(rows, columns=[
-            "transaction_id", "user_id", "timestamp", "amount", "location", "txn_type", "channel"
-        ])
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        # Reuse flag logic from get_anomalous_transactions
-        df['is_large_transaction'] = df['amount'] > 50000
-        df['is_amount_outlier'] = False
-        for uid, group in df.groupby('user_id'):
-            mean = group['amount'].mean()
-            std = group['amount'].std()
-            idx = group.index
-            df.loc[idx, 'is_amount_outlier'] = (group['amount'] > mean + 3 * std) | (group['amount'] < mean - 3 * std)
-        df = df.sort_values(['user_id', 'timestamp'])
-        df['txn_count_1h'] = 0
-        for uid, group in df.groupby('user_id'):
-            counts = []
-            times = group['timestamp']
-            for t in times:
-                count = times[(times >= t - pd.Timedelta(hours=1)) & (times <= t)].count()
-                counts.append(count)
-            df.loc[group.index, 'txn_count_1h'] = counts
-        df['is_frequency_anomaly'] = df['txn_count_1h'] > 10
-        df['is_geographic_anomaly'] = False
-        for uid, group in df.groupby('user_id'):
-            known_locations = set()
-            geo_flags = []
-            for loc in group['location']:
-                geo_flags.append(loc not in known_locations)
-                known_locations.add(loc)
-            df.loc[group.index, 'is_geographic_anomaly'] = geo_flags
-        df['is_time_anomaly'] = df['timestamp'].dt.hour.between(2, 5)
-        df['is_channel_anomaly'] = False
-        for uid, group in df.groupby('user_id'):
-            known_channels = set()
-            chan_flags = []
-            for chan in group['channel']:
-                chan_flags.append(chan not in known_channels)
-                known_channels.add(chan)
-            df.loc[group.index, 'is_channel_anomaly'] = chan_flags
-        df['anomaly_score'] = (
-            df['is_large_transaction'] * 3 +
-            df['is_amount_outlier'] * 2 +
-            df['is_frequency_anomaly'] * 2 +
-            df['is_geographic_anomaly'] * 1 +
-            df['is_time_anomaly'] * 1 +
-            df['is_channel_anomaly'] * 1
-        )
-        user_stats = df.groupby('user_id').agg(
-            transaction_count=('transaction_id', 'count'),
-            avg_anomaly_score=('anomaly_score', 'mean'),
-            total_anomaly_score=('anomaly_score', 'sum')
-        ).reset_index()
-        user_stats = user_stats[user_stats['avg_anomaly_score'] > 0]
-        user_stats = user_stats.sort_values('avg_anomaly_score', ascending=False).head(limit)
-        return user_stats.values.tolist()
+        return top_anomalous_users(scored, limit).values.tolist()
     except Exception as e:
         st.error(f"Error fetching top anomalous users: {e}")
         return []
@@ -347,7 +250,7 @@ if page == "Transaction Analysis":
     st.title("🔍 Transaction Anomaly Explainer")
     st.markdown("Use the dropdown below to select a transaction ID and get an AI-generated explanation for why it may be anomalous.")
 
-    df = load_transaction_data()
+    df = load_transaction_data(DETAIL_COLUMNS)
     if df is not None:
         txn_ids = df['transaction_id'].unique().tolist()
         
@@ -361,13 +264,20 @@ if page == "Transaction Analysis":
             model_choice = st.radio("Choose AI Model:", ["mistral (local)", "gemini-pro (cloud)"])
             
             if st.button("🧠 Explain Anomaly", type="primary"):
-                with st.spinner("Analyzing transaction and generating insights..."):
-                    explanation = explain_transaction_ids(txn_id, model_choice)
-                    st.success("Explanation Ready!")
-                    st.markdown("---")
-                    st.markdown(f"**Transaction ID**: `{txn_id}`")
-                    st.markdown("### 🤖 AI Explanation")
-                    st.write(explanation)
+                st.markdown("---")
+                st.markdown(f"**Transaction ID**: `{txn_id}`")
+                st.markdown("### 🤖 AI Explanation")
+                # Tokens render as they are generated instead of after the whole completion
+                metrics = StreamMetrics(model_choice)
+                st.write_stream(explain_transaction_stream(txn_id, model_choice, metrics))
+                if metrics.cached:
+                    st.caption("From the explanation cache")
+                elif metrics.time_to_first_token is not None:
+                    tokens_per_sec = metrics.tokens_per_sec
+                    st.caption(
+                        f"First token after {metrics.time_to_first_token:.2f}s"
+                        + (f" · {tokens_per_sec:.1f} tokens/s" if tokens_per_sec else "")
+                    )
 
         with col2:
             # Show transaction details
@@ -378,7 +288,7 @@ if page == "Transaction Analysis":
                     "Transaction ID": transaction['transaction_id'],
                     "User ID": int(transaction['user_id']),
                     "Amount": f"₹{transaction['amount']:,.2f}",
-                    "Timestamp": transaction['timestamp'],
+                    "Timestamp": transaction['timestamp'].strftime('%d-%m-%Y %H:%M'),
                     "Location": transaction['location'],
                     "Type": transaction['txn_type'],
                     "Channel": transaction['channel']
@@ -386,11 +296,24 @@ if page == "Transaction Analysis":
 
         # Graph display
         st.markdown("### 🕸️ Transaction Graph")
-        graph = create_pyvis_graph(txn_id)
+        col1, col2 = st.columns(2)
+        with col1:
+            graph_depth = st.select_slider(
+                "Neighborhood depth (hops):", options=list(range(1, MAX_GRAPH_DEPTH + 1)), value=1,
+                help="2 adds the user's other transactions and others at the same location/channel; 3 adds their users."
+            )
+        with col2:
+            node_budget = st.number_input(
+                "Node budget", min_value=10, max_value=1000, value=GRAPH_NODE_BUDGET, step=10,
+                help=f"Hubs with more than {GRAPH_HUB_DEGREE} relationships are shown as a sample plus a cluster node."
+            )
+        # Rendered in memory and cached per transaction; no graph.html on disk
+        graph = graph_html(txn_id, graph_depth, int(node_budget))
         if graph:
-            graph.save_graph("graph.html")
-            with open("graph.html", "r", encoding="utf-8") as f:
-                html = f.read()
+            html, truncated = graph
+            if truncated:
+                st.info(f"Showing the nearest {int(node_budget):,} nodes; the neighborhood is larger. "
+                        "Raise the node budget to see more.")
             components.html(html, height=450)
         else:
             st.warning(f"No graph data available for transaction `{txn_id}`.")
@@ -398,18 +321,29 @@ if page == "Transaction Analysis":
 elif page == "Anomaly Detection":
     st.title("🚨 Anomaly Detection Dashboard")
     st.markdown("Real-time anomaly detection using ClickHouse SQL expressions and AI analysis.")
+
+    scoring_backend = st.sidebar.radio(
+        "Scoring engine:", SCORING_BACKENDS, index=SCORING_BACKENDS.index(SCORING_BACKEND),
+        help="Both score the selected time window: pandas in-process, clickhouse server-side."
+    )
+    window = select_time_window()
+    if window is None:
+        st.info("No transactions loaded yet.")
+        st.stop()
+    st.caption(f"Scoring transactions from {window[0]:%d-%m-%Y %H:%M} to {window[1]:%d-%m-%Y %H:%M}.")
     
     # Get anomaly statistics
-    stats = get_anomaly_statistics()
+    stats = get_anomaly_statistics(window, scoring_backend)
     if stats:
+        flag_counts = dict(zip(reported_flags(scoring_backend), stats[1:-1]))
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
             st.metric("Total Transactions", f"{stats[0]:,}")
         with col2:
-            st.metric("Anomalous Transactions", f"{stats[1] + stats[2] + stats[3] + stats[4] + stats[5] + stats[6]:,}")
+            st.metric("Anomalous Transactions", f"{sum(flag_counts.values()):,}")
         with col3:
-            st.metric("Avg Anomaly Score", f"{stats[7]:.2f}")
+            st.metric("Avg Anomaly Score", f"{stats[-1]:.2f}")
         with col4:
             st.metric("Max Anomaly Score", "-")
     
@@ -419,14 +353,7 @@ elif page == "Anomaly Detection":
         col1, col2 = st.columns(2)
         
         with col1:
-            anomaly_data = {
-                "Large Transactions": stats[1],
-                "Amount Outliers": stats[2],
-                "Frequency Anomalies": stats[3],
-                "Geographic Anomalies": stats[4],
-                "Time Anomalies": stats[5],
-                "Channel Anomalies": stats[6]
-            }
+            anomaly_data = {flag_labels(flag)[1]: count for flag, count in flag_counts.items()}
             st.bar_chart(anomaly_data)
         
         with col2:
@@ -436,7 +363,7 @@ elif page == "Anomaly Detection":
     
     # Top anomalous users
     st.markdown("### 👥 Top Anomalous Users")
-    top_users = get_top_anomalous_users(10)
+    top_users = get_top_anomalous_users(window, 10, scoring_backend)
     if top_users:
         user_data = pd.DataFrame(top_users, columns=[
             "User ID", "Transaction Count", "Avg Anomaly Score", "Total Anomaly Score"
@@ -445,15 +372,48 @@ elif page == "Anomaly Detection":
     
     # Anomalous transactions table
     st.markdown("### 🚨 Recent Anomalous Transactions")
-    anomalies = get_anomalous_transactions()
+    streamed = get_streamed_anomalies(100)
+    if streamed is not None:
+        anomalies, service_metrics = streamed
+        anomaly_flags = FLAG_COLUMNS
+        if service_metrics:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Scored by Service", f"{service_metrics['processed']:,}")
+            with col2:
+                st.metric("Flagged", f"{service_metrics['flagged']:,}")
+            with col3:
+                st.metric("Scoring p50 / p99", f"{service_metrics['score_p50_us']:.0f} / {service_metrics['score_p99_us']:.0f} µs")
+            with col4:
+                st.metric("Write p50 / p99", f"{service_metrics['write_p50_ms']:.0f} / {service_metrics['write_p99_ms']:.0f} ms")
+        st.caption("Newest first, from the `anomalies` table written by the scoring service.")
+    else:
+        anomalies = get_anomalous_transactions(window, scoring_backend)
+        anomaly_flags = reported_flags(scoring_backend)
+        st.caption("Scored on demand for the selected window. Run `python -m backend.scoring_service` to stream anomalies into ClickHouse instead.")
     if anomalies:
         anomaly_df = pd.DataFrame(anomalies, columns=[
             "Transaction ID", "User ID", "Timestamp", "Amount", "Location", 
-            "Type", "Channel", "Large Transaction", 
-            "Amount Outlier", "Frequency Anomaly", "Geographic Anomaly", 
-            "Time Anomaly", "Channel Anomaly", "Anomaly Score"
-        ])
-        st.dataframe(anomaly_df, use_container_width=True)
+            "Type", "Channel"
+        ] + [flag_labels(flag)[0] for flag in anomaly_flags] + ["Anomaly Score"])
+        table = st.empty()
+        table.dataframe(anomaly_df, use_container_width=True)
+
+        # Explain every row of the table, filling explanations in as they finish
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            batch_model = st.radio("AI Model for batch explanations:", ["mistral (local)", "gemini-pro (cloud)"], horizontal=True)
+        with col2:
+            concurrency = st.number_input("Parallel LLM calls", min_value=1, max_value=16, value=4)
+        if st.button("🧠 Explain All Anomalies"):
+            anomaly_df["AI Explanation"] = "⏳ pending"
+            progress = st.progress(0.0, text="Explaining anomalies...")
+            for done, (txn_id, explanation) in enumerate(
+                explain_transactions(anomaly_df["Transaction ID"], batch_model, max_workers=int(concurrency)), start=1
+            ):
+                anomaly_df.loc[anomaly_df["Transaction ID"] == txn_id, "AI Explanation"] = explanation
+                table.dataframe(anomaly_df, use_container_width=True)
+                progress.progress(done / len(anomaly_df), text=f"Explained {done} of {len(anomaly_df)} anomalies")
     else:
         st.info("No anomalous transactions found.")
 
@@ -461,10 +421,10 @@ elif page == "User Analytics":
     st.title("👤 User Analytics")
     st.markdown("Detailed analysis of user behavior and anomaly patterns.")
     
-    df = load_transaction_data()
-    if df is not None:
+    user_index = load_user_index()
+    if user_index is not None:
         # User selection
-        user_ids = sorted(df['user_id'].unique())
+        user_ids = user_index.user_ids.tolist()
         selected_user = st.selectbox("Select User ID:", user_ids)
         
         if selected_user:
@@ -485,13 +445,11 @@ elif page == "User Analytics":
                     st.metric("Total Anomalies", anomaly_count)
                 
                 # User transaction history
-                user_transactions = df[df['user_id'] == selected_user]
+                # Already sorted by timestamp; a slice, not a scan of every user
+                user_transactions = user_index.rows(selected_user)
                 st.markdown("### 📈 Transaction History")
                 
                 # Amount over time
-                user_transactions['timestamp'] = pd.to_datetime(user_transactions['timestamp'], format='%d-%m-%Y %H:%M')
-                user_transactions = user_transactions.sort_values('timestamp')
-                
                 st.line_chart(user_transactions.set_index('timestamp')['amount'])
                 
                 # Transaction details
@@ -502,7 +460,7 @@ elif page == "System Statistics":
     st.title("📊 System Statistics")
     st.markdown("Overall system performance and data insights.")
     
-    df = load_transaction_data()
+    df = load_transaction_data(OVERVIEW_COLUMNS)
     if df is not None:
         # Data overview
         st.markdown("### 📈 Data Overview")
@@ -513,9 +471,10 @@ elif page == "System Statistics":
         with col2:
             st.metric("Unique Users", f"{df['user_id'].nunique():,}")
         with col3:
-            st.metric("Total Amount", f"₹{df['amount'].sum():,.2f}")
+            # amount is float32; aggregate in float64 so the total keeps its paise
+            st.metric("Total Amount", f"₹{df['amount'].astype('float64').sum():,.2f}")
         with col4:
-            st.metric("Avg Transaction", f"₹{df['amount'].mean():,.2f}")
+            st.metric("Avg Transaction", f"₹{df['amount'].astype('float64').mean():,.2f}")
         
         # Location analysis
         st.markdown("### 🌍 Location Analysis")
@@ -538,6 +497,55 @@ elif page == "System Statistics":
         fig.update_layout(bargap=0.1, xaxis_title="Amount", yaxis_title="Frequency")
         st.plotly_chart(fig, use_container_width=True)
 
+    # Scored-window cache effectiveness
+    st.markdown("### ⚡ Scoring Cache")
+    cache_stats = scored_window_cache_stats()
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Cache Hits", f"{cache_stats['hits']:,}")
+    with col2:
+        st.metric("Cache Misses", f"{cache_stats['misses']:,}")
+    with col3:
+        st.metric("Hit Rate", f"{cache_stats['hits'] / lookups:.0%}" if lookups else "-")
+
+    # Rendered transaction graphs
+    st.markdown("### 🕸️ Graph Cache")
+    graph_stats = graph_cache.stats
+    lookups = graph_stats["hits"] + graph_stats["misses"]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Cached Graphs", f"{len(graph_cache):,} / {graph_cache.max_entries:,}")
+    with col2:
+        st.metric("Cache Hits", f"{graph_stats['hits']:,}")
+    with col3:
+        st.metric("Hit Rate", f"{graph_stats['hits'] / lookups:.0%}" if lookups else "-")
+
+    # LLM explanation cache effectiveness
+    st.markdown("### 🧠 Explanation Cache")
+    llm_stats = explanation_cache.stats
+    hit_rate = explanation_cache.hit_rate()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Cache Hits", f"{llm_stats['hits']:,}")
+    with col2:
+        st.metric("Shared In-Flight", f"{llm_stats['shared']:,}")
+    with col3:
+        st.metric("Hit Rate", f"{hit_rate:.0%}" if hit_rate is not None else "-")
+    with col4:
+        st.metric("LLM Time Saved", f"{llm_stats['latency_saved']:,.1f}s")
+
+    # Streaming latency of recent explanations
+    ttfts = [m.time_to_first_token for m in stream_metrics if m.time_to_first_token is not None]
+    rates = [m.tokens_per_sec for m in stream_metrics if m.tokens_per_sec]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Streamed Explanations", f"{len(stream_metrics):,}")
+    with col2:
+        st.metric("Avg Time to First Token", f"{sum(ttfts) / len(ttfts):.2f}s" if ttfts else "-")
+    with col3:
+        st.metric("Avg Tokens/sec", f"{sum(rates) / len(rates):.1f}" if rates else "-")
+
 st.markdown("---")
 st.caption("Powered by GraphRAG + ClickHouse SQL Expressions + LLM magic")
 
@@ -1,8 +1,7 @@
-import requests
-import json
+from backend.llm_client import OLLAMA_URL, LLMError, iter_ndjson, ollama
 
-def get_mistral_explanation(transaction):
-    prompt = f"""
+def build_prompt(transaction):
+    return f"""
     Explain why the following transaction might be considered anomalous:
 
     Transaction Details:
@@ -16,23 +15,50 @@ def get_mistral_explanation(transaction):
     Provide a short and insightful explanation.
     """
 
-    response = requests.post(
-        'http://localhost:11434/api/generate',
-        json={
-            "model": "mistral",
-            "prompt": prompt,
-            "stream": False
-        }
-    )
+def get_mistral_explanation(transaction):
+    prompt = build_prompt(transaction)
 
     try:
+        response = ollama.post(
+            OLLAMA_URL,
+            {
+                "model": "mistral",
+                "prompt": prompt,
+                "stream": False
+            }
+        )
         content = response.json()["response"]
         return content.strip()
-    except Exception as e:
+    except (LLMError, ValueError, KeyError) as e:
         return f"❌ Error: {e}"
 
-# Example usage (grabbed from your earlier anomaly)
-anomalous_txn = (101, "2024-01-01 10:27:45", 95000.0, 'New York', 'transfer', 'mobile')
+def stream_mistral_explanation(transaction):
+    # Yields the explanation chunk by chunk from Ollama's NDJSON stream
+    prompt = build_prompt(transaction)
+
+    try:
+        with ollama.post(
+            OLLAMA_URL,
+            {
+                "model": "mistral",
+                "prompt": prompt,
+                "stream": True
+            },
+            stream=True
+        ) as response:
+            # Broken connections, bad lines and error frames raise LLMError
+            for chunk in iter_ndjson(ollama, response):
+                yield chunk.get("response", "")
+                if chunk.get("done"):
+                    return
+    except LLMError as e:
+        yield f"❌ Error: {e}"
+
+if __name__ == "__main__":
+    # Example usage (grabbed from your earlier anomaly)
+    anomalous_txn = (101, "2024-01-01 10:27:45", 95000.0, 'New York', 'transfer', 'mobile')
 
-print("🤖 Mistral says:\n")
-print(get_mistral_explanation(anomalous_txn))
+    print("🤖 Mistral says:\n")
+    for chunk in stream_mistral_explanation(anomalous_txn):
+        print(chunk, end="", flush=True)
+    print()
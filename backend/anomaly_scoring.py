@@ -0,0 +1,189 @@
+# backend/anomaly_scoring.py
+#
+# Vectorized anomaly scoring shared by the dashboard helpers in app.py.
+# Every rule works on whole columns so the cost is O(n log n) in the size of
+# the scored window instead of a Python loop per user (and per row for the
+# 1-hour frequency check).
+#
+# The rules are the detectors registered in backend/detectors.py. A
+# ScoringBatch sorts the frame by (user_id, timestamp) once and computes each
+# intermediate the detectors share (per-user mean/std, 1-hour counts, hours,
+# first-seen masks) the first time one asks for it. Every detector then
+# scores the same arrays, and the rows are copied into the result once.
+
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from backend.detectors import (
+    FLAG_COLUMNS, FLAG_WEIGHTS, FREQUENCY_THRESHOLD, FREQUENCY_WINDOW,
+    LARGE_TRANSACTION_THRESHOLD, NIGHT_HOURS, OUTLIER_STD_MULTIPLIER, flag_columns, get_detectors
+)
+
+HOUR_NS = 3_600_000_000_000
+
+TRANSACTION_COLUMNS = [
+    "transaction_id", "user_id", "timestamp", "amount", "location", "txn_type", "channel"
+]
+
+
+def _window_counts(groups, times, window):
+    # Number of rows of the same group with times in [t - window, t], for rows
+    # sorted by (group, time). Ties at t count too, matching the old mask scan.
+    n = len(times)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # Right bound: one past the last row sharing the same (group, time)
+    change = np.flatnonzero((groups[1:] != groups[:-1]) | (times[1:] != times[:-1])) + 1
+    run_ends = np.append(change, n)
+    run_ids = np.zeros(n, dtype=np.int64)
+    run_ids[change] = 1
+    right = run_ends[np.cumsum(run_ids)]
+
+    # Left bound: merge the (group, t - window) probes into the sorted rows;
+    # probes sort before equal rows so the window start is inclusive
+    probe_times = times - window
+    order = np.lexsort((
+        np.concatenate([np.ones(n, dtype=np.int8), np.zeros(n, dtype=np.int8)]),
+        np.concatenate([times, probe_times]),
+        np.concatenate([groups, groups]),
+    ))
+    probe_pos = np.flatnonzero(order >= n)
+    left = np.empty(n, dtype=np.int64)
+    left[order[probe_pos] - n] = probe_pos - np.arange(n)
+
+    return right - left
+
+
+class ScoringBatch:
+    # The columns of a frame as numpy arrays in (user_id, timestamp) order,
+    # plus the intermediates detectors share, each computed on first use.
+    # Callers can set an intermediate (e.g. amount_mean from a stored
+    # baseline) before scoring to replace the in-batch value.
+
+    def __init__(self, df):
+        self.frame = df
+        self.timestamps = pd.to_datetime(df['timestamp'])
+        times = self.timestamps.to_numpy(dtype='datetime64[ns]').view('int64')
+        # Dense user codes in user_id order; lexsort is stable, so rows with
+        # the same user and timestamp keep their order like sort_values
+        user_codes = pd.factorize(df['user_id'], sort=True)[0]
+        self.user_codes = user_codes
+        self.order = np.lexsort((times, user_codes))
+        self.groups = user_codes[self.order]
+        self.times = times[self.order]
+        self.columns = {}
+        # column -> bool per row (batch order): the user's value was already
+        # seen before this batch, so it isn't a first sighting
+        self.history = {}
+        self._first_seen = {}
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, column):
+        values = self.columns.get(column)
+        if values is None:
+            values = self.columns[column] = self.frame[column].to_numpy()[self.order]
+        return values
+
+    @cached_property
+    def _user_stats(self):
+        # Mean and sample std of each user's amounts, grouped in the frame's
+        # own row order so the sums match groupby on the unsorted frame;
+        # float32 amounts (Arrow/ClickHouse Float32) get float64 statistics,
+        # like toFloat64 on the server
+        amounts = self.frame['amount'].astype('float64').to_numpy()
+        stats = pd.Series(amounts).groupby(self.user_codes).agg(['mean', 'std'])
+        return stats['mean'].to_numpy()[self.groups], stats['std'].to_numpy()[self.groups]
+
+    @cached_property
+    def amount_mean(self):
+        return self._user_stats[0]
+
+    @cached_property
+    def amount_std(self):
+        return self._user_stats[1]
+
+    @cached_property
+    def window_counts(self):
+        # Rows of the user in [t - FREQUENCY_WINDOW, t]
+        return _window_counts(self.groups, self.times, np.int64(FREQUENCY_WINDOW.value))
+
+    @cached_property
+    def hours(self):
+        if self.timestamps.dt.tz is None:
+            return (self.times // HOUR_NS) % 24
+        return self.timestamps.dt.hour.to_numpy()[self.order]
+
+    def first_seen(self, column):
+        # The user's first row with this value of `column`
+        first = self._first_seen.get(column)
+        if first is None:
+            codes = pd.factorize(self.frame[column])[0][self.order].astype(np.int64)
+            pairs = self.groups.astype(np.int64) * (int(codes.max(initial=0)) + 2) + codes + 1
+            first = ~pd.Series(pairs).duplicated().to_numpy()
+            if column in self.history:
+                first &= ~self.history[column]
+            self._first_seen[column] = first
+        return first
+
+
+def _check_columns(df, detectors):
+    for detector in detectors:
+        missing = [col for col in detector.columns if col not in df.columns]
+        if missing:
+            raise KeyError(f"{detector.name} needs columns {missing}")
+
+
+def score_batch(batch, detectors):
+    # The batch's frame in (user_id, timestamp) order with one flag column
+    # per detector, the detectors' extra outputs and anomaly_score
+    flags = np.empty((len(batch), len(detectors)), dtype=bool)
+    for j, detector in enumerate(detectors):
+        flags[:, j] = detector.score(batch)
+
+    scored = batch.frame.take(batch.order)
+    scored['timestamp'] = batch.timestamps.array.take(batch.order)
+    for j, detector in enumerate(detectors):
+        scored[detector.name] = flags[:, j]
+    for detector in detectors:
+        for column, intermediate in detector.outputs.items():
+            scored[column] = getattr(batch, intermediate)
+    weights = np.array([detector.weight for detector in detectors], dtype=np.int64)
+    scored['anomaly_score'] = flags.astype(np.int64) @ weights
+    return scored
+
+
+def score_transactions(df, detectors=None):
+    # Adds a flag per detector (the six of FLAG_COLUMNS unless more are
+    # registered), txn_count_1h and anomaly_score to a frame of
+    # TRANSACTION_COLUMNS. The result is ordered by (user_id, timestamp) with
+    # the original index labels kept, like the loop-based helpers it replaces.
+    detectors = get_detectors() if detectors is None else detectors
+    _check_columns(df, detectors)
+    return score_batch(ScoringBatch(df), detectors)
+
+
+def anomaly_statistics(scored):
+    # [total, <count per flag in flag_columns() order>, mean anomaly score]
+    return [len(scored)] + [int(scored[col].sum()) for col in flag_columns()] + [
+        float(scored['anomaly_score'].mean())
+    ]
+
+
+def top_anomalous_transactions(scored, limit=100):
+    anomalies = scored[scored['anomaly_score'] > 0].sort_values('anomaly_score', ascending=False).head(limit)
+    return anomalies[TRANSACTION_COLUMNS + flag_columns() + ['anomaly_score']]
+
+
+def top_anomalous_users(scored, limit=10):
+    user_stats = scored.groupby('user_id').agg(
+        transaction_count=('transaction_id', 'count'),
+        avg_anomaly_score=('anomaly_score', 'mean'),
+        total_anomaly_score=('anomaly_score', 'sum')
+    ).reset_index()
+    user_stats = user_stats[user_stats['avg_anomaly_score'] > 0]
+    return user_stats.sort_values('avg_anomaly_score', ascending=False).head(limit)
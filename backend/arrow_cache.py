@@ -0,0 +1,133 @@
+# backend/arrow_cache.py
+#
+# Columnar copy of the transactions CSV for the dashboard. The CSV is
+# converted once into an uncompressed Arrow IPC file: location, channel and
+# txn_type as dictionary-encoded columns, user_id int32, amount float32 and
+# timestamp as a native timestamp. The dashboard memory-maps that file and
+# reads only the columns a page needs, as Arrow-backed frames, so nothing is
+# parsed at startup and the data stays in the page cache.
+#
+#   python -m backend.arrow_cache data/transactions_50k.csv
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+CSV_PATH = "data/transactions_50k.csv"
+CHUNK_SIZE = 100_000
+TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M"
+
+CATEGORICAL_COLUMNS = ["location", "channel", "txn_type"]
+SCHEMA = pa.schema([
+    ("transaction_id", pa.string()),
+    ("user_id", pa.int32()),
+    ("amount", pa.float32()),
+    ("timestamp", pa.timestamp("s")),
+    ("location", pa.dictionary(pa.int32(), pa.string())),
+    ("channel", pa.dictionary(pa.int32(), pa.string())),
+    ("txn_type", pa.dictionary(pa.int32(), pa.string())),
+])
+CSV_DTYPES = {
+    "transaction_id": str,
+    "user_id": "int32",
+    "amount": "float32",
+    "timestamp": str,
+    "location": str,
+    "channel": str,
+    "txn_type": str,
+}
+
+
+def arrow_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".arrow"
+
+
+def read_dictionaries(csv_path, chunk_size=CHUNK_SIZE):
+    # The IPC file format allows one dictionary per column, so the full
+    # (small) set of values is collected in a first pass over three columns
+    values = {column: set() for column in CATEGORICAL_COLUMNS}
+    for chunk in pd.read_csv(csv_path, usecols=CATEGORICAL_COLUMNS, dtype=str, chunksize=chunk_size):
+        for column in CATEGORICAL_COLUMNS:
+            values[column].update(chunk[column].dropna().unique())
+    return {column: pa.array(sorted(found), pa.string()) for column, found in values.items()}
+
+
+def chunk_to_batch(chunk, dictionaries):
+    columns = {
+        "transaction_id": pa.array(chunk["transaction_id"], pa.string()),
+        "user_id": pa.array(chunk["user_id"], pa.int32()),
+        "amount": pa.array(chunk["amount"], pa.float32()),
+        "timestamp": pa.array(
+            pd.to_datetime(chunk["timestamp"], format=TIMESTAMP_FORMAT, errors="coerce"), pa.timestamp("s")
+        ),
+    }
+    for column in CATEGORICAL_COLUMNS:
+        codes = pd.Categorical(chunk[column], categories=dictionaries[column].to_pylist()).codes
+        indices = pa.array(codes, pa.int32(), mask=codes < 0)
+        columns[column] = pa.DictionaryArray.from_arrays(indices, dictionaries[column])
+    return pa.record_batch([columns[field.name] for field in SCHEMA], schema=SCHEMA)
+
+
+def convert_csv_to_arrow(csv_path=CSV_PATH, arrow_path=None, chunk_size=CHUNK_SIZE):
+    # Streams the CSV chunk by chunk into the IPC file; written to a
+    # temporary file unique to this writer (processes converting at the same
+    # time don't share it) and renamed so readers never map a half-written file
+    arrow_path = arrow_path or arrow_path_for(csv_path)
+    dictionaries = read_dictionaries(csv_path, chunk_size)
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(os.path.abspath(arrow_path)), prefix=os.path.basename(arrow_path) + ".",
+        suffix=".tmp", delete=False
+    ) as tmp:
+        tmp_path = tmp.name
+    rows = 0
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, SCHEMA) as writer:
+            for chunk in pd.read_csv(csv_path, dtype=CSV_DTYPES, chunksize=chunk_size):
+                writer.write_batch(chunk_to_batch(chunk, dictionaries))
+                rows += len(chunk)
+        os.replace(tmp_path, arrow_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return rows
+
+
+def ensure_arrow_cache(csv_path=CSV_PATH, arrow_path=None):
+    # Path of an Arrow file at least as new as the CSV, converting if needed
+    arrow_path = arrow_path or arrow_path_for(csv_path)
+    if not os.path.exists(arrow_path) or os.path.getmtime(arrow_path) < os.path.getmtime(csv_path):
+        convert_csv_to_arrow(csv_path, arrow_path)
+    return arrow_path
+
+
+def open_transactions(arrow_path, columns=None):
+    # Zero-copy pyarrow Table backed by the memory-mapped file
+    source = pa.memory_map(arrow_path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
+
+
+def load_transactions(csv_path=CSV_PATH, columns=None):
+    # DataFrame with only `columns`, Arrow-backed (pd.ArrowDtype): the
+    # columns wrap the memory-mapped buffers instead of being copied onto
+    # the heap, so a page costs the file pages it touches
+    table = open_transactions(ensure_arrow_cache(csv_path), columns)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the transactions CSV to a memory-mappable Arrow file")
+    parser.add_argument("csv_path", nargs="?", default=CSV_PATH)
+    parser.add_argument("--output", help="Arrow file to write (default: next to the CSV, .arrow)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    output = args.output or arrow_path_for(args.csv_path)
+    rows = convert_csv_to_arrow(args.csv_path, output, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Wrote {rows:,} transactions to {output} ({os.path.getsize(output) / 1e6:.1f} MB) in {elapsed:.1f}s")
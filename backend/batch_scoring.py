@@ -0,0 +1,213 @@
+# backend/batch_scoring.py
+#
+# Headless backfill: scores the whole `transactions` table, or a date range,
+# with anomaly_scoring.score_transactions and writes anomaly_score, the six
+# flags and txn_count_1h to `anomaly_scores`. Nothing here touches Streamlit.
+#
+# Work is split into chunks of whole users: contiguous user_id ranges of
+# about --chunk-rows rows, each read through the by_user projection, scored
+# in memory and bulk-inserted. Memory is bounded by the chunk, not the table,
+# and since a user never spans two chunks the per-user rules see all of the
+# user's rows in the range.
+#
+# After each chunk, the run's checkpoint (last user_id done) is saved in
+# `batch_scoring_checkpoints`. An interrupted run started again with the same
+# range carries on after that user. A chunk that was written but not
+# checkpointed is written again; `anomaly_scores` is a ReplacingMergeTree
+# keyed by (user_id, timestamp, transaction_id) and keeps the latest copy.
+# Flags depend on the range scored (like the dashboard's time window), so
+# scoring an overlapping range replaces those rows' scores.
+#
+#   python -m backend.batch_scoring
+#   python -m backend.batch_scoring --start 2024-01-01 --end 2024-06-30 --chunk-rows 2000000
+
+import argparse
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from backend.anomaly_scoring import TRANSACTION_COLUMNS
+from backend.detectors import flag_columns
+from backend.clickhouse_arrow import query_df
+from backend.parallel_scoring import SCORING_WORKERS, score_transactions_parallel
+
+CHUNK_ROWS = 1_000_000
+NO_USER = -1  # checkpoint of a run that hasn't finished any chunk
+
+RANGE_FILTER = "AND timestamp >= {start:DateTime} AND timestamp <= {end:DateTime}"
+
+# Rows loaded twice and not merged yet are counted and scored once, as with
+# FINAL elsewhere; LIMIT 1 BY on the table's sorting key does that without
+# giving up the by_user projection, which FINAL reads can't use
+USER_COUNTS_QUERY = """
+SELECT user_id, uniqExact(timestamp, transaction_id)
+FROM transactions
+WHERE user_id > {{after:Int64}} {range_filter}
+GROUP BY user_id
+ORDER BY user_id
+"""
+
+# ORDER BY with transaction_id fixes the order of same-timestamp rows, so
+# first-seen flags don't depend on how the chunk was read
+CHUNK_QUERY = """
+SELECT transaction_id, user_id, timestamp, amount, location, transaction_type AS txn_type, channel
+FROM transactions
+WHERE user_id BETWEEN {{first_user:UInt32}} AND {{last_user:UInt32}} {range_filter}
+ORDER BY user_id, timestamp, transaction_id
+LIMIT 1 BY timestamp, transaction_id
+SETTINGS optimize_read_in_order = 0
+"""
+
+
+def score_columns():
+    # anomaly_scores columns: a flag per registered detector
+    return ['transaction_id', 'user_id', 'timestamp'] + flag_columns() + [
+        'txn_count_1h', 'anomaly_score', 'run_id', 'scored_at'
+    ]
+
+
+def create_score_tables(client):
+    flags = ",\n            ".join(f"{col} Bool" for col in flag_columns())
+    client.command(f'''
+        CREATE TABLE IF NOT EXISTS anomaly_scores (
+            transaction_id String,
+            user_id UInt32,
+            timestamp DateTime,
+            {flags},
+            txn_count_1h UInt32,
+            anomaly_score UInt8,
+            run_id String,
+            scored_at DateTime64(3)
+        ) ENGINE = ReplacingMergeTree(scored_at)
+        PARTITION BY toYYYYMM(timestamp)
+        ORDER BY (user_id, timestamp, transaction_id)
+    ''')
+    # Detectors registered since the table was created get their column
+    for col in flag_columns():
+        client.command(f"ALTER TABLE anomaly_scores ADD COLUMN IF NOT EXISTS {col} Bool")
+    client.command('''
+        CREATE TABLE IF NOT EXISTS batch_scoring_checkpoints (
+            run_id String,
+            last_user_id Int64,
+            rows_scored UInt64,
+            updated_at DateTime64(3)
+        ) ENGINE = ReplacingMergeTree(updated_at)
+        ORDER BY run_id
+    ''')
+
+
+def run_id_for(start=None, end=None):
+    # Runs over the same range share a checkpoint
+    if start is None and end is None:
+        return "all"
+    return f"{start or ''}..{end or ''}"
+
+
+def load_checkpoint(client, run_id):
+    # (last_user_id, rows_scored); (NO_USER, 0) for a new run
+    row = client.query(
+        "SELECT last_user_id, rows_scored FROM batch_scoring_checkpoints FINAL WHERE run_id = {run_id:String}",
+        parameters={"run_id": run_id}
+    ).first_row
+    return (int(row[0]), int(row[1])) if row else (NO_USER, 0)
+
+
+def save_checkpoint(client, run_id, last_user_id, rows_scored):
+    client.insert(
+        'batch_scoring_checkpoints',
+        [(run_id, last_user_id, rows_scored, datetime.now())],
+        column_names=['run_id', 'last_user_id', 'rows_scored', 'updated_at']
+    )
+
+
+def _range_parameters(start, end):
+    # Open ends of the range become the widest DateTime values
+    return {
+        "start": pd.Timestamp(start or "1970-01-01").to_pydatetime(),
+        "end": pd.Timestamp(end or "2105-12-31 23:59:59").to_pydatetime(),
+    }
+
+
+def plan_chunks(user_counts, chunk_rows):
+    # [(first_user, last_user, rows)] over (user_id, count) pairs sorted by
+    # user_id; a chunk closes once it reaches chunk_rows, so a user with more
+    # rows than that gets a chunk of their own
+    chunks = []
+    first, rows = None, 0
+    for user_id, count in user_counts:
+        if first is None:
+            first = user_id
+        rows += count
+        if rows >= chunk_rows:
+            chunks.append((first, user_id, rows))
+            first, rows = None, 0
+    if first is not None:
+        chunks.append((first, user_counts[-1][0], rows))
+    return chunks
+
+
+def score_chunk(client, first_user, last_user, parameters, range_filter, run_id, workers=1):
+    # Scored rows of one chunk, as score_columns()
+    df = query_df(client, CHUNK_QUERY.format(range_filter=range_filter), TRANSACTION_COLUMNS,
+                  dict(parameters, first_user=first_user, last_user=last_user))
+    scored = score_transactions_parallel(df, workers)
+    scored['txn_count_1h'] = scored['txn_count_1h'].astype('uint32')
+    scored['anomaly_score'] = scored['anomaly_score'].astype('uint8')
+    scored['run_id'] = run_id
+    scored['scored_at'] = pd.Timestamp.now()
+    return scored[score_columns()]
+
+
+def score_table(client, start=None, end=None, chunk_rows=CHUNK_ROWS, run_id=None, reset=False, workers=1):
+    # Scores the range chunk by chunk from the run's checkpoint; returns the
+    # number of rows scored by this call
+    create_score_tables(client)
+    run_id = run_id or run_id_for(start, end)
+    if reset:
+        save_checkpoint(client, run_id, NO_USER, 0)
+    after, rows_scored = load_checkpoint(client, run_id)
+
+    windowed = start is not None or end is not None
+    parameters = _range_parameters(start, end) if windowed else {}
+    range_filter = RANGE_FILTER if windowed else ""
+    user_counts = client.query(
+        USER_COUNTS_QUERY.format(range_filter=range_filter), parameters=dict(parameters, after=after)
+    ).result_rows
+    chunks = plan_chunks(user_counts, chunk_rows)
+    if after != NO_USER:
+        print(f"↩️  Resuming run '{run_id}' after user {after:,} ({rows_scored:,} rows already scored)")
+    print(f"🧮 {sum(rows for _, _, rows in chunks):,} rows of {len(user_counts):,} users in {len(chunks):,} chunks")
+
+    start_time = time.perf_counter()
+    new_rows = 0
+    for i, (first_user, last_user, _) in enumerate(chunks, start=1):
+        scored = score_chunk(client, first_user, last_user, parameters, range_filter, run_id, workers)
+        client.insert_df('anomaly_scores', scored)
+        new_rows += len(scored)
+        save_checkpoint(client, run_id, last_user, rows_scored + new_rows)
+        elapsed = time.perf_counter() - start_time
+        print(f"  chunk {i}/{len(chunks)}: users {first_user:,}-{last_user:,}, "
+              f"{new_rows:,} rows ({new_rows / elapsed:,.0f} rows/sec)")
+    return new_rows
+
+
+if __name__ == "__main__":
+    from backend.clickhouse_ingest import get_clickhouse_client
+
+    parser = argparse.ArgumentParser(description="Score transactions in ClickHouse and store the scores in anomaly_scores")
+    parser.add_argument("--start", help="first day to score (YYYY-MM-DD); default: the oldest transaction")
+    parser.add_argument("--end", help="last day to score (YYYY-MM-DD, inclusive); default: the newest transaction")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="approximate rows per chunk of users")
+    parser.add_argument("--workers", type=int, default=SCORING_WORKERS, help="scoring processes per chunk")
+    parser.add_argument("--run-id", help="checkpoint name; default: derived from --start/--end")
+    parser.add_argument("--reset", action="store_true", help="ignore the run's checkpoint and score from the first user (e.g. after new data)")
+    args = parser.parse_args()
+
+    # --end is inclusive: normalized once, so the query range and the
+    # checkpoint's run_id (derived in score_table) see the same value
+    end = f"{args.end} 23:59:59" if args.end else None
+    client = get_clickhouse_client()
+    start_time = time.perf_counter()
+    new_rows = score_table(client, args.start, end, args.chunk_rows, args.run_id, args.reset, args.workers)
+    print(f"✅ Scored {new_rows:,} transactions in {time.perf_counter() - start_time:.1f}s")
@@ -0,0 +1,164 @@
+# backend/clickhouse_scoring.py
+#
+# Server-side version of backend/anomaly_scoring.py: the same six flags and
+# composite score built with ClickHouse window functions, so only the top-N
+# anomalies and the aggregates leave the server.
+#
+# Run directly to check parity against the pandas path on the live table:
+#   python -m backend.clickhouse_scoring
+# tests/test_clickhouse_scoring.py runs the same check on an embedded chdb
+# fixture.
+
+import os
+
+import pandas as pd
+
+from backend.anomaly_scoring import (
+    FLAG_COLUMNS, FLAG_WEIGHTS, FREQUENCY_THRESHOLD, FREQUENCY_WINDOW,
+    LARGE_TRANSACTION_THRESHOLD, NIGHT_HOURS, OUTLIER_STD_MULTIPLIER,
+    TRANSACTION_COLUMNS, score_transactions
+)
+from backend.clickhouse_arrow import query_df
+
+
+def _source_sql(limit=None, windowed=False):
+    # FINAL: rows loaded twice and not yet merged count once, like in app.py
+    source = """
+        SELECT transaction_id, user_id, timestamp, amount, location,
+               transaction_type AS txn_type, channel
+        FROM transactions FINAL
+    """
+    if windowed:
+        # A plain range on the partition key: only the months it covers are read
+        source += "WHERE timestamp >= {start:DateTime} AND timestamp <= {end:DateTime}\n"
+    if limit is not None:
+        source += f"ORDER BY timestamp DESC LIMIT {int(limit)}"
+    return source
+
+
+def _window_parameters(start, end):
+    return None if start is None else {"start": start, "end": end}
+
+
+def scored_window_sql(limit=None, windowed=False):
+    # Scored rows of the window: the latest `limit` rows, the rows between
+    # the {start} and {end} query parameters when windowed, or the whole table
+    window_seconds = int(FREQUENCY_WINDOW.total_seconds())
+    score = " + ".join(f"{col} * {weight}" for col, weight in FLAG_WEIGHTS.items())
+    return f"""
+    SELECT *, {score} AS anomaly_score
+    FROM (
+        SELECT
+            transaction_id, user_id, timestamp, amount, location, txn_type, channel,
+            amount > {LARGE_TRANSACTION_THRESHOLD} AS is_large_transaction,
+            toFloat64(amount) > user_mean + {OUTLIER_STD_MULTIPLIER} * user_std
+                OR toFloat64(amount) < user_mean - {OUTLIER_STD_MULTIPLIER} * user_std AS is_amount_outlier,
+            txn_count_1h > {FREQUENCY_THRESHOLD} AS is_frequency_anomaly,
+            location_rank = 1 AS is_geographic_anomaly,
+            toHour(timestamp) BETWEEN {NIGHT_HOURS[0]} AND {NIGHT_HOURS[1]} AS is_time_anomaly,
+            channel_rank = 1 AS is_channel_anomaly,
+            txn_count_1h
+        FROM (
+            SELECT *,
+                avg(toFloat64(amount)) OVER (PARTITION BY user_id) AS user_mean,
+                stddevSamp(toFloat64(amount)) OVER (PARTITION BY user_id) AS user_std,
+                count() OVER (
+                    PARTITION BY user_id ORDER BY toInt64(toUnixTimestamp(timestamp))
+                    RANGE BETWEEN {window_seconds} PRECEDING AND CURRENT ROW
+                ) AS txn_count_1h,
+                row_number() OVER (
+                    PARTITION BY user_id, location ORDER BY timestamp, transaction_id
+                ) AS location_rank,
+                row_number() OVER (
+                    PARTITION BY user_id, channel ORDER BY timestamp, transaction_id
+                ) AS channel_rank
+            FROM ({_source_sql(limit, windowed)})
+        )
+    )
+    """
+
+
+def fetch_anomaly_statistics(client, limit=None, start=None, end=None):
+    # Same shape as anomaly_scoring.anomaly_statistics
+    flag_counts = ", ".join(f"countIf({col})" for col in FLAG_COLUMNS)
+    query = f"""
+    SELECT count(), {flag_counts}, avg(anomaly_score)
+    FROM ({scored_window_sql(limit, start is not None)})
+    """
+    row = client.query(query, parameters=_window_parameters(start, end)).result_rows[0]
+    if not row[0]:
+        return None
+    return [int(row[0])] + [int(v) for v in row[1:-1]] + [float(row[-1])]
+
+
+def fetch_top_anomalous_transactions(client, limit=100, window_limit=None, start=None, end=None):
+    columns = TRANSACTION_COLUMNS + FLAG_COLUMNS + ['anomaly_score']
+    query = f"""
+    SELECT {", ".join(columns)}
+    FROM ({scored_window_sql(window_limit, start is not None)})
+    WHERE anomaly_score > 0
+    ORDER BY anomaly_score DESC
+    LIMIT {int(limit)}
+    """
+    return query_df(client, query, columns, _window_parameters(start, end))
+
+
+def fetch_top_anomalous_users(client, limit=10, window_limit=None, start=None, end=None):
+    query = f"""
+    SELECT user_id, count() AS transaction_count,
+           avg(anomaly_score) AS avg_anomaly_score, sum(anomaly_score) AS total_anomaly_score
+    FROM ({scored_window_sql(window_limit, start is not None)})
+    GROUP BY user_id
+    HAVING avg_anomaly_score > 0
+    ORDER BY avg_anomaly_score DESC
+    LIMIT {int(limit)}
+    """
+    rows = client.query(query, parameters=_window_parameters(start, end)).result_rows
+    return pd.DataFrame(rows, columns=[
+        "user_id", "transaction_count", "avg_anomaly_score", "total_anomaly_score"
+    ])
+
+
+def fetch_scored_transactions(client, limit=None):
+    columns = TRANSACTION_COLUMNS + FLAG_COLUMNS + ['txn_count_1h', 'anomaly_score']
+    query = f"SELECT {', '.join(columns)} FROM ({scored_window_sql(limit)})"
+    return query_df(client, query, columns)
+
+
+def check_parity(client):
+    # Score the whole table both ways and compare every flag per transaction.
+    # Rows are fetched in (timestamp, transaction_id) order so ties in the
+    # first-seen rules break the same way as row_number() above.
+    transactions = query_df(client, """
+        SELECT transaction_id, user_id, timestamp, amount, location, transaction_type AS txn_type, channel
+        FROM transactions FINAL
+        ORDER BY timestamp, transaction_id
+    """, TRANSACTION_COLUMNS)
+    expected = score_transactions(transactions)
+    actual = fetch_scored_transactions(client)
+
+    merged = expected.merge(actual, on='transaction_id', suffixes=('_pandas', '_clickhouse'))
+    assert len(merged) == len(expected) == len(actual), "scored row counts differ"
+    mismatches = {}
+    for col in FLAG_COLUMNS + ['txn_count_1h', 'anomaly_score']:
+        diff = (merged[f"{col}_pandas"].astype('int64') != merged[f"{col}_clickhouse"].astype('int64')).sum()
+        if diff:
+            mismatches[col] = int(diff)
+    return len(merged), mismatches
+
+
+if __name__ == "__main__":
+    from clickhouse_connect import get_client
+
+    client = get_client(
+        host=os.getenv("CLICKHOUSE_HOST", "localhost"),
+        port=int(os.getenv("CLICKHOUSE_PORT", "8123")),
+        username=os.getenv("CLICKHOUSE_USER", "default"),
+        password=os.getenv("CLICKHOUSE_PASSWORD", ""),
+        secure=os.getenv("CLICKHOUSE_SECURE", "false").lower() == "true"
+    )
+    total, mismatches = check_parity(client)
+    if mismatches:
+        print(f"❌ {total:,} rows compared, mismatching flags: {mismatches}")
+        raise SystemExit(1)
+    print(f"✅ ClickHouse and pandas scoring agree on all {total:,} transactions.")
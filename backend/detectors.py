@@ -0,0 +1,177 @@
+# backend/detectors.py
+#
+# The anomaly rules as a registry of detectors. Each detector declares:
+#   name     its flag column
+#   weight   its share of anomaly_score
+#   columns  the batch columns it reads
+#   needs    the shared intermediates it reads (computed once per batch by
+#            anomaly_scoring.ScoringBatch, however many detectors use them)
+#   state    what an incremental scorer keeps per user for it (None: nothing)
+#   outputs  extra columns it adds to the scored frame, {column: intermediate}
+# and implements score(batch): one bool per row of the batch, as a numpy
+# array in the batch's (user_id, timestamp) order.
+#
+# Thresholds and weights come from the environment (see .env.example), so
+# every backend (pandas, parallel, ClickHouse SQL, online) uses the same
+# values. ANOMALY_WEIGHTS overrides weights by flag name:
+#   ANOMALY_WEIGHTS="is_large_transaction=5,is_time_anomaly=0"
+#
+# A new rule only needs a Detector subclass and register(); the columnar
+# engine (score_transactions, score_transactions_parallel) picks it up, and
+# so does everything reporting its output through flag_columns():
+# anomaly_statistics, top_anomalous_transactions, batch_scoring's
+# anomaly_scores table and the dashboard's pandas backend. The SQL and online
+# backends implement the built-in six, FLAG_COLUMNS, and report only those.
+
+import os
+
+import pandas as pd
+
+LARGE_TRANSACTION_THRESHOLD = float(os.getenv("LARGE_TRANSACTION_THRESHOLD", "50000"))
+OUTLIER_STD_MULTIPLIER = float(os.getenv("OUTLIER_STD_MULTIPLIER", "3"))
+FREQUENCY_WINDOW = pd.Timedelta(seconds=int(os.getenv("FREQUENCY_WINDOW_SECONDS", "3600")))
+FREQUENCY_THRESHOLD = int(os.getenv("FREQUENCY_THRESHOLD", "10"))
+NIGHT_HOURS = tuple(int(hour) for hour in os.getenv("NIGHT_HOURS", "2-5").split("-"))  # inclusive
+
+
+def _weight_overrides(spec):
+    # "name=weight,name=weight" -> {name: weight}
+    overrides = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        overrides[name.strip()] = int(weight)
+    return overrides
+
+
+WEIGHT_OVERRIDES = _weight_overrides(os.getenv("ANOMALY_WEIGHTS", ""))
+
+
+class Detector:
+    name = None
+    weight = 1
+    columns = ()
+    needs = ()
+    state = None
+    outputs = {}
+
+    def __init__(self, weight=None):
+        # Explicit weight, else ANOMALY_WEIGHTS, else the class default
+        self.weight = int(weight if weight is not None else WEIGHT_OVERRIDES.get(self.name, self.weight))
+
+    def score(self, batch):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}(weight={self.weight})"
+
+
+class LargeTransactionDetector(Detector):
+    name = "is_large_transaction"
+    weight = 3
+    columns = ("amount",)
+
+    def score(self, batch):
+        return batch["amount"] > LARGE_TRANSACTION_THRESHOLD
+
+
+class AmountOutlierDetector(Detector):
+    # Outside mean +/- OUTLIER_STD_MULTIPLIER sample std of the user's amounts
+    name = "is_amount_outlier"
+    weight = 2
+    columns = ("amount",)
+    needs = ("amount_mean", "amount_std")
+    state = "moments"
+
+    def score(self, batch):
+        amount = batch["amount"]
+        margin = OUTLIER_STD_MULTIPLIER * batch.amount_std
+        return (amount > batch.amount_mean + margin) | (amount < batch.amount_mean - margin)
+
+
+class FrequencyDetector(Detector):
+    # More than FREQUENCY_THRESHOLD of the user's rows in the trailing window
+    name = "is_frequency_anomaly"
+    weight = 2
+    needs = ("window_counts",)
+    state = "recent timestamps"
+    outputs = {"txn_count_1h": "window_counts"}
+
+    def score(self, batch):
+        return batch.window_counts > FREQUENCY_THRESHOLD
+
+
+class FirstSeenDetector(Detector):
+    # First row of the user with this value of `column`
+    column = None
+    state = "values seen"
+
+    def __init__(self, weight=None):
+        super().__init__(weight)
+        self.columns = (self.column,)
+        self.needs = (f"first_seen:{self.column}",)
+
+    def score(self, batch):
+        return batch.first_seen(self.column)
+
+
+class GeographicDetector(FirstSeenDetector):
+    name = "is_geographic_anomaly"
+    column = "location"
+
+
+class ChannelDetector(FirstSeenDetector):
+    name = "is_channel_anomaly"
+    column = "channel"
+
+
+class TimeOfDayDetector(Detector):
+    name = "is_time_anomaly"
+    needs = ("hours",)
+
+    def score(self, batch):
+        return (batch.hours >= NIGHT_HOURS[0]) & (batch.hours <= NIGHT_HOURS[1])
+
+
+DETECTORS = [
+    LargeTransactionDetector(),
+    AmountOutlierDetector(),
+    FrequencyDetector(),
+    GeographicDetector(),
+    TimeOfDayDetector(),
+    ChannelDetector(),
+]
+
+# The built-in flags every backend computes, and their configured weights;
+# fixed at import, whatever is registered later (see flag_columns)
+FLAG_WEIGHTS = {detector.name: detector.weight for detector in DETECTORS}
+FLAG_COLUMNS = list(FLAG_WEIGHTS)
+
+
+def register(detector):
+    # Adds a detector to the columnar engine's default set; replaces one
+    # with the same name
+    if not detector.name:
+        raise ValueError(f"{detector!r} has no name")
+    for i, existing in enumerate(DETECTORS):
+        if existing.name == detector.name:
+            DETECTORS[i] = detector
+            return detector
+    DETECTORS.append(detector)
+    return detector
+
+
+def flag_columns(detectors=None):
+    # Flag columns the columnar engine adds for `detectors` (default: the
+    # registered ones, so FLAG_COLUMNS plus any registered since)
+    return [detector.name for detector in (get_detectors() if detectors is None else detectors)]
+
+
+def get_detectors(names=None):
+    # Registered detectors, optionally only those with the given names
+    if names is None:
+        return list(DETECTORS)
+    by_name = {detector.name: detector for detector in DETECTORS}
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise KeyError(f"Unknown detectors: {', '.join(missing)}")
+    return [by_name[name] for name in names]
@@ -1,5 +1,9 @@
 # backend/graph_visualizer.py
 
+from collections import Counter, OrderedDict
+import threading
+import time
+
 from pyvis.network import Network
 from neo4j import GraphDatabase
 import os
@@ -13,16 +17,76 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "test1234")
 
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", "256"))
+GRAPH_CACHE_TTL = int(os.getenv("GRAPH_CACHE_TTL", "600"))  # seconds
+
+# Pages load vis-network from pinned CDN tags with SRI hashes (pyvis'
+# "remote" resources), so the browser fetches and caches the ~690 KB of
+# assets once; a page is only the per-graph body plus the small utils.js
+# bindings pyvis inlines.
+VIS_RESOURCES = "remote"
+
+# Neighborhood view: hops out from a transaction, never more than
+# GRAPH_NODE_BUDGET nodes. A node with more than GRAPH_HUB_DEGREE
+# relationships (a city, a channel, a heavy user) is a hub: only its
+# HUB_SAMPLE most recent transactions are drawn, the rest become one
+# cluster node, so the browser never receives a hub's whole fan-out.
+MAX_GRAPH_DEPTH = 3
+GRAPH_NODE_BUDGET = int(os.getenv("GRAPH_NODE_BUDGET", "150"))
+GRAPH_HUB_DEGREE = int(os.getenv("GRAPH_HUB_DEGREE", "25"))
+HUB_SAMPLE = 5
+
+GRAPH_OPTIONS = """
+var options = {
+  "physics": {
+    "barnesHut": {
+      "gravitationalConstant": -30000,
+      "centralGravity": 0.3,
+      "springLength": 95
+    },
+    "minVelocity": 0.75
+  }
+}
+"""
+
+GRAPH_QUERY = """
+MATCH (u:User)-[:MADE]->(t:Transaction {transaction_id: $txn_id})
+OPTIONAL MATCH (t)-[:HAPPENED_IN]->(l:Location)
+OPTIONAL MATCH (t)-[:VIA]->(c:Channel)
+RETURN u.id AS user_id, t.transaction_id AS txn_id, t.amount AS amount,
+       l.name AS location, c.name AS channel
+"""
+
+# Key property per label, as constrained in backend/neo4j_schema.py
+NODE_KEYS = {"Transaction": "transaction_id", "User": "id", "Location": "name", "Channel": "name"}
+NODE_COLORS = {"Transaction": "#ff7f7f", "User": "#00ff00", "Location": "#007bff", "Channel": "#ffc107"}
+
+# One round-trip expands every frontier node of a label: its degree (a COUNT
+# subquery, read from the degree store without walking the relationships)
+# and at most $limit neighbours (most recent transactions first) for the sample
+EXPAND_QUERY_TEMPLATE = """
+UNWIND $keys AS key
+MATCH (n:{label} {{{key}: key}})
+WITH key, n, COUNT {{ (n)--() }} AS degree
+CALL {{
+    WITH n
+    MATCH (n)-[r]-(m)
+    WITH r, m ORDER BY m.timestamp DESC LIMIT $limit
+    RETURN collect({{
+        label: labels(m)[0], key: coalesce(m.transaction_id, m.id, m.name),
+        amount: m.amount, timestamp: toString(m.timestamp),
+        rel: type(r), outgoing: startNode(r) = n
+    }}) AS neighbors
+}}
+RETURN key, degree, neighbors
+"""
+EXPAND_QUERIES = {
+    label: EXPAND_QUERY_TEMPLATE.format(label=label, key=key) for label, key in NODE_KEYS.items()
+}
+
 def fetch_graph_data(txn_id):
-    query = """
-    MATCH (u:User)-[:MADE]->(t:Transaction {transaction_id: $txn_id})
-    OPTIONAL MATCH (t)-[:HAPPENED_IN]->(l:Location)
-    OPTIONAL MATCH (t)-[:VIA]->(c:Channel)
-    RETURN u.id AS user_id, t.transaction_id AS txn_id, t.amount AS amount,
-           l.name AS location, c.name AS channel
-    """
     with driver.session() as session:
-        result = session.run(query, txn_id=txn_id)
+        result = session.run(GRAPH_QUERY, txn_id=txn_id)
         return result.single()
 
 def create_pyvis_graph(txn_id):
@@ -36,7 +100,8 @@ def create_pyvis_graph(txn_id):
     location = data["location"]
     channel = data["channel"]
 
-    net = Network(height="400px", width="100%", bgcolor="#222222", font_color="white")
+    net = Network(height="400px", width="100%", bgcolor="#222222", font_color="white",
+                  cdn_resources=VIS_RESOURCES)
     net.barnes_hut()
 
     # Add nodes
@@ -54,17 +119,169 @@ def create_pyvis_graph(txn_id):
     if channel:
         net.add_edge(txn, channel, label="VIA")
 
-    net.set_options("""
-    var options = {
-      "physics": {
-        "barnesHut": {
-          "gravitationalConstant": -30000,
-          "centralGravity": 0.3,
-          "springLength": 95
-        },
-        "minVelocity": 0.75
-      }
-    }
-    """)
+    net.set_options(GRAPH_OPTIONS)
 
     return net
+
+
+def _node_id(label, key):
+    return f"{label}:{key}"
+
+def expand_nodes(session, frontier, limit):
+    # {(label, key): (degree, neighbours)} for the frontier, one query per label
+    expanded = {}
+    for label, query in EXPAND_QUERIES.items():
+        keys = [key for node_label, key in frontier if node_label == label]
+        if keys:
+            for record in session.run(query, keys=keys, limit=limit):
+                expanded[(label, record["key"])] = (record["degree"], record["neighbors"])
+    return expanded
+
+def fetch_neighborhood(txn_id, depth=2, node_budget=GRAPH_NODE_BUDGET, hub_degree=GRAPH_HUB_DEGREE):
+    # Breadth-first, so nearer nodes win the budget. Returns
+    # {"nodes": {id: attrs}, "edges": [(from, to, rel)], "truncated": bool},
+    # or None when the transaction is not in the graph.
+    depth = max(1, min(depth, MAX_GRAPH_DEPTH))
+    seed = ("Transaction", txn_id)
+    nodes, edges, seen_edges = {}, [], set()
+    incident = Counter()
+    truncated = False
+
+    def add_edge(source, target, rel):
+        if (source, target, rel) not in seen_edges:
+            seen_edges.add((source, target, rel))
+            edges.append((source, target, rel))
+            incident[source] += 1
+            incident[target] += 1
+
+    with driver.session() as session:
+        frontier = [seed]
+        for hop in range(depth):
+            expanded = expand_nodes(session, frontier, hub_degree + 1)
+            if hop == 0:
+                if seed not in expanded:
+                    return None
+                nodes[_node_id(*seed)] = {"label": "Transaction", "key": txn_id, "hop": 0, "seed": True}
+            next_frontier = []
+            for label, key in frontier:
+                if (label, key) not in expanded:
+                    continue
+                degree, neighbors = expanded[(label, key)]
+                node = _node_id(label, key)
+                hub = degree > hub_degree
+                if hub:
+                    neighbors = neighbors[:HUB_SAMPLE]
+                    nodes[node]["degree"] = degree
+                for neighbor in neighbors:
+                    other = _node_id(neighbor["label"], neighbor["key"])
+                    if other not in nodes:
+                        if len(nodes) >= node_budget:
+                            truncated = True
+                            continue
+                        nodes[other] = {
+                            "label": neighbor["label"], "key": neighbor["key"], "hop": hop + 1,
+                            "amount": neighbor["amount"], "timestamp": neighbor["timestamp"]
+                        }
+                        next_frontier.append((neighbor["label"], neighbor["key"]))
+                    if neighbor["outgoing"]:
+                        add_edge(node, other, neighbor["rel"])
+                    else:
+                        add_edge(other, node, neighbor["rel"])
+                hidden = degree - incident[node]
+                if hub and hidden > 0:
+                    if len(nodes) >= node_budget:
+                        truncated = True
+                        continue
+                    cluster = f"cluster:{node}"
+                    nodes[cluster] = {"label": "Cluster", "key": node, "hop": hop + 1, "count": hidden}
+                    add_edge(node, cluster, neighbors[0]["rel"] if neighbors else "")
+            frontier = next_frontier
+            if not frontier:
+                break
+
+    return {"nodes": nodes, "edges": edges, "truncated": truncated}
+
+def _node_style(attrs):
+    label, key = attrs["label"], attrs["key"]
+    if label == "Cluster":
+        return dict(label=f"+{attrs['count']:,} more", color="#888888", shape="box",
+                    title=f"{attrs['count']:,} more relationships of {key}, not drawn")
+    if label == "Transaction":
+        amount = attrs.get("amount")
+        text = f"Txn ₹{amount}" if amount is not None else f"Txn {key}"
+        title = f"{key} · {attrs.get('timestamp') or ''}"
+        color = "#ff0000" if attrs.get("seed") else NODE_COLORS[label]
+        return dict(label=text, color=color, title=title)
+    prefix = {"User": "User ", "Location": "📍 ", "Channel": "📱 "}[label]
+    title = f"{label} {key}" + (f" · {attrs['degree']:,} relationships" if "degree" in attrs else "")
+    return dict(label=f"{prefix}{key}", color=NODE_COLORS[label], title=title)
+
+def create_neighborhood_graph(txn_id, depth=2, node_budget=GRAPH_NODE_BUDGET, hub_degree=GRAPH_HUB_DEGREE):
+    # (net, truncated), or None when the transaction is not in the graph
+    graph = fetch_neighborhood(txn_id, depth, node_budget, hub_degree)
+    if not graph:
+        return None
+
+    net = Network(height="400px", width="100%", bgcolor="#222222", font_color="white",
+                  cdn_resources=VIS_RESOURCES)
+    net.barnes_hut()
+    for node, attrs in graph["nodes"].items():
+        net.add_node(node, **_node_style(attrs))
+    for source, target, rel in graph["edges"]:
+        net.add_edge(source, target, label=rel)
+    net.set_options(GRAPH_OPTIONS)
+    return net, graph["truncated"]
+
+
+class GraphCache:
+    # Thread-safe LRU with a per-entry TTL, shared by all Streamlit sessions
+
+    def __init__(self, max_entries=GRAPH_CACHE_SIZE, ttl=GRAPH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+graph_cache = GraphCache()
+
+
+def graph_html(txn_id, depth=1, node_budget=GRAPH_NODE_BUDGET):
+    # (html, truncated) for components.html, or None when the transaction
+    # isn't in the graph (not cached, so newly ingested ones show up).
+    # truncated: the node budget cut the neighborhood short.
+    # depth=1 is the one-hop star; deeper views go through fetch_neighborhood.
+    key = (txn_id, depth, node_budget)
+    graph = graph_cache.get(key)
+    if graph is None:
+        if depth <= 1:
+            net, truncated = create_pyvis_graph(txn_id), False
+        else:
+            net, truncated = create_neighborhood_graph(txn_id, depth, node_budget) or (None, False)
+        if net is None:
+            return None
+        graph = (net.generate_html(), truncated)
+        graph_cache.put(key, graph)
+    return graph
@@ -2,8 +2,14 @@
 
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
 import os
+import time
+from backend.llm_cache import ExplanationCache
+from backend.llm_client import (
+    OLLAMA_URL, LLMError, LLMResponseError, gemini, iter_lines, iter_ndjson, ollama, parse_json
+)
 
 load_dotenv()
 
@@ -14,94 +20,387 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "test1234")
 
 # Gemini + Ollama config
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-OLLAMA_URL = "http://localhost:11434/api/generate"
 LLM_MODEL = "mistral"  # Ollama model name
 
+# Prompt context: how many of the user's latest transactions to list, and the
+# (estimated) token budget for the whole prompt; see generate_graph_prompt
+CONTEXT_RECENT_TRANSACTIONS = int(os.getenv("CONTEXT_RECENT_TRANSACTIONS", "10"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "800"))
+
+# Batch explanations: parallel LLM calls and per-request read timeout (seconds)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
+# Shared by every Streamlit session in this process
+explanation_cache = ExplanationCache()
+# Timing of the most recent streamed explanations
+stream_metrics = deque(maxlen=100)
 
-def fetch_graph_context(tx, transaction_id):
-    query = """
-    MATCH (u:User)-[:MADE]->(t:Transaction {transaction_id: $txn_id})
-    OPTIONAL MATCH (t)-[:HAPPENED_IN]->(l:Location)
-    OPTIONAL MATCH (t)-[:VIA]->(c:Channel)
+
+class StreamMetrics:
+    # Time-to-first-token and throughput of one streamed explanation
+
+    def __init__(self, model):
+        self.model = model
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.end = None
+        self.chunks = 0
+        self.tokens = None  # as reported by the backend, when it does
+        self.cached = False  # answered from the explanation cache, no LLM call
+
+    @property
+    def time_to_first_token(self):
+        return self.first_token_at - self.start if self.first_token_at else None
+
+    @property
+    def tokens_per_sec(self):
+        if not self.first_token_at or not self.end or self.end <= self.first_token_at:
+            return None
+        return (self.tokens or self.chunks) / (self.end - self.first_token_at)
+
+
+GRAPH_CONTEXT_QUERY = f"""
+MATCH (u:User)-[:MADE]->(t:Transaction {{transaction_id: $txn_id}})
+OPTIONAL MATCH (t)-[:HAPPENED_IN]->(l:Location)
+OPTIONAL MATCH (t)-[:VIA]->(c:Channel)
+CALL {{
+    WITH u, t
     OPTIONAL MATCH (u)-[:MADE]->(prev:Transaction)
     WHERE prev.timestamp < t.timestamp
-    RETURN u.id AS user_id, t.amount AS amount, t.timestamp AS timestamp,
-           l.name AS location, c.name AS channel, t.type AS txn_type,
-           collect(prev.amount) AS prev_amounts, collect(prev.timestamp) AS prev_times
-    """
-    result = tx.run(query, txn_id=transaction_id)
+    OPTIONAL MATCH (prev)-[:HAPPENED_IN]->(pl:Location)
+    OPTIONAL MATCH (prev)-[:VIA]->(pc:Channel)
+    RETURN count(prev) AS prev_count, avg(prev.amount) AS prev_mean, stDev(prev.amount) AS prev_std,
+           min(prev.amount) AS prev_min, max(prev.amount) AS prev_max,
+           percentileCont(prev.amount, 0.05) AS prev_p05,
+           percentileCont(prev.amount, 0.5) AS prev_p50,
+           percentileCont(prev.amount, 0.95) AS prev_p95,
+           collect(DISTINCT pl.name) AS prev_locations, collect(DISTINCT pc.name) AS prev_channels,
+           max(prev.timestamp) AS last_prev_time
+}}
+CALL {{
+    WITH u, t
+    MATCH (u)-[:MADE]->(prev:Transaction)
+    WHERE prev.timestamp < t.timestamp
+    WITH prev ORDER BY prev.timestamp DESC LIMIT {CONTEXT_RECENT_TRANSACTIONS}
+    OPTIONAL MATCH (prev)-[:HAPPENED_IN]->(pl:Location)
+    OPTIONAL MATCH (prev)-[:VIA]->(pc:Channel)
+    RETURN collect({{timestamp: prev.timestamp, amount: prev.amount, location: pl.name, channel: pc.name}}) AS recent
+}}
+RETURN u.id AS user_id, t.amount AS amount, t.timestamp AS timestamp,
+       l.name AS location, c.name AS channel, t.type AS txn_type,
+       prev_count, prev_mean, prev_std, prev_min, prev_max, prev_p05, prev_p50, prev_p95,
+       prev_locations, prev_channels, recent AS recent_transactions,
+       duration.inSeconds(last_prev_time, t.timestamp).seconds AS seconds_since_last
+"""
+
+
+# Same context for many transactions in one round-trip
+GRAPH_CONTEXT_BATCH_QUERY = (
+    "UNWIND $txn_ids AS txn_id\nCALL {\nWITH txn_id\n"
+    + GRAPH_CONTEXT_QUERY.replace("$txn_id", "txn_id")
+    + "}\nRETURN *"
+)
+
+
+def fetch_graph_context(tx, transaction_id):
+    result = tx.run(GRAPH_CONTEXT_QUERY, txn_id=transaction_id)
     return result.single()
 
 
-def generate_graph_prompt(data):
-    return f"""
+def fetch_graph_contexts(tx, transaction_ids):
+    result = tx.run(GRAPH_CONTEXT_BATCH_QUERY, txn_ids=list(transaction_ids))
+    return {record["txn_id"]: record for record in result}
+
+
+def _estimate_tokens(text):
+    # ~4 characters per token for English prose and numbers
+    return len(text) // 4 + 1
+
+
+def _format_amount(value):
+    return f"₹{value:,.2f}" if value is not None else "n/a"
+
+
+def _format_gap(seconds):
+    if seconds is None:
+        return "n/a"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} minutes"
+    if seconds < 2 * 86400:
+        return f"{seconds / 3600:.1f} hours"
+    return f"{seconds / 86400:.1f} days"
+
+
+def _format_names(names, limit):
+    if not names:
+        return "n/a"
+    shown = ", ".join(names[:limit])
+    return shown if len(names) <= limit else f"{shown} (+{len(names) - limit} more)"
+
+
+def generate_graph_prompt(data, token_budget=PROMPT_TOKEN_BUDGET):
+    # The whole prompt stays within token_budget (estimated). Context is
+    # given up in order: the oldest recent transactions, then the long tail
+    # of the location/channel lists, then the optional history lines. The
+    # instructions and the transaction itself are always kept, so a budget
+    # below those gets the bare prompt.
+    recent = [
+        f"  - {r['timestamp']}: {_format_amount(r['amount'])} at {r['location']} via {r['channel']}"
+        for r in data['recent_transactions']
+    ]
+    locations = data.get('prev_locations') or []
+    channels = data.get('prev_channels') or []
+    name_limit = max(len(locations), len(channels), 1)
+    optional = ["spread", "percentiles", "gap"]  # dropped last to first
+
+    def render():
+        if data['prev_count']:
+            lines = {
+                "count": f"- Count: {data['prev_count']}",
+                "mean": f"- Amount mean / std: {_format_amount(data['prev_mean'])} / {_format_amount(data['prev_std'])}",
+                "spread": f"- Amount min / max: {_format_amount(data['prev_min'])} / {_format_amount(data['prev_max'])}",
+                "percentiles": f"- Amount 5th / 50th / 95th percentile: {_format_amount(data['prev_p05'])} / {_format_amount(data['prev_p50'])} / {_format_amount(data['prev_p95'])}",
+                "locations": f"- Locations used: {_format_names(locations, name_limit)}",
+                "channels": f"- Channels used: {_format_names(channels, name_limit)}",
+                "gap": f"- Time since previous transaction: {_format_gap(data['seconds_since_last'])}",
+            }
+            history = "\n".join(line for key, line in lines.items() if key in kept or key not in optional)
+        else:
+            history = "- None: this is the user's first transaction."
+        recent_section = "\n- Most recent:\n" + "\n".join(recent) if recent else ""
+        return f"""
 You are a financial anomaly analyst. A transaction has been flagged.
 
 Transaction:
 - User: {data['user_id']}
 - Timestamp: {data['timestamp']}
-- Amount: ₹{data['amount']}
+- Amount: {_format_amount(data['amount'])}
 - Location: {data['location']}
 - Channel: {data['channel']}
 - Type: {data['txn_type']}
 
-Previous Transactions:
-- Amounts: {data['prev_amounts']}
-- Timestamps: {data['prev_times']}
+Previous Transactions (summary):
+{history}{recent_section}
 
 Based on this user's history and this transaction's context, explain whether this transaction is anomalous or not. Be precise and insightful.
 """
 
+    kept = list(optional)
+    prompt = render()
+    while _estimate_tokens(prompt) > token_budget:
+        if recent:
+            recent = recent[:-1]  # newest first, so this drops the oldest
+        elif name_limit > 1:
+            name_limit //= 2
+        elif kept:
+            kept.pop()
+        else:
+            break
+        prompt = render()
+    return prompt
+
+
+def _gemini_url(model_name, method):
+    return f"https://generativelanguage.googleapis.com/v1/models/{model_name}:{method}"
+
+
+# The key goes in a header so it never shows up in URLs quoted by errors
+def _gemini_headers():
+    return {"Content-Type": "application/json", "x-goog-api-key": GEMINI_API_KEY or ""}
+
+
+def _gemini_payload(prompt):
+    return {
+        "contents": [
+            {"parts": [{"text": prompt}]}
+        ]
+    }
+
 
-def call_ollama_llm(prompt):
+def ollama_generate(prompt, timeout=None):
+    response = ollama.post(OLLAMA_URL, {"model": LLM_MODEL, "prompt": prompt, "stream": False}, timeout=timeout)
     try:
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": LLM_MODEL, "prompt": prompt, "stream": False},
-            timeout=None
-        )
         return response.json()["response"].strip()
-    except Exception as e:
-        return f"❌ Error from Ollama: {e}"
+    except (ValueError, KeyError) as e:
+        raise LLMResponseError("ollama", f"unexpected response body: {e!r}") from e
 
 
-def call_gemini_llm(prompt, model_name="gemini-1.5-pro"):
+def gemini_generate(prompt, model_name="gemini-1.5-pro", timeout=None):
+    response = gemini.post(
+        _gemini_url(model_name, "generateContent"), _gemini_payload(prompt),
+        timeout=timeout, headers=_gemini_headers()
+    )
     try:
-        url = f"https://generativelanguage.googleapis.com/v1/models/{model_name}:generateContent?key={GEMINI_API_KEY}"
-        headers = {"Content-Type": "application/json"}
-        payload = {
-            "contents": [
-                {"parts": [{"text": prompt}]}
-            ]
-        }
+        return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+    except (ValueError, KeyError, IndexError) as e:
+        raise LLMResponseError("gemini", f"unexpected response body from {model_name}: {e!r}") from e
+
 
-        res = requests.post(url, headers=headers, json=payload)
-        res.raise_for_status()
-        return res.json()["candidates"][0]["content"]["parts"][0]["text"]
-    except Exception as e:
+def call_ollama_llm(prompt, timeout=None):
+    try:
+        return ollama_generate(prompt, timeout)
+    except LLMError as e:
+        return f"❌ Error from Ollama: {e}"
+
+
+def call_gemini_llm(prompt, model_name="gemini-1.5-pro", timeout=None):
+    try:
+        return gemini_generate(prompt, model_name, timeout)
+    except LLMError as e:
         return f"❌ Error from Gemini ({model_name}): {e}"
 
 
+def stream_ollama_llm(prompt, timeout=None, metrics=None):
+    # Yields text chunks from Ollama's NDJSON stream (about one token each)
+    with ollama.post(
+        OLLAMA_URL,
+        {"model": LLM_MODEL, "prompt": prompt, "stream": True},
+        stream=True,
+        timeout=timeout
+    ) as response:
+        for chunk in iter_ndjson(ollama, response):
+            if chunk.get("response"):
+                yield chunk["response"]
+            if chunk.get("done"):
+                if metrics is not None and "eval_count" in chunk:
+                    metrics.tokens = chunk["eval_count"]
+                return
+
+
+def stream_gemini_llm(prompt, model_name="gemini-1.5-pro", timeout=None, metrics=None):
+    # Yields text chunks from Gemini's server-sent event stream
+    with gemini.post(
+        _gemini_url(model_name, "streamGenerateContent") + "?alt=sse",
+        _gemini_payload(prompt),
+        stream=True,
+        timeout=timeout,
+        headers=_gemini_headers()
+    ) as res:
+        for line in iter_lines(gemini, res):
+            if not line.startswith(b"data:"):
+                continue
+            chunk = parse_json(gemini, line[len(b"data:"):])
+            for part in chunk.get("candidates", [{}])[0].get("content", {}).get("parts", []):
+                if part.get("text"):
+                    yield part["text"]
+            usage = chunk.get("usageMetadata", {})
+            if metrics is not None and "candidatesTokenCount" in usage:
+                metrics.tokens = usage["candidatesTokenCount"]
+
+
+def _measure(chunks, metrics):
+    for chunk in chunks:
+        if metrics.first_token_at is None:
+            metrics.first_token_at = time.perf_counter()
+        metrics.chunks += 1
+        yield chunk
+    metrics.end = time.perf_counter()
+    # A cache hit has no generation latency; it would drag the averages down
+    if not metrics.cached:
+        stream_metrics.append(metrics)
+
+
+def explain_context(context, model_choice="mistral", timeout=None):
+    prompt = generate_graph_prompt(context)
+
+    model_choice = model_choice.lower()
+    if "gemini" in model_choice:
+        def generate():
+            # Try Pro first, then fallback to Flash if Pro fails
+            try:
+                return gemini_generate(prompt, model_name="gemini-1.5-pro", timeout=timeout)
+            except LLMError as e:
+                print(f"[⚠️] {e}; falling back to gemini-1.5-flash...")
+                return gemini_generate(prompt, model_name="gemini-1.5-flash", timeout=timeout)
+        model = "gemini"
+    else:
+        def generate():
+            return ollama_generate(prompt, timeout=timeout)
+        model = LLM_MODEL
+
+    # Failures raise, so they are never cached
+    try:
+        return explanation_cache.get_or_compute(model, prompt, generate)
+    except LLMError as e:
+        return f"❌ Error from {e}"
+
+
 def explain_transaction(transaction_id, model_choice="mistral"):
     with driver.session() as session:
         result = session.read_transaction(fetch_graph_context, transaction_id)
-        if not result:
-            return f"❌ No transaction with ID {transaction_id} found."
+    if not result:
+        return f"❌ No transaction with ID {transaction_id} found."
+    return explain_context(result, model_choice)
 
-        prompt = generate_graph_prompt(result)
 
-        model_choice = model_choice.lower()
-        if "gemini" in model_choice:
-            # Try Pro first, then fallback to Flash if Pro fails
-            pro_response = call_gemini_llm(prompt, model_name="gemini-1.5-pro")
-            if "❌" in pro_response:
-                print("[⚠️] Falling back to gemini-1.5-flash...")
-                return call_gemini_llm(prompt, model_name="gemini-1.5-flash")
-            return pro_response
+def explain_transaction_stream(transaction_id, model_choice="mistral", metrics=None):
+    # Streaming variant of explain_transaction for st.write_stream; a cached
+    # explanation comes back as a single chunk
+    with driver.session() as session:
+        result = session.read_transaction(fetch_graph_context, transaction_id)
+    if not result:
+        yield f"❌ No transaction with ID {transaction_id} found."
+        return
+
+    prompt = generate_graph_prompt(result)
+    if metrics is None:
+        metrics = StreamMetrics(model_choice)
+
+    model_choice = model_choice.lower()
+    if "gemini" in model_choice:
+        def generate():
+            # Try Pro first, then fallback to Flash if Pro fails before any output
+            chunks = stream_gemini_llm(prompt, model_name="gemini-1.5-pro", metrics=metrics)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                return
+            except LLMError as e:
+                print(f"[⚠️] {e}; falling back to gemini-1.5-flash...")
+                yield from stream_gemini_llm(prompt, model_name="gemini-1.5-flash", metrics=metrics)
+                return
+            yield first
+            yield from chunks
+        model = "gemini"
+    else:
+        def generate():
+            return stream_ollama_llm(prompt, metrics=metrics)
+        model = LLM_MODEL
 
-        return call_ollama_llm(prompt)
+    def stream():
+        # Only called on a cache miss
+        metrics.cached = False
+        return generate()
+
+    metrics.cached = True
+    try:
+        yield from _measure(explanation_cache.get_or_stream(model, prompt, stream), metrics)
+    except LLMError as e:
+        yield f"\n\n❌ Error from {e}"
+
+
+def explain_transactions(transaction_ids, model_choice="mistral", max_workers=LLM_CONCURRENCY, timeout=LLM_TIMEOUT):
+    # Yields (transaction_id, explanation) as each one completes. All graph
+    # contexts come from a single Neo4j query; at most max_workers LLM calls
+    # are in flight at once.
+    transaction_ids = list(dict.fromkeys(transaction_ids))
+    with driver.session() as session:
+        contexts = session.read_transaction(fetch_graph_contexts, transaction_ids)
+
+    for transaction_id in transaction_ids:
+        if transaction_id not in contexts:
+            yield transaction_id, f"❌ No transaction with ID {transaction_id} found."
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(explain_context, context, model_choice, timeout): transaction_id
+            for transaction_id, context in contexts.items()
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
 
 
 def explain_transaction_ids(transaction_id, model_choice="mistral"):
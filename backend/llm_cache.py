@@ -0,0 +1,275 @@
+# backend/llm_cache.py
+#
+# On-disk cache for LLM explanations, keyed by model name + SHA-256 of the
+# prompt, with age and size based eviction. Concurrent misses for the same key
+# (e.g. two analysts explaining the same transaction) share one LLM call;
+# streamed ones share one stream, which every caller reads from the start.
+
+import hashlib
+from contextlib import contextmanager
+import sqlite3
+import threading
+import time
+import os
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_explanations.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_MAX_AGE = int(os.getenv("LLM_CACHE_MAX_AGE", str(7 * 24 * 3600)))  # seconds
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    # One in-flight stream and the chunks it has produced so far. Whichever
+    # reader runs out of chunks pulls the next one from the source (one at a
+    # time), so the stream keeps going as long as anyone is still reading.
+
+    def __init__(self, source):
+        self.source = source
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.pulling = False
+        self.readers = 0
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    # At most one in-flight call per key; other callers wait for its result
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+
+    def do(self, key, fn):
+        # Returns (result, shared) where shared is True for callers that
+        # waited on someone else's call
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+    def stream(self, key, fn):
+        # Returns (chunks, shared): an iterator over the chunks of fn()'s
+        # stream, from the start, and whether that stream was already in
+        # flight for another caller. fn is only called by the first caller.
+        with self._lock:
+            call = self._streams.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._streams[key] = _Stream(fn())
+            with call.cond:
+                call.readers += 1
+        return self._read(key, call), shared
+
+    def _read(self, key, call):
+        i = 0
+        try:
+            while True:
+                with call.cond:
+                    while i >= len(call.chunks) and not call.done and call.pulling:
+                        call.cond.wait()
+                    if i < len(call.chunks):
+                        chunk = call.chunks[i]
+                    elif call.done:
+                        if call.error is not None:
+                            raise call.error
+                        return
+                    else:
+                        call.pulling = True
+                        chunk = None
+                if chunk is None:
+                    self._pull(key, call)
+                    continue
+                i += 1
+                yield chunk
+        finally:
+            with self._lock, call.cond:
+                call.readers -= 1
+                abandoned = not call.done and call.readers == 0
+                if abandoned and self._streams.get(key) is call:
+                    del self._streams[key]
+            if abandoned:
+                call.source.close()
+
+    def _pull(self, key, call):
+        # Next chunk from the source; the end of the stream (or an error)
+        # retires the call, so later callers start afresh or hit the cache
+        try:
+            chunk, done, error = next(call.source), False, None
+        except StopIteration:
+            chunk, done, error = None, True, None
+        except BaseException as e:
+            chunk, done, error = None, True, e
+        if done:
+            with self._lock:
+                if self._streams.get(key) is call:
+                    del self._streams[key]
+        with call.cond:
+            if done:
+                call.done, call.error = True, error
+            else:
+                call.chunks.append(chunk)
+            call.pulling = False
+            call.cond.notify_all()
+
+
+class ExplanationCache:
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, max_age=LLM_CACHE_MAX_AGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.flight = SingleFlight()
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "shared": 0, "misses": 0, "latency_saved": 0.0}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS explanations (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    latency REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS explanations_accessed ON explanations (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        # A connection per operation keeps this safe across Streamlit threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model, prompt):
+        return f"{model}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+    def _record(self, stat, latency=0.0):
+        with self._stats_lock:
+            self.stats[stat] += 1
+            self.stats["latency_saved"] += latency
+
+    def get(self, key):
+        # (response, latency of the original call) or None
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, latency FROM explanations WHERE key = ? AND created_at >= ?",
+                (key, now - self.max_age)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE explanations SET accessed_at = ? WHERE key = ?", (now, key))
+        return row
+
+    def put(self, key, model, response, latency):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO explanations VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, latency, now, now)
+            )
+            conn.execute("DELETE FROM explanations WHERE created_at < ?", (now - self.max_age,))
+            # Least recently used entries go first once over the size bound
+            conn.execute("""
+                DELETE FROM explanations WHERE key IN (
+                    SELECT key FROM explanations ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def get_or_compute(self, model, prompt, compute, cacheable=lambda response: True):
+        key = self.make_key(model, prompt)
+        cached = self.get(key)
+        if cached:
+            self._record("hits", cached[1])
+            return cached[0]
+
+        def load():
+            # Another caller may have filled the cache while we queued
+            cached = self.get(key)
+            if cached:
+                return cached[0], cached[1], True
+            start = time.perf_counter()
+            response = compute()
+            latency = time.perf_counter() - start
+            if cacheable(response):
+                self.put(key, model, response, latency)
+            return response, latency, False
+
+        (response, latency, from_cache), shared = self.flight.do(key, load)
+        if shared:
+            self._record("shared", latency)
+        elif from_cache:
+            self._record("hits", latency)
+        else:
+            self._record("misses")
+        return response
+
+    def get_or_stream(self, model, prompt, stream, cacheable=lambda response: True):
+        # Generator version of get_or_compute: a hit yields the cached text as
+        # one chunk, a miss passes the LLM stream through and stores the
+        # joined text once it completes. Concurrent misses for a key read the
+        # same stream, each from its first chunk.
+        key = self.make_key(model, prompt)
+        cached = self.get(key)
+        if cached:
+            self._record("hits", cached[1])
+            yield cached[0]
+            return
+
+        def load():
+            # Another caller may have filled the cache while we queued
+            cached = self.get(key)
+            if cached:
+                yield cached[0]
+                return
+            start = time.perf_counter()
+            parts = []
+            for chunk in stream():
+                parts.append(chunk)
+                yield chunk
+            response = "".join(parts)
+            if cacheable(response):
+                self.put(key, model, response, time.perf_counter() - start)
+
+        chunks, shared = self.flight.stream(key, load)
+        self._record("shared" if shared else "misses")
+        yield from chunks
+
+    def hit_rate(self):
+        with self._stats_lock:
+            total = self.stats["hits"] + self.stats["shared"] + self.stats["misses"]
+            return (self.stats["hits"] + self.stats["shared"]) / total if total else None
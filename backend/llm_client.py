@@ -0,0 +1,172 @@
+# backend/llm_client.py
+#
+# Shared HTTP layer for the LLM backends: one pooled keep-alive session per
+# backend (no TCP/TLS handshake per explanation), connect/read timeouts,
+# retries with backoff for connection failures and 429/5xx, and a circuit
+# breaker so a dead backend fails fast instead of hanging a Streamlit worker.
+# Failures surface as LLMError subclasses rather than "❌" strings.
+
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+OLLAMA_URL = f"{os.getenv('OLLAMA_HOST', 'http://localhost:11434')}/api/generate"
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3.05"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))  # seconds
+
+
+class LLMError(Exception):
+    def __init__(self, backend, message):
+        super().__init__(f"{backend}: {message}")
+        self.backend = backend
+
+
+class LLMUnavailable(LLMError):
+    # Connection refused/reset, or the circuit breaker is open
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class LLMResponseError(LLMError):
+    # The backend answered, but with an error status or an unusable body
+    def __init__(self, backend, message, status=None):
+        super().__init__(backend, message)
+        self.status = status
+
+
+class CircuitBreaker:
+    # closed -> open after `failures` consecutive failures; after `reset`
+    # seconds one trial call is let through (half-open) and its outcome
+    # closes or re-opens the breaker
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.reset else "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+
+
+class LLMBackend:
+
+    def __init__(self, name, retries=LLM_RETRIES, pool_size=LLM_POOL_SIZE):
+        self.name = name
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # a read timeout means a slow generation; don't resend it
+            status=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(self, url, payload, stream=False, timeout=None, headers=None):
+        # Returns a successful requests.Response or raises LLMError. Breaker
+        # failures are unavailability, timeouts and 5xx; a 4xx is the
+        # request's fault and leaves the breaker alone.
+        if not self.breaker.allow():
+            raise LLMUnavailable(self.name, "circuit open after repeated failures, failing fast")
+        try:
+            response = self.session.post(
+                url, json=payload, stream=stream, headers=headers,
+                timeout=(LLM_CONNECT_TIMEOUT, timeout or LLM_READ_TIMEOUT)
+            )
+        except requests.Timeout as e:
+            self.breaker.record_failure()
+            raise LLMTimeout(self.name, str(e)) from e
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise LLMUnavailable(self.name, str(e)) from e
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if not response.ok:
+            message = f"HTTP {response.status_code}: {response.text[:200]}"
+            response.close()
+            raise LLMResponseError(self.name, message, response.status_code)
+        return response
+
+
+def iter_lines(backend, response):
+    # Lines of a streamed response; a stream that dies half way counts
+    # against the backend's breaker too
+    try:
+        yield from response.iter_lines()
+    except requests.RequestException as e:
+        backend.breaker.record_failure()
+        raise LLMUnavailable(backend.name, f"stream interrupted: {e}") from e
+
+
+def parse_json(backend, data):
+    try:
+        return json.loads(data)
+    except ValueError as e:
+        raise LLMResponseError(backend.name, f"undecodable stream data: {data[:200]!r}") from e
+
+
+def iter_ndjson(backend, response):
+    # Objects of an NDJSON stream (Ollama). An {"error": ...} frame, which
+    # Ollama sends mid-stream instead of an HTTP error, raises.
+    for line in iter_lines(backend, response):
+        if not line:
+            continue
+        chunk = parse_json(backend, line)
+        if chunk.get("error"):
+            raise LLMResponseError(backend.name, chunk["error"])
+        yield chunk
+
+
+ollama = LLMBackend("ollama")
+gemini = LLMBackend("gemini")
@@ -1,8 +1,13 @@
 from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import argparse
 import csv
 from dotenv import load_dotenv
 import os
+import time
 import pandas as pd
+from backend.neo4j_schema import ensure_schema
 # Load environment variables
 load_dotenv()
 
@@ -13,6 +18,17 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "")
 # Neo4j driver setup
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
+# Batched mode defaults
+BATCH_SIZE = 5000
+WORKERS = 4
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5  # seconds, doubled on each attempt
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+# user_id stays a string, as csv.DictReader hands it to ingest_transaction
+CSV_DTYPES = {'transaction_id': str, 'user_id': str, 'location': str, 'channel': str}
+ENTITY_COLUMNS = ['user_id', 'location', 'channel']
+ENTITY_BATCH_SIZE = 50_000  # shared nodes merged per write transaction
+
 def clear_database(tx):
     tx.run("MATCH (n) DETACH DELETE n")
 
@@ -41,8 +57,76 @@ def ingest_transaction(tx, row):
         channel=row['channel']
     )
 
+def ingest_entities(tx, users, locations, channels):
+    # Shared nodes are merged once up front so the parallel chunk writers
+    # only MATCH them instead of racing to create them
+    tx.run("UNWIND $ids AS id MERGE (:User {id: id})", ids=users)
+    tx.run("UNWIND $names AS name MERGE (:Location {name: name})", names=locations)
+    tx.run("UNWIND $names AS name MERGE (:Channel {name: name})", names=channels)
+
+def distinct_entities(file_path, chunk_size=1_000_000):
+    # [users, locations, channels] of the file, gathered a chunk at a time:
+    # memory follows the number of distinct values, not the number of rows
+    seen = {column: set() for column in ENTITY_COLUMNS}
+    for chunk in pd.read_csv(file_path, usecols=ENTITY_COLUMNS, dtype=CSV_DTYPES, chunksize=chunk_size):
+        for column, values in seen.items():
+            values.update(chunk[column].unique().tolist())
+    return [sorted(seen[column]) for column in ENTITY_COLUMNS]
+
+def write_entities(users, locations, channels, batch_size=ENTITY_BATCH_SIZE):
+    # In slices, so no single transaction holds every user of a large file
+    with driver.session() as session:
+        for i in range(0, max(len(users), len(locations), len(channels)), batch_size):
+            session.write_transaction(
+                ingest_entities, users[i:i + batch_size], locations[i:i + batch_size], channels[i:i + batch_size]
+            )
+
+def ingest_batch(tx, rows):
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MATCH (u:User {id: row.user_id})
+        MATCH (l:Location {name: row.location})
+        MATCH (c:Channel {name: row.channel})
+        MERGE (t:Transaction {transaction_id: row.transaction_id})
+        SET t.timestamp = datetime(row.timestamp),
+            t.amount = row.amount,
+            t.type = row.transaction_type
+        MERGE (u)-[:MADE]->(t)
+        MERGE (t)-[:HAPPENED_IN]->(l)
+        MERGE (t)-[:VIA]->(c)
+        """,
+        rows=rows
+    )
+
+def chunk_to_rows(chunk):
+    # Same parameters as ingest_transaction, converted a whole chunk at a time
+    chunk = chunk.assign(
+        timestamp=pd.to_datetime(chunk['timestamp'], format='%d-%m-%Y %H:%M').dt.strftime('%Y-%m-%dT%H:%M:%S'),
+        amount=chunk['amount'].astype(float)
+    ).rename(columns={'txn_type': 'transaction_type'})
+    return chunk[[
+        'transaction_id', 'user_id', 'timestamp', 'amount', 'location', 'transaction_type', 'channel'
+    ]].to_dict('records')
+
+def write_chunk(rows, max_retries=MAX_RETRIES):
+    # One session per chunk; transient failures (deadlocks on the shared
+    # Location/Channel nodes, leader switches) retry the whole chunk
+    for attempt in range(max_retries + 1):
+        try:
+            with driver.session() as session:
+                session.write_transaction(ingest_batch, rows)
+            return len(rows)
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = RETRY_BACKOFF * 2 ** attempt
+            print(f"[⚠️] Chunk of {len(rows)} rows failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
 # Ingest CSV into Neo4j
 def ingest_csv_to_neo4j(file_path):
+    ensure_schema(driver)
     with driver.session() as session:
         with open(file_path, 'r', newline='') as csvfile:
             reader = csv.DictReader(csvfile)
@@ -50,5 +134,39 @@ def ingest_csv_to_neo4j(file_path):
                 session.write_transaction(ingest_transaction, row)
     print("✅ Transactions successfully ingested into Neo4j graph!")
 
+def ingest_csv_to_neo4j_batched(file_path, batch_size=BATCH_SIZE, workers=WORKERS, max_retries=MAX_RETRIES):
+    ensure_schema(driver)
+    read_kwargs = dict(dtype=CSV_DTYPES)
+    write_entities(*distinct_entities(file_path))
+
+    start = time.perf_counter()
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in pd.read_csv(file_path, chunksize=batch_size, **read_kwargs):
+            pending.add(pool.submit(write_chunk, chunk_to_rows(chunk), max_retries))
+            # Keep at most two chunks per worker in memory
+            if len(pending) >= 2 * workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                done += sum(f.result() for f in finished)
+                elapsed = time.perf_counter() - start
+                print(f"  {done:,} rows ({done / elapsed:,.0f} rows/sec)")
+        done += sum(f.result() for f in wait(pending).done)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {done:,} transactions ingested into Neo4j graph in {elapsed:.1f}s ({done / elapsed:,.0f} rows/sec)")
+    return done
+
 if __name__ == "__main__":
-    ingest_csv_to_neo4j("data/transactions_50k.csv")
+    parser = argparse.ArgumentParser(description="Load transactions into Neo4j")
+    parser.add_argument("file_path", nargs="?", default="data/transactions_50k.csv")
+    parser.add_argument("--row-by-row", action="store_true", help="one write transaction per CSV row (legacy mode)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES)
+    args = parser.parse_args()
+
+    if args.row_by_row:
+        ingest_csv_to_neo4j(args.file_path)
+    else:
+        ingest_csv_to_neo4j_batched(args.file_path, args.batch_size, args.workers, args.max_retries)
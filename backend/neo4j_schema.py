@@ -0,0 +1,79 @@
+# backend/neo4j_schema.py
+#
+# Idempotent schema setup for the transaction graph, plus a plan check for
+# the dashboard's graph queries. Ingest calls ensure_schema() before writing.
+#
+# Run directly to apply the schema and PROFILE the graph queries; it exits
+# non-zero if any of them still starts from a NodeByLabelScan:
+#   python -m backend.neo4j_schema
+
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT transaction_id_unique IF NOT EXISTS "
+    "FOR (t:Transaction) REQUIRE t.transaction_id IS UNIQUE",
+    "CREATE CONSTRAINT user_id_unique IF NOT EXISTS "
+    "FOR (u:User) REQUIRE u.id IS UNIQUE",
+    "CREATE CONSTRAINT location_name_unique IF NOT EXISTS "
+    "FOR (l:Location) REQUIRE l.name IS UNIQUE",
+    "CREATE CONSTRAINT channel_name_unique IF NOT EXISTS "
+    "FOR (c:Channel) REQUIRE c.name IS UNIQUE",
+    "CREATE INDEX transaction_timestamp IF NOT EXISTS "
+    "FOR (t:Transaction) ON (t.timestamp)",
+]
+
+LABEL_SCAN_OPERATORS = ("NodeByLabelScan", "AllNodesScan")
+
+
+def ensure_schema(driver):
+    with driver.session() as session:
+        for statement in SCHEMA_STATEMENTS:
+            session.run(statement).consume()
+        # Constraints are built in the background; wait so the first
+        # MERGEs of an ingest already go through the new indexes
+        session.run("CALL db.awaitIndexes(300)").consume()
+
+
+def _plan_operators(plan):
+    yield plan["operatorType"]
+    for child in plan.get("children", []):
+        yield from _plan_operators(child)
+
+
+def find_label_scans(driver, queries, txn_id, **parameters):
+    # {query name: [label scan operators]} for every query whose PROFILE
+    # plan scans a whole label instead of seeking an index
+    offenders = {}
+    with driver.session() as session:
+        for name, query in queries.items():
+            summary = session.run("PROFILE " + query, txn_id=txn_id, **parameters).consume()
+            scans = [op for op in _plan_operators(summary.profile) if op.startswith(LABEL_SCAN_OPERATORS)]
+            if scans:
+                offenders[name] = scans
+    return offenders
+
+
+if __name__ == "__main__":
+    from backend.graph_visualizer import EXPAND_QUERIES, GRAPH_HUB_DEGREE, GRAPH_QUERY, driver
+    from backend.graphrag_reasoner import GRAPH_CONTEXT_QUERY
+
+    ensure_schema(driver)
+    print("✅ Neo4j constraints and indexes are in place.")
+
+    with driver.session() as session:
+        record = session.run("MATCH (t:Transaction) RETURN t.transaction_id AS txn_id LIMIT 1").single()
+    if record is None:
+        print("❌ No transactions in the graph; ingest data before checking query plans.")
+        raise SystemExit(1)
+
+    queries = {
+        "graph_visualizer.fetch_graph_data": GRAPH_QUERY,
+        "graphrag_reasoner.fetch_graph_context": GRAPH_CONTEXT_QUERY,
+    }
+    # Only the Transaction expansion matches anything for this key, but every
+    # label's plan must still start from its constraint's index
+    queries.update({f"graph_visualizer.expand_nodes[{label}]": query for label, query in EXPAND_QUERIES.items()})
+    offenders = find_label_scans(driver, queries, record["txn_id"], keys=[record["txn_id"]], limit=GRAPH_HUB_DEGREE + 1)
+    if offenders:
+        for name, scans in offenders.items():
+            print(f"❌ {name} plan uses {', '.join(scans)}")
+        raise SystemExit(1)
+    print("✅ Graph queries start from index seeks (no label scans).")
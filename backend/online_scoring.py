@@ -0,0 +1,226 @@
+# backend/online_scoring.py
+#
+# Stateful, one-transaction-at-a-time version of backend/anomaly_scoring.py
+# for real-time scoring. Each user keeps:
+#   - a Welford running count/mean/M2 of amounts (outlier rule),
+#   - a deque of timestamps inside the last FREQUENCY_WINDOW (velocity rule),
+#   - bitmasks of the locations/channels seen so far, over codes shared by
+#     all users (first-seen rules).
+# Scoring a transaction is a few dict/deque operations, then the state is
+# updated with it. The whole scorer pickles to a checkpoint file.
+#
+# OnlineScorer(compact=True) keeps the same state in
+# backend.user_sketches.UserSketches instead: about 100 bytes per user,
+# array-backed, for tens of millions of users. See that module for the
+# differences (txn_count_1h saturates, 1-second timestamps).
+#
+# Replayed in (timestamp, arrival) order, every transaction gets the flags
+# the batch path gives it when scored together with everything before it:
+# score_transactions(prefix) for the prefix ending at that transaction.
+# The first-seen, night and large flags are then the same as a batch over
+# the whole history, and so is the 1-hour count except between rows that
+# share a timestamp (only the earlier arrivals are counted). The outlier
+# flag uses the mean/std known at arrival time; later rows can't be seen yet.
+#
+#   python -m backend.online_scoring data/transactions_50k.csv --checkpoint .cache/online_scorer.pkl
+
+import argparse
+import bisect
+import math
+import os
+import pickle
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from backend.anomaly_scoring import (
+    FLAG_COLUMNS, FLAG_WEIGHTS, FREQUENCY_THRESHOLD, FREQUENCY_WINDOW,
+    LARGE_TRANSACTION_THRESHOLD, NIGHT_HOURS, OUTLIER_STD_MULTIPLIER
+)
+from backend.user_sketches import UserSketches
+
+CHECKPOINT_VERSION = 3
+WINDOW_NS = FREQUENCY_WINDOW.value
+
+
+class UserState:
+    __slots__ = ("count", "mean", "m2", "recent", "locations", "channels")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.recent = deque()  # ns timestamps within the window, ascending
+        self.locations = 0     # bit i set: location code i seen
+        self.channels = 0
+
+    def __getstate__(self):
+        return (self.count, self.mean, self.m2, list(self.recent), self.locations, self.channels)
+
+    def __setstate__(self, state):
+        self.count, self.mean, self.m2, recent, self.locations, self.channels = state
+        self.recent = deque(recent)
+
+
+class OnlineScorer:
+
+    def __init__(self, compact=False, quantiles=False):
+        self.users = {}
+        self.sketches = UserSketches(quantiles) if compact else None
+        self.location_codes = {}
+        self.channel_codes = {}
+        self.scored = 0
+        # source -> resume position (e.g. a file offset) of a consumer that
+        # checkpoints with the scorer, so state and position are saved together
+        self.positions = {}
+
+    @staticmethod
+    def _code(codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def user_count(self):
+        return len(self.sketches) if self.sketches is not None else len(self.users)
+
+    def _update_user(self, user_id, ts, amount, location, channel):
+        # (is_amount_outlier, txn_count_1h, new_location, new_channel), then
+        # the transaction is part of the user's state
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = UserState()
+
+        # Welford update first: the batch rule compares a row against
+        # statistics that include it
+        state.count += 1
+        delta = amount - state.mean
+        state.mean += delta / state.count
+        state.m2 += delta * (amount - state.mean)
+        if state.count > 1:
+            margin = OUTLIER_STD_MULTIPLIER * math.sqrt(state.m2 / (state.count - 1))
+            outlier = amount > state.mean + margin or amount < state.mean - margin
+        else:
+            outlier = False
+
+        # Rows in [ts - window, ts]; a late row (older than the newest seen)
+        # is inserted in order and only counts rows up to its own time
+        recent = state.recent
+        if not recent or ts >= recent[-1]:
+            recent.append(ts)
+            while recent[0] < ts - WINDOW_NS:
+                recent.popleft()
+            count_1h = len(recent)
+        else:
+            bisect.insort(recent, ts)
+            count_1h = bisect.bisect_right(recent, ts) - bisect.bisect_left(recent, ts - WINDOW_NS)
+
+        location_bit = 1 << self._code(self.location_codes, location)
+        channel_bit = 1 << self._code(self.channel_codes, channel)
+        new_location = not state.locations & location_bit
+        new_channel = not state.channels & channel_bit
+        state.locations |= location_bit
+        state.channels |= channel_bit
+        return outlier, count_1h, new_location, new_channel
+
+    def _score(self, user_id, ts, hour, amount, location, channel):
+        if self.sketches is not None:
+            outlier, count_1h, new_location, new_channel = self.sketches.update(user_id, ts, amount, location, channel)
+        else:
+            outlier, count_1h, new_location, new_channel = self._update_user(user_id, ts, amount, location, channel)
+        self.scored += 1
+
+        flags = {
+            "is_large_transaction": amount > LARGE_TRANSACTION_THRESHOLD,
+            "is_amount_outlier": outlier,
+            "is_frequency_anomaly": count_1h > FREQUENCY_THRESHOLD,
+            "is_geographic_anomaly": new_location,
+            "is_time_anomaly": NIGHT_HOURS[0] <= hour <= NIGHT_HOURS[1],
+            "is_channel_anomaly": new_channel,
+        }
+        return flags, count_1h
+
+    def score(self, user_id, timestamp, amount, location, channel):
+        # Flags, txn_count_1h and anomaly_score for one transaction, then
+        # folds it into the user's state
+        timestamp = pd.Timestamp(timestamp)
+        flags, count_1h = self._score(user_id, timestamp.value, timestamp.hour, float(amount), location, channel)
+        result = dict(flags, txn_count_1h=count_1h)
+        result["anomaly_score"] = sum(FLAG_WEIGHTS[col] for col, flag in flags.items() if flag)
+        return result
+
+    def score_frame(self, df):
+        # Scores the rows of a TRANSACTION_COLUMNS frame in the frame's order;
+        # returns the frame with the flag columns, txn_count_1h and
+        # anomaly_score added (same index)
+        timestamps = pd.to_datetime(df['timestamp'])
+        rows = zip(
+            df['user_id'].tolist(),
+            timestamps.to_numpy(dtype='datetime64[ns]').view('int64').tolist(),
+            timestamps.dt.hour.tolist(),
+            df['amount'].astype('float64').tolist(),
+            df['location'].tolist(),
+            df['channel'].tolist(),
+        )
+        flags = np.zeros((len(df), len(FLAG_COLUMNS)), dtype=bool)
+        counts = np.zeros(len(df), dtype=np.int64)
+        for i, row in enumerate(rows):
+            row_flags, counts[i] = self._score(*row)
+            flags[i] = list(row_flags.values())
+
+        scored = df.copy()
+        scored['timestamp'] = timestamps
+        for j, col in enumerate(FLAG_COLUMNS):
+            scored[col] = flags[:, j]
+        scored['txn_count_1h'] = counts
+        scored['anomaly_score'] = flags.astype(np.int64) @ np.array([FLAG_WEIGHTS[col] for col in FLAG_COLUMNS])
+        return scored
+
+    def save(self, path):
+        # Written to a temporary name and renamed, so a crash mid-write keeps
+        # the previous checkpoint
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": CHECKPOINT_VERSION, "scorer": self}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{path} is a version {checkpoint.get('version')} checkpoint, expected {CHECKPOINT_VERSION}")
+        return checkpoint["scorer"]
+
+
+def load_or_create(path, compact=False):
+    # A checkpoint keeps the state backend it was saved with
+    return OnlineScorer.load(path) if path and os.path.exists(path) else OnlineScorer(compact)
+
+
+if __name__ == "__main__":
+    from backend.anomaly_scoring import TRANSACTION_COLUMNS
+
+    parser = argparse.ArgumentParser(description="Replay transactions through the online scorer")
+    parser.add_argument("file_path", nargs="?", default="data/transactions_50k.csv")
+    parser.add_argument("--checkpoint", help="resume from / save state to this file")
+    parser.add_argument("--compact", action="store_true", help="array-backed per-user state (backend/user_sketches.py)")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.file_path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='%d-%m-%Y %H:%M')
+    df = df.sort_values('timestamp', kind='stable')[TRANSACTION_COLUMNS]
+
+    scorer = load_or_create(args.checkpoint, args.compact)
+    start = time.perf_counter()
+    scored = scorer.score_frame(df)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Scored {len(df):,} transactions in {elapsed:.2f}s ({elapsed / len(df) * 1e6:.1f} µs/txn), "
+          f"{int((scored['anomaly_score'] > 0).sum()):,} flagged, {scorer.user_count():,} users in state")
+    if args.checkpoint:
+        scorer.save(args.checkpoint)
+        print(f"💾 Checkpoint written to {args.checkpoint} ({os.path.getsize(args.checkpoint) / 1e6:.1f} MB)")
@@ -0,0 +1,211 @@
+# backend/parallel_scoring.py
+#
+# Multi-core version of anomaly_scoring.score_transactions. Every rule is
+# per-user, so rows are sharded by a hash of user_id and each shard is scored
+# by score_transactions in a worker process. Results are the same as the
+# serial call.
+#
+# Nothing is pickled per row. The parent copies the columns the detectors
+# read into shared memory, grouped by shard: user_id, timestamp (int64 ns),
+# numeric columns as they are and the others (location, channel) as integer
+# codes. Each task only gets (shared block names, start, end), the
+# detectors and the codes' categories. Workers write the flags and the
+# detectors' extra outputs (txn_count_1h) back into shared output arrays at
+# their rows' positions, plus the order score_transactions put their rows
+# in. A user is in one
+# shard only, so the parent gets the overall (user_id, timestamp) order by
+# sorting users rather than rows. There are more shards than workers, so
+# one busy shard doesn't leave the other cores idle.
+#
+# The pool is created on first use and kept for the life of the process.
+# Workers are spawned, not forked, so the pool is safe to start from a
+# threaded process such as Streamlit.
+#
+#   python -m benchmarks.benchmark_parallel_scoring --rows 1000000 5000000
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backend.anomaly_scoring import score_transactions
+from backend.detectors import get_detectors
+
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", os.cpu_count() or 1))
+PARALLEL_MIN_ROWS = 200_000    # below this, process overhead beats the speedup
+SHARDS_PER_WORKER = 4
+
+_pool = None
+_pool_workers = 0
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _pool_workers = workers
+    return _pool
+
+
+def shard_of(user_ids, n_shards):
+    # Multiplicative (Fibonacci) hash, so consecutive user_ids spread evenly
+    # and every process agrees on the shard
+    hashed = (np.asarray(user_ids).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+    return (hashed % np.uint64(n_shards)).astype(np.int64)
+
+
+class SharedArrays:
+    # Named numpy arrays backed by shared memory blocks. The owner creates
+    # and unlinks them; workers attach by spec.
+
+    def __init__(self, spec, create=False):
+        # spec: {name: (block name or None, dtype str, shape)}
+        self.blocks = {}
+        self.arrays = {}
+        for name, (block, dtype, shape) in spec.items():
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            shm = shared_memory.SharedMemory(name=block, create=create, size=size if create else 0)
+            self.blocks[name] = shm
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, shapes):
+        # shapes: {name: (dtype, shape)}
+        return cls({name: (None, np.dtype(dtype).str, shape) for name, (dtype, shape) in shapes.items()}, create=True)
+
+    @property
+    def spec(self):
+        return {
+            name: (self.blocks[name].name, array.dtype.str, array.shape)
+            for name, array in self.arrays.items()
+        }
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        for shm in self.blocks.values():
+            shm.close()
+            if unlink:
+                shm.unlink()
+
+
+def _output_columns(detectors):
+    return [column for detector in detectors for column in detector.outputs]
+
+
+def _input_columns(df, detectors):
+    # ({column: array to share}, {column: categories of its integer codes})
+    names = dict.fromkeys(['user_id'] + [col for detector in detectors for col in detector.columns])
+    names.pop('timestamp', None)
+    columns = {'timestamp': pd.to_datetime(df['timestamp']).to_numpy().astype('datetime64[ns]').view('int64')}
+    categories = {}
+    for name in names:
+        values = df[name]
+        if pd.api.types.is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+            columns[name] = values.to_numpy()
+        else:
+            codes, uniques = pd.factorize(values)
+            columns[name] = codes.astype(np.int32)
+            categories[name] = pd.Index(np.asarray(uniques))
+    return columns, categories
+
+
+def _score_shard(input_spec, output_spec, start, end, detectors, categories):
+    # Runs in a worker: scores rows [start, end) of the shared inputs, writes
+    # their results to the same positions of the shared outputs, and their
+    # positions in (user_id, timestamp) order to by_user[start:end]
+    inputs = SharedArrays(input_spec)
+    outputs = SharedArrays(output_spec)
+    try:
+        shard = pd.DataFrame({
+            name: pd.Categorical.from_codes(values[start:end], categories[name]) if name in categories
+            else values[start:end]
+            for name, values in inputs.arrays.items()
+        }, index=pd.RangeIndex(start, end))
+        shard['timestamp'] = shard['timestamp'].to_numpy().view('datetime64[ns]')
+        scored = score_transactions(shard, detectors)
+        positions = scored.index.to_numpy()
+        outputs['flags'][positions] = scored[[detector.name for detector in detectors]].to_numpy()
+        for column in _output_columns(detectors):
+            outputs[column][positions] = scored[column].to_numpy()
+        outputs['by_user'][start:end] = positions
+    finally:
+        inputs.close()
+        outputs.close()
+
+
+def _merge_user_blocks(user_ids):
+    # Shard segments are each in (user_id, timestamp) order and every user is
+    # in one shard, so the rows form one contiguous block per user. Returns
+    # the permutation that puts the blocks in user_id order.
+    n = len(user_ids)
+    starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+    lengths = np.diff(np.r_[starts, n])
+    block_order = np.argsort(user_ids[starts])
+    starts, lengths = starts[block_order], lengths[block_order]
+    shift = starts - np.r_[0, np.cumsum(lengths)[:-1]]
+    return np.arange(n) + np.repeat(shift, lengths)
+
+
+def score_transactions_parallel(df, workers=SCORING_WORKERS, min_rows=PARALLEL_MIN_ROWS, detectors=None):
+    # Same result as score_transactions(df, detectors) (ordered by
+    # (user_id, timestamp), original index labels kept), computed on
+    # `workers` processes. Detectors are pickled to the workers, so custom
+    # ones must be importable classes.
+    detectors = get_detectors() if detectors is None else detectors
+    if workers <= 1 or len(df) < min_rows:
+        return score_transactions(df, detectors)
+
+    n = len(df)
+    columns, categories = _input_columns(df, detectors)
+    user_ids = columns['user_id']
+    n_shards = min(workers * SHARDS_PER_WORKER, np.iinfo(np.uint16).max)
+    # uint16 shard numbers get numpy's O(n) radix sort
+    shards = shard_of(user_ids, n_shards).astype(np.uint16)
+    order = np.argsort(shards, kind='stable')
+    bounds = np.searchsorted(shards[order], np.arange(n_shards + 1))
+
+    inputs = SharedArrays.create({name: (values.dtype, (n,)) for name, values in columns.items()})
+    outputs = SharedArrays.create({
+        'flags': (np.bool_, (n, len(detectors))),
+        'by_user': (np.int64, (n,)),
+        **{column: (np.int64, (n,)) for column in _output_columns(detectors)},
+    })
+    try:
+        for name, values in columns.items():
+            np.take(values, order, out=inputs[name])
+        pool = _get_pool(workers)
+        futures = [
+            pool.submit(_score_shard, inputs.spec, outputs.spec, int(bounds[i]), int(bounds[i + 1]),
+                        detectors, categories)
+            for i in range(n_shards) if bounds[i] < bounds[i + 1]
+        ]
+        for future in futures:
+            future.result()
+
+        # Shard positions in (user_id, timestamp) order, then the results and
+        # the original rows in that order
+        by_user = outputs['by_user']
+        by_user = by_user[_merge_user_blocks(inputs['user_id'][by_user])]
+        flags = outputs['flags'][by_user]
+        extra = {column: outputs[column][by_user] for column in _output_columns(detectors)}
+        rows = order[by_user]
+    finally:
+        inputs.close(unlink=True)
+        outputs.close(unlink=True)
+
+    scored = df.take(rows)
+    scored['timestamp'] = pd.to_datetime(df['timestamp']).array.take(rows)
+    for j, detector in enumerate(detectors):
+        scored[detector.name] = flags[:, j]
+    for column, values in extra.items():
+        scored[column] = values
+    scored['anomaly_score'] = flags.astype(np.int64) @ np.array([detector.weight for detector in detectors])
+    return scored
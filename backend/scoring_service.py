@@ -0,0 +1,388 @@
+# backend/scoring_service.py
+#
+# Long-running scorer for new transactions. Transactions are read one at a
+# time from a local source and scored by backend.online_scoring.OnlineScorer
+# against per-user state. Flagged ones go to the ClickHouse `anomalies` table
+# in micro-batches: a batch is written once it has --batch-size rows or its
+# oldest row has waited --flush-ms, whichever comes first.
+#
+# Sources:
+#   - a tailed file: CSV with the columns of data/transactions_50k.csv, or
+#     NDJSON (.ndjson/.jsonl) with the same keys
+#   - a Unix socket that accepts NDJSON lines from any number of writers
+#   - a queue.Queue, for feeding the service from the same process
+#
+# Latency is kept for the last LATENCY_SAMPLES transactions: scoring (parse +
+# score) and write (received -> inserted into `anomalies`, flagged rows only).
+# p50/p99 are printed and written to `scoring_service_metrics` every
+# --report-every seconds; the dashboard shows the latest report.
+#
+# The scorer is checkpointed with the tailed file's offset, after flushing,
+# so a restart resumes where the checkpoint was taken. Transactions replayed
+# after a crash are written again with the same transaction_id, and
+# `anomalies` (a ReplacingMergeTree) keeps one copy. Socket and queue input
+# that wasn't scored yet is lost on a crash.
+#
+#   python -m backend.scoring_service --file data/transactions_50k.csv --checkpoint .cache/scoring_service.pkl
+#   python -m backend.scoring_service --socket /tmp/anomaly-scoring.sock
+
+import argparse
+import csv
+import json
+import os
+import queue
+import selectors
+import socket
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from backend.anomaly_scoring import FLAG_COLUMNS, TRANSACTION_COLUMNS
+from backend.clickhouse_arrow import query_df
+from backend.clickhouse_ingest import TABLE_COLUMNS
+from backend.online_scoring import OnlineScorer, load_or_create
+
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 0.5       # seconds a flagged row may wait for its batch
+POLL_INTERVAL = 0.05       # seconds between checks of an idle source
+CHECKPOINT_INTERVAL = 30
+REPORT_INTERVAL = 10
+LATENCY_SAMPLES = 10_000
+
+TIMESTAMP_FORMAT = '%d-%m-%Y %H:%M'
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+ANOMALY_COLUMNS = TABLE_COLUMNS + FLAG_COLUMNS + ['txn_count_1h', 'anomaly_score', 'scored_at']
+METRICS_COLUMNS = [
+    'reported_at', 'source', 'processed', 'flagged', 'rejected',
+    'score_p50_us', 'score_p99_us', 'write_p50_ms', 'write_p99_ms'
+]
+
+RECENT_ANOMALIES_QUERY = f"""
+SELECT transaction_id, user_id, timestamp, amount, location, transaction_type AS txn_type, channel,
+       {', '.join(FLAG_COLUMNS)}, anomaly_score
+FROM anomalies FINAL
+ORDER BY timestamp DESC, transaction_id DESC
+LIMIT {{limit:UInt32}}
+"""
+
+
+def create_anomalies_table(client):
+    flags = ",\n            ".join(f"{col} Bool" for col in FLAG_COLUMNS)
+    client.command(f'''
+        CREATE TABLE IF NOT EXISTS anomalies (
+            transaction_id String,
+            user_id UInt32,
+            timestamp DateTime,
+            amount Float32,
+            location String,
+            transaction_type String,
+            channel String,
+            {flags},
+            txn_count_1h UInt32,
+            anomaly_score UInt8,
+            scored_at DateTime64(3)
+        ) ENGINE = ReplacingMergeTree(scored_at)
+        PARTITION BY toYYYYMM(timestamp)
+        ORDER BY (timestamp, transaction_id)
+    ''')
+    client.command('''
+        CREATE TABLE IF NOT EXISTS scoring_service_metrics (
+            reported_at DateTime64(3),
+            source String,
+            processed UInt64,
+            flagged UInt64,
+            rejected UInt64,
+            score_p50_us Float64,
+            score_p99_us Float64,
+            write_p50_ms Float64,
+            write_p99_ms Float64
+        ) ENGINE = MergeTree()
+        ORDER BY (source, reported_at)
+        TTL toDateTime(reported_at) + INTERVAL 7 DAY
+    ''')
+
+
+def anomalies_table_exists(client):
+    return bool(int(client.command("EXISTS TABLE anomalies")))
+
+
+def fetch_recent_anomalies(client, limit=100):
+    # Newest flagged transactions, in the columns of
+    # anomaly_scoring.top_anomalous_transactions
+    return query_df(client, RECENT_ANOMALIES_QUERY, TRANSACTION_COLUMNS + FLAG_COLUMNS + ['anomaly_score'],
+                    {"limit": int(limit)})
+
+
+def fetch_service_metrics(client):
+    # The latest report as a dict of METRICS_COLUMNS, or None
+    row = client.query(
+        f"SELECT {', '.join(METRICS_COLUMNS)} FROM scoring_service_metrics ORDER BY reported_at DESC LIMIT 1"
+    ).first_row
+    return dict(zip(METRICS_COLUMNS, row)) if row else None
+
+
+def parse_timestamp(value):
+    try:
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def parse_record(fields):
+    # CSV/JSON fields -> tuple in TRANSACTION_COLUMNS order; raises
+    # KeyError/ValueError/TypeError for a malformed transaction
+    return (
+        str(fields['transaction_id']),
+        int(fields['user_id']),
+        parse_timestamp(fields['timestamp']),
+        float(fields['amount']),
+        str(fields['location']),
+        str(fields.get('txn_type', fields.get('transaction_type'))),
+        str(fields['channel']),
+    )
+
+
+def json_fields(line):
+    # One NDJSON line; {} (rejected by parse_record) if it isn't valid JSON
+    try:
+        return json.loads(line)
+    except ValueError:
+        return {}
+
+
+# Sources yield (fields, position) per transaction, and None whenever they
+# have been idle for POLL_INTERVAL, so the service can flush a partial batch.
+# `position` is where to resume after this transaction, or None.
+
+def tail_file(path, offset=0, poll_interval=POLL_INTERVAL):
+    # Complete lines after `offset` (0: after the CSV header), then whatever
+    # is appended. A last line without a newline is still being written.
+    ndjson = path.endswith(NDJSON_SUFFIXES)
+    with open(path, 'rb') as f:
+        header = None if ndjson else next(csv.reader([f.readline().decode()]))
+        if offset == 0:
+            offset = f.tell()
+        if offset > os.fstat(f.fileno()).st_size:
+            raise ValueError(f"{path} is shorter than the checkpointed offset; it was rewritten")
+        f.seek(offset)
+        while True:
+            line = f.readline()
+            if not line.endswith(b'\n'):
+                f.seek(offset)
+                yield None
+                time.sleep(poll_interval)
+                continue
+            offset += len(line)
+            if not line.strip():
+                continue
+            text = line.decode(errors='replace')
+            fields = json_fields(text) if ndjson else dict(zip(header, next(csv.reader([text]))))
+            yield fields, offset
+
+
+def unix_socket_source(path, poll_interval=POLL_INTERVAL):
+    # NDJSON lines from every client connected to a Unix socket at `path`
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    server.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    buffers = {}
+    try:
+        while True:
+            events = selector.select(poll_interval)
+            if not events:
+                yield None
+            for key, _ in events:
+                if key.fileobj is server:
+                    conn, _ = server.accept()
+                    conn.setblocking(False)
+                    selector.register(conn, selectors.EVENT_READ)
+                    buffers[conn] = b''
+                    continue
+                conn = key.fileobj
+                data = conn.recv(65536)
+                if not data:
+                    selector.unregister(conn)
+                    conn.close()
+                    buffers.pop(conn)
+                    continue
+                *lines, buffers[conn] = (buffers[conn] + data).split(b'\n')
+                for line in lines:
+                    if line.strip():
+                        yield json_fields(line), None
+    finally:
+        for conn in buffers:
+            conn.close()
+        selector.close()
+        server.close()
+        os.unlink(path)
+
+
+def queue_source(q, poll_interval=POLL_INTERVAL):
+    # Dicts put on `q`; None on the queue ends the stream
+    while True:
+        try:
+            fields = q.get(timeout=poll_interval)
+        except queue.Empty:
+            yield None
+            continue
+        if fields is None:
+            return
+        yield fields, None
+
+
+class LatencyWindow:
+    # The last `size` latencies in seconds, for percentiles over recent traffic
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentiles(self, *q):
+        if not self.samples:
+            return [float('nan')] * len(q)
+        return np.percentile(np.fromiter(self.samples, float, len(self.samples)), q).tolist()
+
+
+class ScoringService:
+
+    def __init__(self, client, scorer=None, source="stream", checkpoint=None, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, checkpoint_interval=CHECKPOINT_INTERVAL,
+                 report_interval=REPORT_INTERVAL):
+        self.client = client
+        self.scorer = scorer or OnlineScorer()
+        self.source = source
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.report_interval = report_interval
+
+        self.pending = []          # anomaly rows of the next batch
+        self.received = []         # perf_counter() at receipt, per pending row
+        self.processed = 0
+        self.flagged = 0
+        self.rejected = 0
+        self.score_latency = LatencyWindow()
+        self.write_latency = LatencyWindow()
+        now = time.perf_counter()
+        self.last_checkpoint = now
+        self.last_report = now
+
+    @property
+    def position(self):
+        return self.scorer.positions.get(self.source)
+
+    def process(self, fields, position, received):
+        try:
+            record = parse_record(fields)
+        except (KeyError, TypeError, ValueError):
+            self.rejected += 1
+            return
+        _, user_id, timestamp, amount, location, _, channel = record
+        result = self.scorer.score(user_id, timestamp, amount, location, channel)
+        self.score_latency.add(time.perf_counter() - received)
+        self.processed += 1
+        if position is not None:
+            self.scorer.positions[self.source] = position
+        if result['anomaly_score'] > 0:
+            self.pending.append(record + tuple(result[col] for col in FLAG_COLUMNS) + (
+                result['txn_count_1h'], result['anomaly_score'], datetime.now()
+            ))
+            self.received.append(received)
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch = pd.DataFrame(self.pending, columns=ANOMALY_COLUMNS).astype({
+            'user_id': 'uint32', 'amount': 'float32', 'txn_count_1h': 'uint32', 'anomaly_score': 'uint8'
+        })
+        self.client.insert_df('anomalies', batch)
+        written = time.perf_counter()
+        for received in self.received:
+            self.write_latency.add(written - received)
+        self.flagged += len(self.pending)
+        self.pending, self.received = [], []
+
+    def save(self):
+        # Flushed first: the checkpointed position must not be past rows
+        # that were scored but never written
+        self.flush()
+        if self.checkpoint:
+            self.scorer.save(self.checkpoint)
+        self.last_checkpoint = time.perf_counter()
+
+    def report(self):
+        score_p50, score_p99 = self.score_latency.percentiles(50, 99)
+        write_p50, write_p99 = self.write_latency.percentiles(50, 99)
+        row = (datetime.now(), self.source, self.processed, self.flagged, self.rejected,
+               score_p50 * 1e6, score_p99 * 1e6, write_p50 * 1e3, write_p99 * 1e3)
+        self.client.insert('scoring_service_metrics', [row], column_names=METRICS_COLUMNS)
+        print(f"📈 {self.processed:,} scored, {self.flagged:,} flagged, {self.rejected:,} rejected | "
+              f"score p50 {row[5]:.1f} µs p99 {row[6]:.1f} µs | write p50 {row[7]:.1f} ms p99 {row[8]:.1f} ms")
+        self.last_report = time.perf_counter()
+
+    def run(self, records):
+        # Consumes a source until it ends (or KeyboardInterrupt), then writes
+        # the last batch, checkpoint and report
+        try:
+            for item in records:
+                now = time.perf_counter()
+                if item is not None:
+                    self.process(*item, now)
+                if self.pending and (
+                    len(self.pending) >= self.batch_size or now - self.received[0] >= self.flush_interval
+                ):
+                    self.flush()
+                if now - self.last_checkpoint >= self.checkpoint_interval:
+                    self.save()
+                if now - self.last_report >= self.report_interval:
+                    self.report()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.save()
+            self.report()
+
+
+if __name__ == "__main__":
+    from backend.clickhouse_ingest import get_clickhouse_client
+
+    parser = argparse.ArgumentParser(description="Score new transactions as they arrive and write anomalies to ClickHouse")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="CSV or NDJSON file to tail")
+    source.add_argument("--socket", help="Unix socket path to accept NDJSON transactions on")
+    parser.add_argument("--checkpoint", help="resume from / save scorer state and file offset to this file")
+    parser.add_argument("--compact", action="store_true", help="array-backed per-user state (backend/user_sketches.py)")
+    parser.add_argument("--from-end", action="store_true", help="without a checkpointed offset, skip the file's existing lines")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--flush-ms", type=float, default=FLUSH_INTERVAL * 1000)
+    parser.add_argument("--report-every", type=float, default=REPORT_INTERVAL, help="seconds between latency reports")
+    args = parser.parse_args()
+
+    client = get_clickhouse_client()
+    create_anomalies_table(client)
+    scorer = load_or_create(args.checkpoint, args.compact)
+    name = os.path.abspath(args.file) if args.file else f"socket:{args.socket}"
+    service = ScoringService(client, scorer, name, args.checkpoint, args.batch_size,
+                             args.flush_ms / 1000, report_interval=args.report_every)
+    if args.file:
+        offset = service.position
+        if offset is None:
+            offset = os.path.getsize(args.file) if args.from_end else 0
+        print(f"👀 Tailing {args.file} from byte {offset:,} ({scorer.user_count():,} users in state)")
+        records = tail_file(args.file, offset)
+    else:
+        print(f"👂 Listening on {args.socket}")
+        records = unix_socket_source(args.socket)
+    service.run(records)
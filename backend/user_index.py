@@ -0,0 +1,37 @@
+# backend/user_index.py
+#
+# user_id -> row range over a copy of the transactions frame sorted by
+# (user_id, timestamp). Built once per loaded frame in O(n log n); each
+# lookup is a binary search plus a slice of that user's rows, instead of a
+# boolean mask over every transaction.
+
+import numpy as np
+
+
+class UserIndex:
+
+    def __init__(self, df):
+        self.df = df.sort_values(["user_id", "timestamp"], kind="stable", ignore_index=True)
+        self.user_ids, self.starts, counts = np.unique(
+            self.df["user_id"].to_numpy(), return_index=True, return_counts=True
+        )
+        self.ends = self.starts + counts
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __contains__(self, user_id):
+        i = np.searchsorted(self.user_ids, user_id)
+        return i < len(self.user_ids) and self.user_ids[i] == user_id
+
+    def row_range(self, user_id):
+        # (start, end) positions in self.df; (0, 0) for an unknown user
+        i = np.searchsorted(self.user_ids, user_id)
+        if i == len(self.user_ids) or self.user_ids[i] != user_id:
+            return 0, 0
+        return int(self.starts[i]), int(self.ends[i])
+
+    def rows(self, user_id):
+        # The user's transactions, oldest first (a view: treat as read-only)
+        start, end = self.row_range(user_id)
+        return self.df.iloc[start:end]
@@ -0,0 +1,255 @@
+# backend/user_profiles.py
+#
+# Per-user profiles kept up to date by ClickHouse itself: a materialized
+# view on `transactions` folds every inserted block into `user_profiles`, an
+# AggregatingMergeTree holding partial aggregate states (avg, stddevPop,
+# groupUniqArray of locations and of channels, counts per hour of day and of
+# large amounts) per user. Reading a profile merges a handful of states
+# instead of rescanning the user's rows.
+#
+# Four of the six flags are decomposable and come straight from a profile:
+# large and night-time transactions are counts, and "first time at this
+# location/channel" fires once per distinct value. NIGHT_HOURS is applied to
+# the per-hour counts when reading; a change of LARGE_TRANSACTION_THRESHOLD
+# makes create_user_profiles rebuild the table. The outlier and 1-hour
+# frequency flags depend on the user's other rows, so a single-user summary
+# still reads that user's rows (through the by_user projection) for them.
+# Rankings over a time window (the dashboard's top users) score the window's
+# rows in SQL instead (clickhouse_scoring.fetch_top_anomalous_users): a
+# profile covers all time and can't be cut to a window.
+#
+# Profiles count inserted blocks: blocks skipped by insert deduplication
+# never reach the view, but rows re-inserted past the deduplication window
+# (a reload, incremental_ingest --reset) are counted twice: merges drop them
+# from the ReplacingMergeTree `transactions`, not from the profiles.
+# create_user_profiles(client, replace=True) rebuilds from `transactions
+# FINAL`; incremental_ingest --reset does so after reloading.
+#
+#   python -m backend.user_profiles --rebuild
+#   python -m backend.user_profiles --score data/new_transactions.csv
+#   python -m backend.user_profiles --score data/new_transactions.csv --baseline data/transactions_50k.csv
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from backend.anomaly_scoring import (
+    FLAG_COLUMNS, FLAG_WEIGHTS, FREQUENCY_THRESHOLD, FREQUENCY_WINDOW,
+    LARGE_TRANSACTION_THRESHOLD, NIGHT_HOURS, OUTLIER_STD_MULTIPLIER, ScoringBatch, score_batch
+)
+from backend.detectors import get_detectors
+
+def profile_states():
+    # The view's SELECT over `transactions`. Night-time is kept as raw
+    # per-hour counts, so NIGHT_HOURS applies when a profile is read; the
+    # large count bakes LARGE_TRANSACTION_THRESHOLD in, and is rebuilt when
+    # it changes (see profile_config)
+    return f"""
+    user_id,
+    count() AS transaction_count,
+    avgState(toFloat64(amount)) AS amount_avg,
+    stddevPopState(toFloat64(amount)) AS amount_stddev,
+    groupUniqArrayState(location) AS locations,
+    groupUniqArrayState(channel) AS channels,
+    countIf(amount > {LARGE_TRANSACTION_THRESHOLD}) AS large_count,
+    sumForEachState(arrayMap(hour -> toUInt64(hour = toHour(timestamp)), range(24))) AS hour_counts,
+    min(timestamp) AS first_seen,
+    max(timestamp) AS last_seen
+"""
+
+
+def profile_config():
+    # Recorded as the table comment; a table built under another schema or
+    # threshold is rebuilt by create_user_profiles
+    return f"hour_counts, large_count: amount > {LARGE_TRANSACTION_THRESHOLD}"
+
+
+def profile_query(where=""):
+    # Finalized profile per user; stddev is converted to the sample estimate
+    # (ddof=1) that the outlier rule uses
+    first_hour, hours = NIGHT_HOURS[0] + 1, NIGHT_HOURS[1] - NIGHT_HOURS[0] + 1
+    return f"""
+SELECT
+    user_id,
+    sum(transaction_count) AS transaction_count,
+    avgMerge(amount_avg) AS amount_mean,
+    if(transaction_count > 1,
+       stddevPopMerge(amount_stddev) * sqrt(transaction_count / (transaction_count - 1)),
+       nan) AS amount_std,
+    length(locations) AS location_count,
+    groupUniqArrayMerge(locations) AS locations,
+    groupUniqArrayMerge(channels) AS channels,
+    sum(large_count) AS large_count,
+    arraySum(arraySlice(sumForEachMerge(hour_counts), {first_hour}, {hours})) AS night_count,
+    min(first_seen) AS first_seen,
+    max(last_seen) AS last_seen
+FROM user_profiles
+{where}
+GROUP BY user_id
+"""
+
+
+PROFILE_COLUMNS = [
+    "user_id", "transaction_count", "amount_mean", "amount_std", "location_count", "locations",
+    "channels", "large_count", "night_count", "first_seen", "last_seen"
+]
+
+# Outlier and frequency counts for one user, from that user's rows only.
+# Rows loaded twice and not merged yet count once, like in the profile
+# (rebuilt from FINAL); LIMIT 1 BY keeps the read on the by_user projection.
+USER_ROW_FLAGS_QUERY = f"""
+SELECT
+    countIf(abs(toFloat64(amount) - {{mean:Float64}}) > {OUTLIER_STD_MULTIPLIER} * {{std:Float64}}),
+    countIf(txn_count_1h > {FREQUENCY_THRESHOLD})
+FROM (
+    SELECT amount, count() OVER (
+        ORDER BY toInt64(toUnixTimestamp(timestamp))
+        RANGE BETWEEN {int(FREQUENCY_WINDOW.total_seconds())} PRECEDING AND CURRENT ROW
+    ) AS txn_count_1h
+    FROM (
+        SELECT timestamp, amount
+        FROM transactions
+        WHERE user_id = {{user_id:UInt32}}
+        LIMIT 1 BY timestamp, transaction_id
+    )
+)
+SETTINGS optimize_read_in_order = 0
+"""
+
+
+def create_user_profiles(client, replace=False):
+    # Table + view; a newly created table is backfilled from `transactions
+    # FINAL` (each row once), so run this while nothing else is inserting.
+    # An existing table whose comment isn't the current profile_config()
+    # (older schema, other LARGE_TRANSACTION_THRESHOLD) is rebuilt.
+    config = profile_config()
+    built_with = client.query(
+        "SELECT comment FROM system.tables WHERE database = currentDatabase() AND name = 'user_profiles'"
+    ).result_rows
+    if replace or (built_with and built_with[0][0] != config):
+        client.command("DROP VIEW IF EXISTS user_profiles_mv")
+        client.command("DROP TABLE IF EXISTS user_profiles")
+    existed = bool(int(client.command("EXISTS TABLE user_profiles")))
+    client.command(f'''
+        CREATE TABLE IF NOT EXISTS user_profiles (
+            user_id UInt32,
+            transaction_count SimpleAggregateFunction(sum, UInt64),
+            amount_avg AggregateFunction(avg, Float64),
+            amount_stddev AggregateFunction(stddevPop, Float64),
+            locations AggregateFunction(groupUniqArray, String),
+            channels AggregateFunction(groupUniqArray, String),
+            large_count SimpleAggregateFunction(sum, UInt64),
+            hour_counts AggregateFunction(sumForEach, Array(UInt64)),
+            first_seen SimpleAggregateFunction(min, DateTime),
+            last_seen SimpleAggregateFunction(max, DateTime)
+        ) ENGINE = AggregatingMergeTree()
+        ORDER BY user_id
+        COMMENT '{config}'
+    ''')
+    client.command(f'''
+        CREATE MATERIALIZED VIEW IF NOT EXISTS user_profiles_mv TO user_profiles AS
+        SELECT {profile_states()}
+        FROM transactions
+        GROUP BY user_id
+    ''')
+    if not existed:
+        client.command(f"INSERT INTO user_profiles SELECT {profile_states()} FROM transactions FINAL GROUP BY user_id")
+
+
+def fetch_user_profiles(client, user_ids=None):
+    # DataFrame of PROFILE_COLUMNS, for every user or only `user_ids`
+    if user_ids is None:
+        query, parameters = profile_query(), None
+    else:
+        query = profile_query("WHERE user_id IN {user_ids:Array(UInt32)}")
+        parameters = {"user_ids": [int(u) for u in user_ids]}
+    return pd.DataFrame(client.query(query, parameters=parameters).result_rows, columns=PROFILE_COLUMNS)
+
+
+def fetch_user_anomaly_summary(client, user_id):
+    # [user_id, total, <count per flag in FLAG_COLUMNS order>, mean anomaly
+    # score], as anomaly_statistics gives for the user's scored rows
+    profiles = fetch_user_profiles(client, [user_id])
+    if profiles.empty:
+        return None
+    profile = profiles.iloc[0]
+    total = int(profile["transaction_count"])
+    outliers, frequent = 0, 0
+    if total > 1:
+        outliers, frequent = client.query(USER_ROW_FLAGS_QUERY, parameters={
+            "user_id": int(user_id), "mean": float(profile["amount_mean"]), "std": float(profile["amount_std"])
+        }).first_row
+    counts = {
+        "is_large_transaction": int(profile["large_count"]),
+        "is_amount_outlier": int(outliers),
+        "is_frequency_anomaly": int(frequent),
+        "is_geographic_anomaly": int(profile["location_count"]),
+        "is_time_anomaly": int(profile["night_count"]),
+        "is_channel_anomaly": len(profile["channels"]),
+    }
+    score = sum(counts[col] * weight for col, weight in FLAG_WEIGHTS.items())
+    return [user_id, total] + [counts[col] for col in FLAG_COLUMNS] + [score / total]
+
+
+def score_against_profiles(df, profiles, detectors=None):
+    # Scores new transactions (TRANSACTION_COLUMNS, not yet in the table)
+    # with each user's profile as the history: outliers against the profile
+    # mean/std, locations and channels new unless the profile has them. The
+    # 1-hour frequency only sees rows of this batch. Users without a profile
+    # are judged on the batch alone.
+    baseline = profiles.set_index('user_id')
+    batch = ScoringBatch(df)
+    users = pd.Series(batch['user_id'])
+    profiled = users.isin(baseline.index).to_numpy()
+    batch.amount_mean = np.where(profiled, users.map(baseline['amount_mean']).to_numpy(), batch.amount_mean)
+    batch.amount_std = np.where(profiled, users.map(baseline['amount_std']).to_numpy(), batch.amount_std)
+    for column, known in (('location', 'locations'), ('channel', 'channels')):
+        seen = {
+            (user, value)
+            for user, values in baseline[known].items()
+            for value in values
+        }
+        batch.history[column] = np.fromiter(
+            ((user, value) in seen for user, value in zip(batch['user_id'], batch[column])), bool, len(batch)
+        )
+    return score_batch(batch, get_detectors() if detectors is None else detectors)
+
+
+if __name__ == "__main__":
+    from backend.anomaly_scoring import TRANSACTION_COLUMNS
+    from backend.clickhouse_ingest import CSV_DTYPES, get_clickhouse_client
+
+    parser = argparse.ArgumentParser(description="Maintain per-user profiles and score new transactions against them")
+    parser.add_argument("--rebuild", action="store_true", help="drop and backfill user_profiles from transactions")
+    parser.add_argument("--score", metavar="CSV", help="score a CSV of new transactions against the profiles")
+    parser.add_argument("--baseline", metavar="CSV",
+                        help="with --score: build the profiles from this history CSV (in memory) instead of ClickHouse")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    def read_transactions(path):
+        df = pd.read_csv(path, dtype=CSV_DTYPES)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format='%d-%m-%Y %H:%M')
+        return df[TRANSACTION_COLUMNS]
+
+    if args.score:
+        new = read_transactions(args.score)
+        if args.baseline:
+            from backend.user_sketches import UserSketches
+
+            sketches = UserSketches()
+            sketches.add_frame(read_transactions(args.baseline))
+            profiles = sketches.profiles(new['user_id'].unique())
+        else:
+            client = get_clickhouse_client()
+            create_user_profiles(client, replace=args.rebuild)
+            profiles = fetch_user_profiles(client, new['user_id'].unique())
+        scored = score_against_profiles(new[TRANSACTION_COLUMNS], profiles)
+        anomalies = scored[scored['anomaly_score'] > 0].sort_values('anomaly_score', ascending=False)
+        print(anomalies[TRANSACTION_COLUMNS + ['anomaly_score']].head(args.limit).to_string(index=False))
+    else:
+        client = get_clickhouse_client()
+        create_user_profiles(client, replace=args.rebuild)
+        profiles = fetch_user_profiles(client)
+        print(f"✅ {len(profiles):,} user profiles covering {profiles['transaction_count'].sum():,} transactions.")
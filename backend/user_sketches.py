@@ -0,0 +1,287 @@
+# backend/user_sketches.py
+#
+# Compact per-user state for the anomaly rules: fixed-size numpy arrays
+# indexed by user_id. There is no Python object per user.
+#
+#   per user                        dtype             bytes
+#   count, mean, M2 (Welford)       3x float64           24
+#   locations seen (bitset)         uint64 per 64 codes   8
+#   channels seen (bitset)          uint64 per 64 codes   8
+#   last RECENT_SLOTS timestamps    uint32 seconds       64
+#   --------------------------------------------------------
+#   total                                               104
+#   + amount histogram (optional)   uint32 x 64         256
+#
+# Arrays grow by doubling up to the largest user_id seen, so every id below
+# it costs the same 104 bytes. That fits dense ids like the UInt32 user_id
+# of `transactions`; sparse or hashed ids should be mapped to dense ones
+# first. For comparison, online_scoring's default per-user UserState (a
+# slotted object, a deque, Python ints, a dict entry) measures about 1 KB
+# per user under tracemalloc.
+#
+# Location and channel values are dictionary-encoded through a vocabulary
+# shared by all users. A bitset grows by one uint64 word per 64 distinct
+# values.
+#
+# Differences from the exact state:
+#   - Only the newest RECENT_SLOTS timestamps are kept, so txn_count_1h
+#     saturates at RECENT_SLOTS (16, or FREQUENCY_THRESHOLD + 1 if that is
+#     more), so is_frequency_anomaly is still exact.
+#   - Timestamps have one-second resolution.
+#
+# The optional histogram is a log-bucketed quantile sketch (relative
+# error about (QUANTILE_GAMMA - 1) / 2) for per-user percentile thresholds.
+#
+# Plugging in:
+#   - online: OnlineScorer(compact=True) keeps its state here.
+#   - batch: add_frame() folds a whole frame of history in with vectorized
+#     updates. profiles() turns the state into the baseline frame that
+#     user_profiles.score_against_profiles scores new batches against.
+#
+#   python -m benchmarks.benchmark_user_sketches --users 50000 200000
+
+import bisect
+import math
+
+import numpy as np
+import pandas as pd
+
+from backend.anomaly_scoring import FREQUENCY_THRESHOLD, FREQUENCY_WINDOW, OUTLIER_STD_MULTIPLIER
+
+# One more than the frequency threshold, so is_frequency_anomaly stays exact
+RECENT_SLOTS = max(16, FREQUENCY_THRESHOLD + 1)
+QUANTILE_BUCKETS = 64
+QUANTILE_GAMMA = 1.35     # bucket i holds amounts in (GAMMA^(i-1), GAMMA^i]
+LOG_GAMMA = math.log(QUANTILE_GAMMA)
+WINDOW_SECONDS = int(FREQUENCY_WINDOW.total_seconds())
+INITIAL_USERS = 1024
+
+
+class UserSketches:
+
+    def __init__(self, quantiles=False):
+        self.quantiles = quantiles
+        self.location_codes = {}
+        self.channel_codes = {}
+        self.capacity = 0
+        # count, mean, M2 per user, one row read/written per update
+        self.moments = np.zeros((0, 3), dtype=np.float64)
+        self.locations = np.zeros((0, 1), dtype=np.uint64)
+        self.channels = np.zeros((0, 1), dtype=np.uint64)
+        # Ascending per row; 0 marks an empty slot
+        self.recent = np.zeros((0, RECENT_SLOTS), dtype=np.uint32)
+        self.histogram = np.zeros((0, QUANTILE_BUCKETS), dtype=np.uint32) if quantiles else None
+        self._grow(INITIAL_USERS)
+
+    # --- storage --------------------------------------------------------
+
+    def _grow(self, size):
+        if size <= self.capacity:
+            return
+        capacity = max(size, 2 * self.capacity)
+
+        def grown(array):
+            out = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            out[:len(array)] = array
+            return out
+
+        self.moments = grown(self.moments)
+        self.locations, self.channels = grown(self.locations), grown(self.channels)
+        self.recent = grown(self.recent)
+        if self.histogram is not None:
+            self.histogram = grown(self.histogram)
+        self.capacity = capacity
+
+    @staticmethod
+    def _encode(codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def _widen(self, name, word):
+        # Bitset array `name` with at least word + 1 words per user
+        array = getattr(self, name)
+        if word >= array.shape[1]:
+            wider = np.zeros((array.shape[0], word + 1), dtype=np.uint64)
+            wider[:, :array.shape[1]] = array
+            setattr(self, name, wider)
+
+    def memory_bytes(self):
+        arrays = [self.moments, self.locations, self.channels, self.recent]
+        if self.histogram is not None:
+            arrays.append(self.histogram)
+        return sum(array.nbytes for array in arrays)
+
+    def bytes_per_user(self):
+        return self.memory_bytes() / self.capacity
+
+    def __len__(self):
+        # Users with at least one transaction
+        return int(np.count_nonzero(self.moments[:, 0]))
+
+    # --- online ---------------------------------------------------------
+
+    def update(self, user_id, ts, amount, location, channel):
+        # Folds one transaction (ts in ns) into the user's state and returns
+        # (is_amount_outlier, txn_count_1h, new_location, new_channel) under
+        # the same rules as OnlineScorer. Each array is touched once or
+        # twice: element access on numpy arrays costs ~100ns a time.
+        if user_id >= self.capacity:
+            self._grow(user_id + 1)
+
+        count, mean, m2 = self.moments[user_id].tolist()
+        count += 1
+        delta = amount - mean
+        mean += delta / count
+        m2 += delta * (amount - mean)
+        self.moments[user_id] = (count, mean, m2)
+        if count > 1:
+            margin = OUTLIER_STD_MULTIPLIER * (m2 / (count - 1)) ** 0.5
+            outlier = amount > mean + margin or amount < mean - margin
+        else:
+            outlier = False
+
+        # Slots hold 0 when empty, so the window start is at least 1
+        seconds = ts // 1_000_000_000
+        start = max(seconds - WINDOW_SECONDS, 1)
+        row = self.recent[user_id]
+        recent = row.tolist()
+        if seconds >= recent[-1]:
+            del recent[0]
+            recent.append(seconds)
+            count_1h = RECENT_SLOTS - bisect.bisect_left(recent, start)
+        else:
+            # Late row: insert in order (dropping the oldest), count up to its time
+            pos = bisect.bisect_right(recent, seconds)
+            if pos:
+                del recent[0]
+                recent.insert(pos - 1, seconds)
+            count_1h = max(1, pos - bisect.bisect_left(recent, start))
+        row[:] = recent
+
+        code = self._encode(self.location_codes, location)
+        word, bit = code >> 6, 1 << (code & 63)
+        if word >= self.locations.shape[1]:
+            self._widen('locations', word)
+        seen = int(self.locations[user_id, word])
+        new_location = not seen & bit
+        if new_location:
+            self.locations[user_id, word] = seen | bit
+
+        code = self._encode(self.channel_codes, channel)
+        word, bit = code >> 6, 1 << (code & 63)
+        if word >= self.channels.shape[1]:
+            self._widen('channels', word)
+        seen = int(self.channels[user_id, word])
+        new_channel = not seen & bit
+        if new_channel:
+            self.channels[user_id, word] = seen | bit
+
+        if self.histogram is not None:
+            bucket = math.ceil(math.log(max(amount, 1.0)) / LOG_GAMMA)
+            self.histogram[user_id, min(bucket, QUANTILE_BUCKETS - 1)] += 1
+        return outlier, count_1h, new_location, new_channel
+
+    # --- batch ----------------------------------------------------------
+
+    def _encode_column(self, codes, values):
+        uniques_codes, uniques = pd.factorize(values)
+        mapping = np.array([self._encode(codes, value) for value in uniques], dtype=np.int64)
+        return mapping[uniques_codes]
+
+    def _or_bits(self, name, users, codes):
+        if len(codes):
+            self._widen(name, int(codes.max()) >> 6)
+        array = getattr(self, name)
+        np.bitwise_or.at(array, (users, codes >> 6), np.left_shift(np.uint64(1), (codes & 63).astype(np.uint64)))
+
+    def add_frame(self, df):
+        # Folds a frame of TRANSACTION_COLUMNS (history, any row order) into
+        # the state with vectorized updates; nothing is scored
+        if not len(df):
+            return
+        user_ids = df['user_id'].to_numpy().astype(np.int64)
+        amounts = df['amount'].to_numpy().astype(np.float64)
+        seconds = pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[s]').astype(np.int64)
+        self._grow(int(user_ids.max()) + 1)
+
+        # Moments: per-user batch mean/M2, combined with the stored ones
+        users, inverse = np.unique(user_ids, return_inverse=True)
+        n_b = np.bincount(inverse).astype(np.float64)
+        mean_b = np.bincount(inverse, amounts) / n_b
+        m2_b = np.bincount(inverse, (amounts - mean_b[inverse]) ** 2)
+        n_a, mean_a, m2_a = self.moments[users].T
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        self.moments[users] = np.column_stack([
+            n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n
+        ])
+
+        self._or_bits('locations', user_ids, self._encode_column(self.location_codes, df['location']))
+        self._or_bits('channels', user_ids, self._encode_column(self.channel_codes, df['channel']))
+
+        # Recent timestamps: the newest RECENT_SLOTS per user of the stored
+        # and new ones together
+        order = np.lexsort((seconds, inverse))
+        group, secs = inverse[order], seconds[order]
+        ends = np.searchsorted(group, np.arange(len(users)), side='right')
+        from_end = ends[group] - np.arange(len(group))      # 1 = newest of its user
+        keep = from_end <= RECENT_SLOTS
+        new = np.zeros((len(users), RECENT_SLOTS), dtype=np.uint32)
+        new[group[keep], RECENT_SLOTS - from_end[keep]] = secs[keep]
+        merged = np.sort(np.concatenate([self.recent[users], new], axis=1), axis=1)
+        self.recent[users] = merged[:, -RECENT_SLOTS:]
+
+        if self.histogram is not None:
+            np.add.at(self.histogram, (user_ids, _bucket(amounts)), 1)
+
+    def profiles(self, user_ids=None):
+        # Baseline frame in the shape of user_profiles.fetch_user_profiles
+        # (the columns score_against_profiles reads) for known users
+        known = np.flatnonzero(self.moments[:, 0])
+        if user_ids is not None:
+            ids = np.asarray(user_ids, dtype=np.int64)
+            ids = ids[(ids >= 0) & (ids < self.capacity)]
+            known = np.intersect1d(known, ids)
+        count, mean, m2 = self.moments[known].T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
+        return pd.DataFrame({
+            'user_id': known,
+            'transaction_count': count.astype(np.int64),
+            'amount_mean': mean,
+            'amount_std': std,
+            'locations': _decode_bitsets(self.locations[known], self.location_codes),
+            'channels': _decode_bitsets(self.channels[known], self.channel_codes),
+        })
+
+    def amount_quantile(self, user_id, q):
+        # Approximate q-quantile (0..1) of the user's amounts, or None
+        if self.histogram is None:
+            raise ValueError("UserSketches was created without quantiles=True")
+        if user_id >= self.capacity or not self.moments[user_id, 0]:
+            return None
+        cumulative = np.cumsum(self.histogram[user_id])
+        bucket = int(np.searchsorted(cumulative, q * cumulative[-1], side='left'))
+        # Midpoint of the bucket on the log scale
+        return float(QUANTILE_GAMMA ** (bucket - 0.5))
+
+
+def _bucket(amounts):
+    # Log-scale bucket of each amount, clipped to the histogram
+    with np.errstate(divide='ignore'):
+        buckets = np.ceil(np.log(np.maximum(amounts, 1.0)) / LOG_GAMMA)
+    return np.clip(buckets, 0, QUANTILE_BUCKETS - 1).astype(np.int64)
+
+
+def _decode_bitsets(bitsets, codes):
+    # Rows of bitset words -> lists of the encoded values
+    values = np.empty(len(codes), dtype=object)
+    for value, code in codes.items():
+        values[code] = value
+    result = []
+    for row in bitsets:
+        bits = np.unpackbits(row.view(np.uint8), bitorder='little')[:len(codes)]
+        result.append(values[np.flatnonzero(bits)].tolist())
+    return result
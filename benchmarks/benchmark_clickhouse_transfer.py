@@ -0,0 +1,74 @@
+# benchmarks/benchmark_clickhouse_transfer.py
+#
+# Row path vs. Arrow path for pulling a transaction window out of ClickHouse:
+#   rows:  client.query().result_rows -> DataFrame -> pd.to_datetime
+#   arrow: backend.clickhouse_arrow.query_df (ArrowStream, dictionary strings)
+# and the uncompressed bytes of each response format (Native vs ArrowStream).
+# Rows are generated server-side with numbers(), so no table is needed.
+#
+#   python -m benchmarks.benchmark_clickhouse_transfer --rows 100000 1000000 5000000
+
+import argparse
+import time
+
+import pandas as pd
+
+from backend.anomaly_scoring import TRANSACTION_COLUMNS
+from backend.clickhouse_arrow import ARROW_SETTINGS, arrow_sql, query_df
+from backend.clickhouse_ingest import get_clickhouse_client
+
+SYNTHETIC_WINDOW = """
+SELECT
+    concat('txn', leftPad(toString(number), 9, '0')) AS transaction_id,
+    toUInt32(number % 20000) AS user_id,
+    toDateTime('2024-01-01 00:00:00') + toIntervalSecond(number * 7) AS timestamp,
+    toFloat32(round(50 + (number * 7919) % 5000000 / 100, 2)) AS amount,
+    ['Pune', 'Hyderabad', 'Bangalore', 'Delhi', 'Mumbai', 'Chennai'][number % 6 + 1] AS location,
+    ['debit', 'payment', 'credit', 'transfer'][intDiv(number, 7) % 4 + 1] AS txn_type,
+    ['ATM', 'Mobile', 'Web', 'POS'][intDiv(number, 3) % 4 + 1] AS channel
+FROM numbers({rows:UInt64})
+"""
+
+
+def load_rows(client, rows):
+    result = client.query(SYNTHETIC_WINDOW, parameters={"rows": rows}).result_rows
+    df = pd.DataFrame(result, columns=TRANSACTION_COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+
+def load_arrow(client, rows):
+    return query_df(client, SYNTHETIC_WINDOW, TRANSACTION_COLUMNS, {"rows": rows})
+
+
+def response_bytes(client, rows):
+    parameters = {"rows": rows}
+    native = client.raw_query(SYNTHETIC_WINDOW, parameters=parameters, fmt="Native")
+    arrow = client.raw_query(
+        arrow_sql(SYNTHETIC_WINDOW, TRANSACTION_COLUMNS), parameters=parameters,
+        settings=ARROW_SETTINGS, fmt="ArrowStream"
+    )
+    return len(native), len(arrow)
+
+
+def timed(load, client, rows):
+    start = time.perf_counter()
+    df = load(client, rows)
+    return time.perf_counter() - start, df.memory_usage(deep=True).sum()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark result_rows vs Arrow query results")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    client = get_clickhouse_client()
+    print(f"{'rows':>10}  {'native':>9}  {'arrow':>9}  {'rows path':>9}  {'arrow path':>10}  "
+          f"{'rows df':>8}  {'arrow df':>8}  {'speedup':>7}")
+    for rows in args.rows:
+        native_bytes, arrow_bytes = response_bytes(client, rows)
+        rows_time, rows_memory = timed(load_rows, client, rows)
+        arrow_time, arrow_memory = timed(load_arrow, client, rows)
+        print(f"{rows:>10,}  {native_bytes / 1e6:>7.1f}MB  {arrow_bytes / 1e6:>7.1f}MB  "
+              f"{rows_time:>8.2f}s  {arrow_time:>9.2f}s  {rows_memory / 1e6:>6.0f}MB  "
+              f"{arrow_memory / 1e6:>6.0f}MB  {rows_time / arrow_time:>6.1f}x")
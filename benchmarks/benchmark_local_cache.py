@@ -0,0 +1,74 @@
+# benchmarks/benchmark_local_cache.py
+#
+# Dashboard load path before and after backend.arrow_cache: pd.read_csv of
+# the whole CSV vs. the memory-mapped Arrow copy with the System Statistics
+# column projection. Each load runs in a fresh process so peak RSS is its own.
+#
+#   python -m benchmarks.benchmark_local_cache --rows 50000 1000000 5000000
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import pandas as pd
+
+from backend.arrow_cache import convert_csv_to_arrow, open_transactions
+from benchmarks.benchmark_scoring import make_transactions
+
+CSV_COLUMNS = ["transaction_id", "user_id", "amount", "timestamp", "location", "channel", "txn_type"]
+PROJECTION = ["user_id", "amount", "location", "channel", "txn_type"]
+
+
+def write_csv(path, n_rows):
+    df = make_transactions(n_rows)
+    df["timestamp"] = df["timestamp"].dt.strftime("%d-%m-%Y %H:%M")
+    df[CSV_COLUMNS].to_csv(path, index=False)
+
+
+def load_csv(path):
+    return pd.read_csv(path)
+
+
+def load_arrow(path):
+    return open_transactions(path, PROJECTION).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _measure(load, path, queue):
+    start = time.perf_counter()
+    df = load(path)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, len(df)))
+
+
+def measure(load, path):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure, args=(load, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CSV vs memory-mapped Arrow dashboard loads")
+    parser.add_argument("--rows", type=int, nargs="+", default=[50_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'csv load':>9}  {'csv rss':>8}  {'arrow load':>10}  {'arrow rss':>9}  {'convert':>8}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "transactions.csv")
+            arrow_path = os.path.join(tmp, "transactions.arrow")
+            write_csv(csv_path, n_rows)
+            start = time.perf_counter()
+            convert_csv_to_arrow(csv_path, arrow_path)
+            convert = time.perf_counter() - start
+
+            csv_time, csv_rss, _ = measure(load_csv, csv_path)
+            arrow_time, arrow_rss, _ = measure(load_arrow, arrow_path)
+            print(f"{n_rows:>10,}  {csv_time:>8.2f}s  {csv_rss:>6.0f}MB  "
+                  f"{arrow_time:>9.2f}s  {arrow_rss:>7.0f}MB  {convert:>7.1f}s")
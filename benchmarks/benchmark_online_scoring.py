@@ -0,0 +1,72 @@
+# benchmarks/benchmark_online_scoring.py
+#
+# Replays synthetic transactions in timestamp order through
+# backend.online_scoring.OnlineScorer and checks them against the batch path:
+# every flag of a sample of rows against score_transactions() over the prefix
+# ending at that row, plus checkpoint save/load. Reports µs per transaction
+# for score_frame and for single score() calls.
+#
+#   python -m benchmarks.benchmark_online_scoring --rows 100000 1000000
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from backend.anomaly_scoring import FLAG_COLUMNS, score_transactions
+from backend.online_scoring import OnlineScorer
+from benchmarks.benchmark_scoring import make_transactions
+
+
+def assert_prefix_parity(df, online, samples, seed=0):
+    # Prefix re-scoring is O(n) per row, so only `samples` rows are checked
+    columns = FLAG_COLUMNS + ['txn_count_1h', 'anomaly_score']
+    for i in random.Random(seed).sample(range(len(df)), min(samples, len(df))):
+        expected = score_transactions(df.iloc[:i + 1]).loc[i, columns]
+        actual = online.loc[i, columns]
+        mismatched = [col for col in columns if int(expected[col]) != int(actual[col])]
+        assert not mismatched, f"row {i}: online and prefix batch disagree on {mismatched}"
+
+
+def assert_checkpoint_roundtrip(scorer, df):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scorer.pkl")
+        scorer.save(path)
+        restored = OnlineScorer.load(path)
+    tail = df.tail(1000)
+    expected = scorer.score_frame(tail)
+    actual = restored.score_frame(tail)
+    assert expected[FLAG_COLUMNS].equals(actual[FLAG_COLUMNS]), "restored checkpoint scores differently"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and check the online scorer against the batch path")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--rows-per-user", type=int, default=50)
+    parser.add_argument("--parity-samples", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'score_frame':>11}  {'score()':>9}  {'users':>8}  parity")
+    for n_rows in args.rows:
+        df = make_transactions(n_rows, args.rows_per_user)
+        df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+        scorer = OnlineScorer()
+        start = time.perf_counter()
+        online = scorer.score_frame(df)
+        frame_us = (time.perf_counter() - start) / n_rows * 1e6
+
+        # Single calls on a fresh scorer, as a stream consumer would make them
+        single = OnlineScorer()
+        rows = df.head(50_000)
+        start = time.perf_counter()
+        for row in rows.itertuples(index=False):
+            single.score(row.user_id, row.timestamp, row.amount, row.location, row.channel)
+        single_us = (time.perf_counter() - start) / len(rows) * 1e6
+
+        assert_prefix_parity(df, online, args.parity_samples)
+        assert_checkpoint_roundtrip(scorer, df)
+        print(f"{n_rows:>10,}  {frame_us:>8.2f} µs  {single_us:>6.2f} µs  {len(scorer.users):>8,}  ok")
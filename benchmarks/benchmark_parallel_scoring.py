@@ -0,0 +1,58 @@
+# benchmarks/benchmark_parallel_scoring.py
+#
+# Serial score_transactions vs backend.parallel_scoring on synthetic windows,
+# for a range of worker counts. Checks that every parallel result equals the
+# serial one, and reports speedup and parallel efficiency (speedup / workers).
+#
+#   python -m benchmarks.benchmark_parallel_scoring --rows 1000000 5000000 --workers 1 2 4 8
+
+import argparse
+import os
+import time
+
+from backend.anomaly_scoring import score_transactions
+from backend.parallel_scoring import score_transactions_parallel
+from benchmarks.benchmark_scoring import make_transactions
+
+
+def timed(score, df, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scored = score(df)
+        best = min(best, time.perf_counter() - start)
+    return best, scored
+
+
+def default_workers():
+    # 2, 4, 8, ... up to the core count (workers=1 is the serial path)
+    cores = os.cpu_count() or 1
+    counts = [2]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] < cores:
+        counts.append(cores)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark process-pool scoring against serial scoring")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers())
+    parser.add_argument("--rows-per-user", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores")
+    print(f"{'rows':>10}  {'workers':>7}  {'time':>8}  {'speedup':>7}  {'efficiency':>10}")
+    for n_rows in args.rows:
+        df = make_transactions(n_rows, args.rows_per_user)
+        serial_time, expected = timed(score_transactions, df, args.repeat)
+        print(f"{n_rows:>10,}  {'serial':>7}  {serial_time:>7.2f}s")
+        for workers in args.workers:
+            # First call per worker count also starts the pool; not timed
+            score_transactions_parallel(df.head(1000), workers, min_rows=0)
+            elapsed, scored = timed(lambda d: score_transactions_parallel(d, workers, min_rows=0), df, args.repeat)
+            assert scored.equals(expected), f"{workers} workers: parallel and serial results differ"
+            speedup = serial_time / elapsed
+            print(f"{n_rows:>10,}  {workers:>7}  {elapsed:>7.2f}s  {speedup:>6.2f}x  {speedup / workers:>9.0%}")
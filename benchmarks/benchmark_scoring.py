@@ -0,0 +1,143 @@
+# benchmarks/benchmark_scoring.py
+#
+# Compares backend.anomaly_scoring.score_transactions against the per-user
+# loop implementation it replaced in app.py, on synthetic transaction windows.
+#
+#   python -m benchmarks.benchmark_scoring --rows 10000 1000000 10000000
+#
+# The legacy loops are O(n^2) per user, so by default they only run up to
+# --legacy-max-rows; above that the speedup is reported from a legacy run on
+# a user-sampled subset scaled to the full window (marked with "~").
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from backend.anomaly_scoring import FLAG_COLUMNS, TRANSACTION_COLUMNS, score_transactions
+
+LOCATIONS = ['Pune', 'Hyderabad', 'Bangalore', 'Delhi', 'Mumbai', 'Chennai']
+CHANNELS = ['ATM', 'Mobile', 'Web', 'POS']
+TXN_TYPES = ['debit', 'payment', 'credit', 'transfer']
+
+
+def make_transactions(n_rows, rows_per_user=50, seed=42):
+    rng = np.random.default_rng(seed)
+    n_users = max(1, n_rows // rows_per_user)
+    start = np.datetime64('2023-01-01T00:00:00', 's')
+    span = 2 * 365 * 24 * 3600
+    seconds = rng.integers(0, span, n_rows)
+    # Bursts of activity so the 1-hour frequency rule actually fires
+    burst = rng.random(n_rows) < 0.05
+    seconds[burst] = (seconds[burst] // 3600) * 3600 + rng.integers(0, 3600, burst.sum())
+    seconds = seconds - seconds % 60
+    amounts = rng.uniform(50, 50000, n_rows)
+    large = rng.random(n_rows) < 0.01
+    amounts[large] = rng.uniform(50000, 500000, large.sum())
+    return pd.DataFrame({
+        "transaction_id": [f"txn{i:09d}" for i in range(n_rows)],
+        "user_id": rng.integers(0, n_users, n_rows),
+        "timestamp": start + seconds.astype('timedelta64[s]'),
+        "amount": amounts.round(2),
+        "location": rng.choice(LOCATIONS, n_rows),
+        "txn_type": rng.choice(TXN_TYPES, n_rows),
+        "channel": rng.choice(CHANNELS, n_rows),
+    })[TRANSACTION_COLUMNS]
+
+
+def legacy_score_transactions(df):
+    # The flag pipeline that used to be copy-pasted into app.py
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['is_large_transaction'] = df['amount'] > 50000
+    df['is_amount_outlier'] = False
+    for uid, group in df.groupby('user_id'):
+        mean = group['amount'].mean()
+        std = group['amount'].std()
+        idx = group.index
+        df.loc[idx, 'is_amount_outlier'] = (group['amount'] > mean + 3 * std) | (group['amount'] < mean - 3 * std)
+    df = df.sort_values(['user_id', 'timestamp'])
+    df['txn_count_1h'] = 0
+    for uid, group in df.groupby('user_id'):
+        counts = []
+        times = group['timestamp']
+        for t in times:
+            count = times[(times >= t - pd.Timedelta(hours=1)) & (times <= t)].count()
+            counts.append(count)
+        df.loc[group.index, 'txn_count_1h'] = counts
+    df['is_frequency_anomaly'] = df['txn_count_1h'] > 10
+    df['is_geographic_anomaly'] = False
+    for uid, group in df.groupby('user_id'):
+        known_locations = set()
+        geo_flags = []
+        for loc in group['location']:
+            geo_flags.append(loc not in known_locations)
+            known_locations.add(loc)
+        df.loc[group.index, 'is_geographic_anomaly'] = geo_flags
+    df['is_time_anomaly'] = df['timestamp'].dt.hour.between(2, 5)
+    df['is_channel_anomaly'] = False
+    for uid, group in df.groupby('user_id'):
+        known_channels = set()
+        chan_flags = []
+        for chan in group['channel']:
+            chan_flags.append(chan not in known_channels)
+            known_channels.add(chan)
+        df.loc[group.index, 'is_channel_anomaly'] = chan_flags
+    df['anomaly_score'] = (
+        df['is_large_transaction'] * 3 +
+        df['is_amount_outlier'] * 2 +
+        df['is_frequency_anomaly'] * 2 +
+        df['is_geographic_anomaly'] * 1 +
+        df['is_time_anomaly'] * 1 +
+        df['is_channel_anomaly'] * 1
+    )
+    return df
+
+
+def assert_same_flags(expected, actual):
+    columns = FLAG_COLUMNS + ['txn_count_1h', 'anomaly_score']
+    assert list(expected.index) == list(actual.index), "row order differs"
+    for col in columns:
+        mismatched = (expected[col].astype('int64') != actual[col].astype('int64')).sum()
+        assert mismatched == 0, f"{col}: {mismatched} rows differ"
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized vs legacy anomaly scoring")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--rows-per-user", type=int, default=50)
+    parser.add_argument("--legacy-max-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'vectorized s':>14} {'legacy s':>12} {'speedup':>10}")
+    for n_rows in args.rows:
+        df = make_transactions(n_rows, args.rows_per_user)
+        scored, fast = timed(score_transactions, df)
+
+        if n_rows <= args.legacy_max_rows:
+            expected, slow = timed(legacy_score_transactions, df)
+            assert_same_flags(expected, scored)
+            marker = ""
+        else:
+            # Legacy cost is linear in the number of users at a fixed
+            # rows-per-user, so time a sample of users and scale it up
+            users = df['user_id'].unique()
+            sample_users = users[:max(1, len(users) * args.legacy_max_rows // n_rows)]
+            sample = df[df['user_id'].isin(sample_users)]
+            expected, slow = timed(legacy_score_transactions, sample)
+            assert_same_flags(expected, score_transactions(sample))
+            slow *= len(users) / len(sample_users)
+            marker = "~"
+
+        print(f"{n_rows:>12,} {fast:>14.3f} {marker + format(slow, '.3f'):>12} {marker + format(slow / fast, '.0f') + 'x':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/benchmark_user_sketches.py
+#
+# Per-user memory and speed of the two online state backends:
+#   exact:   OnlineScorer() - a UserState object per user
+#   compact: OnlineScorer(compact=True) - backend.user_sketches arrays
+# Memory is what tracemalloc sees allocated after replaying the window.
+# Also checks that both give the same flags, and times the vectorized
+# UserSketches.add_frame fold used to build baselines from history.
+#
+#   python -m benchmarks.benchmark_user_sketches --users 50000 200000
+
+import argparse
+import time
+import tracemalloc
+
+from backend.anomaly_scoring import FLAG_COLUMNS
+from backend.online_scoring import OnlineScorer
+from backend.user_sketches import UserSketches
+from benchmarks.benchmark_scoring import make_transactions
+
+
+def replay(df, **options):
+    # (flags, state bytes, seconds). Timed without tracemalloc, which slows
+    # allocation; measured in a second pass once the result frame is dropped.
+    start = time.perf_counter()
+    OnlineScorer(**options).score_frame(df)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    scorer = OnlineScorer(**options)
+    flags = scorer.score_frame(df)[FLAG_COLUMNS].to_numpy()
+    state_bytes = tracemalloc.get_traced_memory()[0] - flags.nbytes
+    tracemalloc.stop()
+    return flags, state_bytes, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark exact vs compact per-user state")
+    parser.add_argument("--users", type=int, nargs="+", default=[50_000, 200_000])
+    parser.add_argument("--rows-per-user", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'users':>10}  {'exact':>10}  {'compact':>10}  {'exact':>9}  {'compact':>9}  {'add_frame':>12}  flags")
+    for n_users in args.users:
+        df = make_transactions(n_users * args.rows_per_user, args.rows_per_user)
+        df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+        exact, exact_bytes, exact_time = replay(df)
+        compact, compact_bytes, compact_time = replay(df, compact=True)
+        assert (exact == compact).all(), "exact and compact state disagree"
+
+        sketches = UserSketches()
+        start = time.perf_counter()
+        sketches.add_frame(df)
+        fold_rate = len(df) / (time.perf_counter() - start)
+        print(f"{n_users:>10,}  {exact_bytes / n_users:>8.0f} B  {compact_bytes / n_users:>8.0f} B  "
+              f"{exact_time / len(df) * 1e6:>6.1f} µs  {compact_time / len(df) * 1e6:>6.1f} µs  "
+              f"{fold_rate / 1e6:>6.1f}M rows/s  ok")
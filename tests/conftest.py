@@ -0,0 +1,165 @@
+# tests/conftest.py
+#
+# An embedded ClickHouse (chdb) behind the part of the clickhouse-connect
+# client API the backend uses, so the SQL paths run without a server:
+#   pip install pytest chdb
+#
+# OllamaStub is a local HTTP server in place of Ollama's /api/generate, for
+# the LLM client paths (concurrency, timeouts, streaming).
+
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+# Before backend modules create their module-level explanation cache
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "llm_explanations.sqlite"))
+
+
+def _literal(value):
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(f"'{v}'" if isinstance(v, str) else _literal(v) for v in value) + "]"
+    return str(value)
+
+
+def _settings_sql(settings):
+    return " SETTINGS " + ", ".join(f"{k}={v!r}" for k, v in settings.items()) if settings else ""
+
+
+class QueryResult:
+    def __init__(self, rows):
+        self.result_rows = rows
+
+    @property
+    def first_row(self):
+        return self.result_rows[0] if self.result_rows else None
+
+
+class ChdbClient:
+
+    def __init__(self, path):
+        import chdb.session
+
+        self.session = chdb.session.Session(path)
+
+    def _run(self, sql, fmt, parameters=None, settings=None):
+        params = {k: _literal(v) for k, v in (parameters or {}).items()}
+        return self.session.query(sql + _settings_sql(settings), fmt, params=params)
+
+    def query(self, sql, parameters=None, settings=None):
+        table = self.query_arrow(sql, parameters, settings)
+        return QueryResult([tuple(row.values()) for row in table.to_pylist()])
+
+    def query_arrow(self, sql, parameters=None, settings=None, use_strings=True):
+        import pyarrow as pa
+
+        data = self._run(sql, "ArrowStream", parameters, settings).bytes()
+        return pa.ipc.open_stream(io.BytesIO(data)).read_all() if data else pa.table({})
+
+    def command(self, sql, parameters=None, settings=None):
+        return str(self._run(sql, "TSVRaw", parameters, settings)).strip()
+
+    def insert_df(self, table, df, settings=None):
+        columns = ", ".join(df.columns)
+        data = df.to_csv(index=False, header=False, date_format="%Y-%m-%d %H:%M:%S")
+        self.session.query(f"INSERT INTO {table} ({columns}) FORMAT CSV {data}")
+
+    def insert(self, table, data, column_names=None, settings=None):
+        self.insert_df(table, pd.DataFrame(data, columns=column_names))
+
+    def close(self):
+        self.session.close()
+
+
+@pytest.fixture
+def clickhouse(tmp_path):
+    pytest.importorskip("chdb")
+    client = ChdbClient(str(tmp_path / "chdb"))
+    yield client
+    client.close()
+
+
+class OllamaStub:
+    # Answers after delays[user] seconds (default_delay otherwise), the user
+    # being read from the "User: <id>" line of the prompt. Streaming
+    # requests get `frames` as NDJSON lines when set (dicts are encoded,
+    # bytes sent as they are).
+
+    def __init__(self):
+        self.delays = {}
+        self.default_delay = 0.05
+        self.frames = None
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def reply(self, payload):
+        match = re.search(r"User: (\S+)", payload["prompt"])
+        user = match.group(1) if match else None
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delays.get(user, self.default_delay))
+        finally:
+            with self._lock:
+                self.active -= 1
+        if payload.get("stream") and self.frames is not None:
+            return self.frames
+        text = f"explanation for user {user}"
+        return [{"response": text, "done": True}] if payload.get("stream") else {"response": text}
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                try:
+                    body = stub.reply(payload)
+                    if isinstance(body, list):
+                        data = b"".join(
+                            (frame if isinstance(frame, bytes) else json.dumps(frame).encode()) + b"\n"
+                            for frame in body
+                        )
+                        content_type = "application/x-ndjson"
+                    else:
+                        data = json.dumps(body).encode()
+                        content_type = "application/json"
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client timed out and hung up
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def ollama_stub(monkeypatch):
+    from backend import llm_client
+
+    stub = OllamaStub()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub.handler())
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stub.url = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    monkeypatch.setattr(llm_client.ollama, "breaker", llm_client.CircuitBreaker())
+    yield stub
+    server.shutdown()
+    server.server_close()
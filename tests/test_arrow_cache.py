@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import pandas as pd
+
+from backend.arrow_cache import convert_csv_to_arrow, load_transactions
+
+
+def test_load_transactions_is_arrow_backed(tmp_path):
+    path = tmp_path / "transactions.csv"
+    pd.DataFrame({
+        "transaction_id": ["t0", "t1", "t2"],
+        "user_id": [1, 2, 1],
+        "amount": [10.5, 20000.0, 3.25],
+        "timestamp": ["01-01-2024 10:00", "02-01-2024 03:30", "03-01-2024 23:59"],
+        "location": ["Pune", "Delhi", "Pune"],
+        "channel": ["web", "atm", "web"],
+        "txn_type": ["debit", "credit", "debit"],
+    }).to_csv(path, index=False)
+
+    df = load_transactions(str(path), ["user_id", "amount", "timestamp", "location"])
+    assert list(df.columns) == ["user_id", "amount", "timestamp", "location"]
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes)
+    assert df["user_id"].tolist() == [1, 2, 1]
+    assert df["amount"].tolist() == [10.5, 20000.0, 3.25]
+    assert df["timestamp"].iloc[1] == pd.Timestamp("2024-01-02 03:30")
+    assert df["location"].value_counts().to_dict() == {"Pune": 2, "Delhi": 1}
+
+
+def test_concurrent_conversions_do_not_share_a_temp_file(tmp_path):
+    path = tmp_path / "transactions.csv"
+    pd.DataFrame({
+        "transaction_id": [f"t{i}" for i in range(100)],
+        "user_id": [i % 7 for i in range(100)],
+        "amount": [float(i) for i in range(100)],
+        "timestamp": ["01-01-2024 10:00"] * 100,
+        "location": ["Pune"] * 100,
+        "channel": ["web"] * 100,
+        "txn_type": ["debit"] * 100,
+    }).to_csv(path, index=False)
+    arrow_path = str(tmp_path / "transactions.arrow")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        rows = list(pool.map(lambda _: convert_csv_to_arrow(str(path), arrow_path, chunk_size=10), range(4)))
+    assert rows == [100] * 4
+    assert sorted(os.listdir(tmp_path)) == ["transactions.arrow", "transactions.csv"]
+    assert len(load_transactions(str(path), ["transaction_id"])) == 100
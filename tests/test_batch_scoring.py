@@ -0,0 +1,19 @@
+from backend.anomaly_scoring import FLAG_COLUMNS, score_transactions
+from backend.batch_scoring import score_table
+from backend.clickhouse_arrow import query_df
+from test_clickhouse_scoring import load, make_fixture
+
+
+def test_backfill_matches_pandas_with_reinserted_rows(clickhouse):
+    df = make_fixture()
+    load(clickhouse, df)
+    clickhouse.insert_df("transactions", df.head(10))  # second load, not merged yet
+
+    assert score_table(clickhouse, chunk_rows=10) == len(df)
+    columns = ["transaction_id"] + FLAG_COLUMNS + ["txn_count_1h", "anomaly_score"]
+    actual = query_df(clickhouse, f"SELECT {', '.join(columns)} FROM anomaly_scores FINAL", columns)
+    expected = score_transactions(df.rename(columns={"transaction_type": "txn_type"}))
+    merged = expected.merge(actual, on="transaction_id", suffixes=("_pandas", "_batch"))
+    assert len(merged) == len(df)
+    for col in columns[1:]:
+        assert (merged[f"{col}_pandas"].astype("int64") == merged[f"{col}_batch"].astype("int64")).all(), col
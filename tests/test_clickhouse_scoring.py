@@ -0,0 +1,73 @@
+import pandas as pd
+
+import pytest
+
+from backend.anomaly_scoring import anomaly_statistics, score_transactions
+from backend.clickhouse_ingest import TABLE_COLUMNS, create_transactions_table
+from backend.clickhouse_scoring import check_parity, fetch_anomaly_statistics, fetch_top_anomalous_users
+
+
+def make_fixture():
+    # Small table that exercises the edge cases of each rule: same-timestamp
+    # rows (first-seen ties, inclusive 1-hour window), single-row users (no
+    # std), a burst over the frequency threshold, night hours and an outlier
+    rows = []
+
+    def add(user_id, timestamp, amount, location="Mumbai", channel="web"):
+        rows.append((f"t{len(rows):04d}", user_id, pd.Timestamp(timestamp), amount, location, "debit", channel))
+
+    add(1, "2024-01-01 10:00", 100)
+    add(1, "2024-01-01 10:00", 120, "Delhi")             # tie, new location
+    add(1, "2024-01-01 10:00", 110, "Delhi", "mobile")   # tie, seen location, new channel
+    add(1, "2024-01-01 11:00", 105)                      # exactly one hour later
+    add(1, "2024-01-02 03:30", 90000, "Pune")            # large, night, new location
+    add(2, "2024-01-05 12:00", 60000)                    # single-row user
+    add(3, "2024-02-01 04:59", 10, channel="atm")        # single-row user at night
+    for i in range(12):                                  # burst: 12 rows in 11 minutes
+        add(4, pd.Timestamp("2024-03-01 09:00") + pd.Timedelta(minutes=i), 50 + i)
+    for i in range(20):
+        add(5, pd.Timestamp("2024-03-02") + pd.Timedelta(days=i), 100)
+    add(5, "2024-03-30 12:00", 5000)                     # outlier
+    add(6, "2024-03-01 09:00", 70)
+    add(6, "2024-03-01 09:00", 70)                       # identical twin row
+    return pd.DataFrame(rows, columns=TABLE_COLUMNS)
+
+
+def load(client, df):
+    create_transactions_table(client)
+    client.insert_df("transactions", df)
+
+
+def test_sql_matches_pandas(clickhouse):
+    load(clickhouse, make_fixture())
+    total, mismatches = check_parity(clickhouse)
+    assert total == len(make_fixture())
+    assert mismatches == {}
+
+
+def test_statistics_match_pandas(clickhouse):
+    df = make_fixture()
+    load(clickhouse, df)
+    expected = anomaly_statistics(score_transactions(df.rename(columns={"transaction_type": "txn_type"})))
+    actual = fetch_anomaly_statistics(clickhouse)
+    assert all(expected[1:-1])  # every flag fires somewhere in the fixture
+    assert actual[:-1] == expected[:-1]
+    assert actual[-1] == pytest.approx(expected[-1])
+
+
+def test_window_statistics_and_users(clickhouse):
+    load(clickhouse, make_fixture())
+    start, end = pd.Timestamp("2024-03-01").to_pydatetime(), pd.Timestamp("2024-03-31").to_pydatetime()
+    stats = fetch_anomaly_statistics(clickhouse, start=start, end=end)
+    assert stats[0] == 35
+    users = fetch_top_anomalous_users(clickhouse, start=start, end=end)
+    assert set(users["user_id"]) == {4, 5, 6}
+
+
+def test_reingested_rows_count_once(clickhouse):
+    df = make_fixture()
+    load(clickhouse, df)
+    clickhouse.insert_df("transactions", df.head(10))  # second load, not merged yet
+    assert fetch_anomaly_statistics(clickhouse)[0] == len(df)
+    total, mismatches = check_parity(clickhouse)
+    assert total == len(df) and mismatches == {}
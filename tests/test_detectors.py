@@ -0,0 +1,35 @@
+from backend import detectors
+from backend.anomaly_scoring import anomaly_statistics, score_transactions, top_anomalous_transactions
+from backend.batch_scoring import score_table
+from backend.detectors import Detector, flag_columns, register
+from test_clickhouse_scoring import load, make_fixture
+
+
+class RoundAmountDetector(Detector):
+    name = "is_round_amount"
+    weight = 4
+    columns = ("amount",)
+
+    def score(self, batch):
+        return batch["amount"] % 100 == 0
+
+
+def test_registered_detector_is_reported(clickhouse, monkeypatch):
+    df = make_fixture()
+    load(clickhouse, df)
+    score_table(clickhouse)  # anomaly_scores created with the built-in flags
+
+    monkeypatch.setattr(detectors, "DETECTORS", list(detectors.DETECTORS))
+    register(RoundAmountDetector())
+    assert flag_columns()[-1] == "is_round_amount"
+
+    scored = score_transactions(df.rename(columns={"transaction_type": "txn_type"}))
+    rounds = int(scored["is_round_amount"].sum())
+    assert rounds > 0
+    stats = anomaly_statistics(scored)
+    assert len(stats) == len(flag_columns()) + 2 and stats[-2] == rounds
+    assert "is_round_amount" in top_anomalous_transactions(scored).columns
+
+    score_table(clickhouse, reset=True)
+    stored = clickhouse.query("SELECT countIf(is_round_amount) FROM anomaly_scores FINAL").first_row[0]
+    assert stored == rounds
@@ -0,0 +1,118 @@
+import pytest
+
+from backend import anomaly_explainer, graphrag_reasoner
+from backend.llm_cache import ExplanationCache
+from backend.llm_client import LLMResponseError
+
+
+def make_context(user_id):
+    return {
+        "user_id": user_id, "timestamp": "2024-01-01T10:00:00", "amount": 1000.0,
+        "location": "Pune", "channel": "web", "txn_type": "debit",
+        "prev_count": 0, "recent_transactions": [],
+    }
+
+
+class FakeDriver:
+    # Answers fetch_graph_contexts from a dict instead of Neo4j
+
+    def __init__(self, contexts):
+        self.contexts = contexts
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def read_transaction(self, fn, transaction_ids):
+        if isinstance(transaction_ids, str):  # fetch_graph_context
+            return self.contexts.get(transaction_ids)
+        return {tid: self.contexts[tid] for tid in transaction_ids if tid in self.contexts}
+
+
+@pytest.fixture
+def explain(monkeypatch, tmp_path, ollama_stub):
+    monkeypatch.setattr(graphrag_reasoner, "OLLAMA_URL", ollama_stub.url)
+    monkeypatch.setattr(graphrag_reasoner, "explanation_cache", ExplanationCache(str(tmp_path / "cache.sqlite")))
+
+    def run(user_ids, **kwargs):
+        contexts = {f"txn{u}": make_context(u) for u in user_ids}
+        monkeypatch.setattr(graphrag_reasoner, "driver", FakeDriver(contexts))
+        ids = kwargs.pop("transaction_ids", list(contexts))
+        return list(graphrag_reasoner.explain_transactions(ids, "mistral", **kwargs))
+
+    return run
+
+
+def test_concurrency_is_capped(explain, ollama_stub):
+    ollama_stub.default_delay = 0.2
+    results = explain(range(8), max_workers=3)
+    assert sorted(tid for tid, _ in results) == sorted(f"txn{u}" for u in range(8))
+    assert ollama_stub.peak == 3
+    assert ollama_stub.requests == 8
+
+
+def test_results_arrive_in_completion_order(explain, ollama_stub):
+    ollama_stub.delays = {"0": 0.6, "1": 0.3, "2": 0.0}
+    results = explain(range(3), transaction_ids=["txn0", "missing", "txn1", "txn2"], max_workers=3)
+    # Unknown ids first, then the fastest call first, not input order
+    assert [tid for tid, _ in results] == ["missing", "txn2", "txn1", "txn0"]
+    assert results[0][1].startswith("❌ No transaction")
+    assert dict(results)["txn0"] == "explanation for user 0"
+
+
+def test_timeout_fails_one_call_and_is_not_cached(explain, ollama_stub):
+    ollama_stub.delays = {"1": 2.0}
+    results = dict(explain(range(3), max_workers=3, timeout=0.3))
+    assert results["txn0"] == "explanation for user 0"
+    assert results["txn2"] == "explanation for user 2"
+    assert results["txn1"].startswith("❌ Error from ollama") and "timed out" in results["txn1"]
+
+    ollama_stub.delays = {}
+    assert dict(explain(range(3), max_workers=3))["txn1"] == "explanation for user 1"
+    assert graphrag_reasoner.explanation_cache.stats["hits"] == 2
+
+
+ERROR_FRAMES = [
+    {"response": "Partial ", "done": False},
+    {"error": "model runner has unexpectedly stopped"},
+]
+
+
+def test_stream_error_frame_raises(monkeypatch, ollama_stub):
+    monkeypatch.setattr(graphrag_reasoner, "OLLAMA_URL", ollama_stub.url)
+    ollama_stub.frames = ERROR_FRAMES
+    chunks = graphrag_reasoner.stream_ollama_llm("User: 1")
+    assert next(chunks) == "Partial "
+    with pytest.raises(LLMResponseError, match="unexpectedly stopped"):
+        next(chunks)
+
+
+def test_stream_bad_json_raises(monkeypatch, ollama_stub):
+    monkeypatch.setattr(graphrag_reasoner, "OLLAMA_URL", ollama_stub.url)
+    ollama_stub.frames = [{"response": "ok"}, b"{not json"]
+    with pytest.raises(LLMResponseError, match="undecodable"):
+        list(graphrag_reasoner.stream_ollama_llm("User: 1"))
+
+
+def test_mistral_stream_surfaces_error_frame(monkeypatch, ollama_stub):
+    monkeypatch.setattr(anomaly_explainer, "OLLAMA_URL", ollama_stub.url)
+    ollama_stub.frames = ERROR_FRAMES
+    chunks = list(anomaly_explainer.stream_mistral_explanation((1, "2024-01-01", 10.0, "Pune", "debit", "web")))
+    assert chunks[0] == "Partial "
+    assert chunks[-1].startswith("❌ Error") and "unexpectedly stopped" in chunks[-1]
+
+
+def test_cache_hits_are_not_latency_samples(explain, monkeypatch, ollama_stub):
+    monkeypatch.setattr(graphrag_reasoner, "driver", FakeDriver({"txn7": make_context(7)}))
+    monkeypatch.setattr(graphrag_reasoner, "stream_metrics", graphrag_reasoner.deque(maxlen=10))
+    first = graphrag_reasoner.StreamMetrics("mistral")
+    assert "".join(graphrag_reasoner.explain_transaction_stream("txn7", "mistral", first)) == "explanation for user 7"
+    second = graphrag_reasoner.StreamMetrics("mistral")
+    "".join(graphrag_reasoner.explain_transaction_stream("txn7", "mistral", second))
+    assert second.cached and not first.cached
+    assert list(graphrag_reasoner.stream_metrics) == [first]
@@ -0,0 +1,44 @@
+import pytest
+
+from backend.graphrag_reasoner import _estimate_tokens, generate_graph_prompt
+
+
+def make_data(n_recent=10, n_locations=200):
+    return {
+        "user_id": 42, "timestamp": "2024-01-01T03:00:00", "amount": 95000.0,
+        "location": "Pune", "channel": "web", "txn_type": "transfer",
+        "prev_count": 500, "prev_mean": 1200.0, "prev_std": 300.0, "prev_min": 10.0, "prev_max": 9000.0,
+        "prev_p05": 50.0, "prev_p50": 1100.0, "prev_p95": 2500.0,
+        "prev_locations": [f"City number {i}" for i in range(n_locations)],
+        "prev_channels": ["web", "mobile", "atm"],
+        "seconds_since_last": 5400,
+        "recent_transactions": [
+            {"timestamp": f"2023-12-31T{i:02d}:00:00", "amount": 100.0 + i, "location": "Pune", "channel": "web"}
+            for i in range(n_recent)
+        ],
+    }
+
+
+@pytest.mark.parametrize("budget", [800, 400, 250, 200])
+def test_whole_prompt_fits_budget(budget):
+    prompt = generate_graph_prompt(make_data(), budget)
+    assert _estimate_tokens(prompt) <= budget
+    assert "Amount: ₹95,000.00" in prompt and "Be precise and insightful" in prompt
+
+
+def test_recent_transactions_go_first():
+    data = make_data(n_locations=3)
+    full = generate_graph_prompt(data, 10_000)
+    trimmed = generate_graph_prompt(data, _estimate_tokens(full) - 20)
+    assert "Most recent" in trimmed and "2023-12-31T09:00:00" not in trimmed
+    assert "95th percentile" in trimmed and "Locations used: City number 0, City number 1, City number 2" in trimmed
+
+
+def test_long_lists_are_shortened():
+    prompt = generate_graph_prompt(make_data(n_recent=0), 400)
+    assert "more)" in prompt and "Count: 500" in prompt
+
+
+def test_tiny_budget_keeps_the_transaction():
+    prompt = generate_graph_prompt(make_data(), 10)
+    assert "User: 42" in prompt and "Count: 500" in prompt and "Most recent" not in prompt
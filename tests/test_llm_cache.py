@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from backend.llm_cache import ExplanationCache
+
+
+def slow_stream(calls, chunks=("The ", "transaction ", "is ", "large."), delay=0.05):
+    def stream():
+        calls.append(threading.get_ident())
+        for chunk in chunks:
+            time.sleep(delay)
+            yield chunk
+    return stream
+
+
+def test_concurrent_streams_share_one_call(tmp_path):
+    cache = ExplanationCache(str(tmp_path / "cache.sqlite"))
+    calls = []
+    stream = slow_stream(calls)
+
+    def read(_):
+        return list(cache.get_or_stream("mistral", "prompt", stream))
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(read, range(2)))
+    assert len(calls) == 1
+    assert results == [["The ", "transaction ", "is ", "large."]] * 2
+    assert cache.stats["misses"] == 1 and cache.stats["shared"] == 1
+    assert list(cache.get_or_stream("mistral", "prompt", stream)) == ["The transaction is large."]
+    assert len(calls) == 1
+
+
+def test_stream_continues_when_the_first_reader_leaves(tmp_path):
+    cache = ExplanationCache(str(tmp_path / "cache.sqlite"))
+    calls = []
+    stream = slow_stream(calls)
+
+    first = cache.get_or_stream("mistral", "prompt", stream)
+    assert next(first) == "The "
+    second = cache.get_or_stream("mistral", "prompt", stream)
+    assert next(second) == "The "
+    first.close()
+    assert list(second) == ["transaction ", "is ", "large."]
+    assert len(calls) == 1
+    assert cache.get(cache.make_key("mistral", "prompt"))[0] == "The transaction is large."
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from backend.neo4j_ingest import distinct_entities
+
+
+def test_distinct_entities_across_chunks(tmp_path):
+    path = tmp_path / "transactions.csv"
+    pd.DataFrame({
+        "transaction_id": [f"t{i}" for i in range(7)],
+        "user_id": ["1", "2", "1", "3", "2", "1", "4"],
+        "timestamp": ["01-01-2024 10:00"] * 7,
+        "amount": [1.0] * 7,
+        "location": ["Pune", "Delhi", "Pune", "Goa", "Delhi", "Pune", "Pune"],
+        "channel": ["web", "web", "atm", "web", "mobile", "web", "web"],
+        "txn_type": ["debit"] * 7,
+    }).to_csv(path, index=False)
+    users, locations, channels = distinct_entities(path, chunk_size=2)
+    assert users == ["1", "2", "3", "4"]
+    assert locations == ["Delhi", "Goa", "Pune"]
+    assert channels == ["atm", "mobile", "web"]
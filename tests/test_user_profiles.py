@@ -0,0 +1,67 @@
+import pytest
+
+from backend import user_profiles
+from backend.anomaly_scoring import FLAG_COLUMNS, TRANSACTION_COLUMNS, anomaly_statistics, score_transactions
+from backend.user_profiles import (
+    create_user_profiles, fetch_user_anomaly_summary, fetch_user_profiles, score_against_profiles
+)
+from test_clickhouse_scoring import load, make_fixture
+
+
+def test_summary_matches_pandas(clickhouse):
+    df = make_fixture()
+    load(clickhouse, df)
+    scored = score_transactions(df.rename(columns={"transaction_type": "txn_type"}))
+    for user_id in df["user_id"].unique():
+        expected = anomaly_statistics(scored[scored["user_id"] == user_id])
+        actual = fetch_user_anomaly_summary(clickhouse, int(user_id))
+        assert actual[1:-1] == expected[:-1]
+        assert actual[-1] == pytest.approx(expected[-1])
+
+
+def test_rebuild_counts_reinserted_rows_once(clickhouse):
+    df = make_fixture()
+    load(clickhouse, df)
+    clickhouse.insert_df("transactions", df[df["user_id"] == 1])  # reload past the dedup window
+    assert fetch_user_profiles(clickhouse, [1])["transaction_count"].iloc[0] == 10
+
+    create_user_profiles(clickhouse, replace=True)
+    profile = fetch_user_profiles(clickhouse, [1]).iloc[0]
+    assert profile["transaction_count"] == 5
+    assert profile["location_count"] == 3
+
+
+def test_summary_after_rebuild_counts_reinserted_rows_once(clickhouse):
+    df = make_fixture()
+    load(clickhouse, df)
+    before = fetch_user_anomaly_summary(clickhouse, 4)
+    clickhouse.insert_df("transactions", df[df["user_id"] == 4])  # reload past the dedup window
+    create_user_profiles(clickhouse, replace=True)
+    assert fetch_user_anomaly_summary(clickhouse, 4) == before
+
+
+def test_night_hours_apply_at_query_time(clickhouse, monkeypatch):
+    load(clickhouse, make_fixture())
+    assert fetch_user_profiles(clickhouse, [1])["night_count"].iloc[0] == 1
+    monkeypatch.setattr(user_profiles, "NIGHT_HOURS", (9, 11))
+    assert fetch_user_profiles(clickhouse, [1])["night_count"].iloc[0] == 4
+
+
+def test_threshold_change_rebuilds_profiles(clickhouse, monkeypatch):
+    load(clickhouse, make_fixture())
+    assert fetch_user_profiles(clickhouse, [5])["large_count"].iloc[0] == 0
+    monkeypatch.setattr(user_profiles, "LARGE_TRANSACTION_THRESHOLD", 1000)
+    create_user_profiles(clickhouse)
+    assert fetch_user_profiles(clickhouse, [5])["large_count"].iloc[0] == 1
+
+
+def test_users_without_a_profile_are_scored_on_the_batch(clickhouse):
+    df = make_fixture().rename(columns={"transaction_type": "txn_type"})
+    history, new = df[df["user_id"] == 1], df[df["user_id"].isin([1, 5])]
+    load(clickhouse, history.rename(columns={"txn_type": "transaction_type"}))
+    profiles = fetch_user_profiles(clickhouse)
+
+    scored = score_against_profiles(new[TRANSACTION_COLUMNS], profiles).set_index("transaction_id")
+    alone = score_transactions(new[new["user_id"] == 5]).set_index("transaction_id")
+    assert scored.loc[alone.index, "is_amount_outlier"].sum() == 1
+    assert (scored.loc[alone.index, FLAG_COLUMNS] == alone[FLAG_COLUMNS]).all().all()